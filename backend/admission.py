@@ -0,0 +1,157 @@
+"""Admission control for database-bound requests
+
+At most `max_concurrent` requests run at once; the rest wait in a bounded
+priority queue and are rejected with 503 once the queue is full or their
+wait exceeds the deadline. Shedding early keeps latency and memory bounded
+when MongoDB slows down, instead of piling up requests in the handlers.
+"""
+import asyncio
+import heapq
+import itertools
+from collections import Counter
+from typing import Any, Callable, Dict, List, Optional
+
+from starlette.responses import JSONResponse
+
+# Lower ranks are admitted first. Writes are user submitted and not safely
+# retried by every client, reads are cheap to retry.
+PRIORITY_RANKS = {"write": 0, "read": 1}
+
+ADMITTED = "admitted"
+
+
+class AdmissionController:
+    """Concurrency limit with a bounded, prioritized wait queue"""
+
+    def __init__(self, max_concurrent: int, max_queue: int, queue_timeout: float):
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.in_flight = 0
+        self.admitted = 0
+        self.waited = 0
+        self.shed: Counter = Counter()
+        self.queued: Counter = Counter()
+        # Entries are (rank, sequence, priority, future); entries whose future
+        # is done have left the queue and are skipped when popped
+        self._queue: List[tuple] = []
+        self._sequence = itertools.count()
+
+    def _enqueue(self, priority: str) -> Optional[asyncio.Future]:
+        rank = PRIORITY_RANKS[priority]
+        if sum(self.queued.values()) >= self.max_queue:
+            waiting = [entry for entry in self._queue if not entry[3].done()]
+            worst = max(waiting, key=lambda entry: entry[:2], default=None)
+            if worst is None or worst[0] <= rank:
+                return None
+            # Make room by shedding the newest waiter of a lower priority
+            self._leave(worst[2], "evicted")
+            worst[3].set_result("evicted")
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._queue, (rank, next(self._sequence), priority, future))
+        self.queued[priority] += 1
+        return future
+
+    def _leave(self, priority: str, reason: Optional[str] = None):
+        self.queued[priority] -= 1
+        if reason:
+            self.shed[reason] += 1
+            self.shed[priority] += 1
+
+    async def acquire(self, priority: str) -> Optional[str]:
+        """Wait for a slot; returns None once admitted, or why the request was shed"""
+        if self.in_flight < self.max_concurrent and not sum(self.queued.values()):
+            self.in_flight += 1
+            self.admitted += 1
+            return None
+
+        future = self._enqueue(priority)
+        if future is None:
+            self.shed["queue_full"] += 1
+            self.shed[priority] += 1
+            return "queue_full"
+
+        try:
+            outcome = await asyncio.wait_for(asyncio.shield(future), self.queue_timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            cancelled = isinstance(e, asyncio.CancelledError)
+            if not future.done():
+                future.cancel()
+                self._leave(priority, None if cancelled else "timeout")
+                if cancelled:
+                    raise
+                return "timeout"
+            # The wait ended just as the request was admitted or evicted
+            outcome = future.result()
+            if cancelled:
+                if outcome == ADMITTED:
+                    self.release()
+                raise
+
+        if outcome != ADMITTED:
+            return outcome
+        self.admitted += 1
+        self.waited += 1
+        return None
+
+    def release(self):
+        """Free a slot, handing it straight to the best waiting request if there is one"""
+        while self._queue:
+            _, _, priority, future = heapq.heappop(self._queue)
+            if future.done():
+                continue
+            self._leave(priority)
+            future.set_result(ADMITTED)
+            return
+        self.in_flight -= 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "max_concurrent": self.max_concurrent,
+            "in_flight": self.in_flight,
+            "queue_depth": sum(self.queued.values()),
+            **{f"queue_depth_{priority}": self.queued[priority] for priority in PRIORITY_RANKS},
+            "admitted": self.admitted,
+            "waited": self.waited,
+            "shed": sum(self.shed[reason] for reason in ("queue_full", "timeout", "evicted")),
+            **{f"shed_{key}": self.shed[key] for key in ("queue_full", "timeout", "evicted", *PRIORITY_RANKS)},
+        }
+
+
+class AdmissionMiddleware:
+    """Runs requests through an `AdmissionController`, answering shed ones with 503
+
+    `classify(method, path)` returns the request's priority, or None for
+    requests that bypass admission (health probes, metrics).
+    """
+
+    def __init__(
+        self,
+        app,
+        controller: AdmissionController,
+        classify: Callable[[str, str], Optional[str]],
+        retry_after: int = 1,
+    ):
+        self.app = app
+        self.controller = controller
+        self.classify = classify
+        self.retry_after = retry_after
+
+    async def __call__(self, scope, receive, send):
+        priority = self.classify(scope["method"], scope["path"]) if scope["type"] == "http" else None
+        if priority is None:
+            await self.app(scope, receive, send)
+            return
+
+        if await self.controller.acquire(priority) is not None:
+            response = JSONResponse(
+                {"detail": "Server is overloaded, retry later"},
+                status_code=503,
+                headers={"Retry-After": str(self.retry_after)},
+            )
+            await response(scope, receive, send)
+            return
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.controller.release()
@@ -0,0 +1,86 @@
+"""Group commit for concurrent writes
+
+Writes submitted within a short window are handed to one flush call, so
+a burst of single-document requests costs one database round trip
+instead of one each. Every submitter still gets its own outcome: the
+flush reports a result or an exception per item.
+"""
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+
+class GroupCommit:
+    """Batches `submit()` calls made within `max_delay` seconds, up to `max_batch` items
+
+    `flush(items)` must return one entry per item: an exception to raise
+    in that item's submitter, or any other value to return to it. If flush
+    itself raises, every submitter in the batch gets that exception.
+    """
+
+    def __init__(
+        self,
+        flush: Callable[[List[Any]], Awaitable[List[Any]]],
+        max_batch: int = 100,
+        max_delay: float = 0.002,
+    ):
+        self.flush = flush
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.batches = 0
+        self.items = 0
+        self.full_batches = 0
+        self.errors = 0
+        self._pending: List[Tuple[Any, asyncio.Future]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._flushing: Set[asyncio.Task] = set()
+
+    async def submit(self, item: Any) -> Any:
+        """Queue `item` for the next flush and wait for its outcome"""
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((item, future))
+        if len(self._pending) >= self.max_batch:
+            self.full_batches += 1
+            self._start_flush()
+        elif self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(self.max_delay, self._start_flush)
+        return await future
+
+    def _start_flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        # Submitters cancelled while waiting for the window are left out
+        batch = [(item, future) for item, future in self._pending if not future.done()]
+        self._pending = []
+        if not batch:
+            return
+        task = asyncio.ensure_future(self._run(batch))
+        # Keep a reference so the task is not garbage collected mid-flush
+        self._flushing.add(task)
+        task.add_done_callback(self._flushing.discard)
+
+    async def _run(self, batch: List[Tuple[Any, asyncio.Future]]):
+        self.batches += 1
+        self.items += len(batch)
+        try:
+            outcomes = await self.flush([item for item, _ in batch])
+        except Exception as e:
+            self.errors += 1
+            outcomes = [e] * len(batch)
+        for (_, future), outcome in zip(batch, outcomes):
+            if future.done():
+                continue
+            if isinstance(outcome, BaseException):
+                future.set_exception(outcome)
+            else:
+                future.set_result(outcome)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "batches": self.batches,
+            "items": self.items,
+            "full_batches": self.full_batches,
+            "errors": self.errors,
+            "pending": len(self._pending),
+            "average_batch_size": self.items / self.batches if self.batches else 0.0,
+        }
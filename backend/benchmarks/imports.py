@@ -0,0 +1,84 @@
+"""Slowest imports when loading the API, from `python -X importtime`
+
+Imports the module in a fresh interpreter so nothing is cached in
+sys.modules, then ranks modules by cumulative (default) or self time.
+Bytecode caches still apply; run `python -m compileall .` first to match
+the Docker image.
+
+Usage (from backend/):
+    python -m benchmarks.imports --top 25
+    python -m benchmarks.imports --module launch --sort self --json
+"""
+import argparse
+import json
+import re
+import subprocess
+import sys
+from pathlib import Path
+from typing import Any, Dict, List
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+IMPORTTIME_LINE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$")
+
+
+def parse_importtime(output: str) -> List[Dict[str, Any]]:
+    """Turn `-X importtime` stderr into rows of module, depth and timings in ms"""
+    rows = []
+    for line in output.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, module = match.groups()
+            rows.append({
+                "module": module,
+                "depth": (len(indent) - 1) // 2,
+                "self_ms": int(self_us) / 1000,
+                "cumulative_ms": int(cumulative_us) / 1000,
+            })
+    return rows
+
+
+def profile_imports(module: str = "server") -> Dict[str, Any]:
+    """Import `module` in a child interpreter and return its import-time profile"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=BACKEND_DIR,
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{result.stderr[-2000:]}")
+    rows = parse_importtime(result.stderr)
+    target = next(row for row in reversed(rows) if row["module"] == module and row["depth"] == 0)
+    return {"module": module, "total_ms": target["cumulative_ms"], "imports": rows}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--module", default="server")
+    parser.add_argument("--top", type=int, default=20)
+    parser.add_argument("--sort", choices=["cumulative", "self"], default="cumulative")
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON")
+    args = parser.parse_args()
+
+    profile = profile_imports(args.module)
+    key = f"{args.sort}_ms"
+    slowest = sorted(profile["imports"], key=lambda row: row[key], reverse=True)[:args.top]
+
+    if args.json:
+        print(json.dumps({
+            "benchmark": "import_time",
+            "module": args.module,
+            "total_ms": profile["total_ms"],
+            "sort": args.sort,
+            "slowest": slowest,
+        }, indent=2))
+        return
+
+    print(f"import {args.module}: {profile['total_ms']:.1f} ms")
+    print(f"{'self ms':>9} {'cumul ms':>9}  module")
+    for row in slowest:
+        print(f"{row['self_ms']:9.1f} {row['cumulative_ms']:9.1f}  {'  ' * row['depth']}{row['module']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,298 @@
+"""Reproducible load test for the School MIS API
+
+Seeds a students collection, then drives a concurrent, weighted mix of
+reads and writes through the real FastAPI app and prints throughput and
+latency percentiles as JSON.
+
+Requests go through httpx's in-process ASGI transport, so no server or
+network is involved and client and app share one event loop; compare runs
+made the same way. The database is either a real MongoDB (--mongo-url,
+e.g. a local mongod) or an in-process stand-in (--in-memory, needs
+`pip install mongomock-motor`). The stand-in exercises the full code path
+but is far slower than mongod for large datasets.
+
+Usage (from backend/):
+    python -m benchmarks.load --in-memory --students 1000 --requests 2000
+    python -m benchmarks.load --mongo-url mongodb://localhost:27017 \\
+        --students 1000000 --requests 50000 --concurrency 100 --output run.json
+"""
+import argparse
+import asyncio
+import json
+import random
+import sys
+import time
+import uuid
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, Dict, List
+
+import httpx
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import server  # noqa: E402
+
+DEFAULT_MIX = "list=25,class=30,get=30,stats=5,create=4,update=4,delete=2"
+CLASSES = [f"{grade}{section}" for grade in range(7, 13) for section in "ABC"]
+SEED_BATCH_SIZE = 10000
+
+
+def parse_mix(mix: str) -> Dict[str, int]:
+    weights = {}
+    for part in mix.split(","):
+        name, _, weight = part.partition("=")
+        if name not in OPERATIONS:
+            raise SystemExit(f"Unknown operation in --mix: {name}")
+        weights[name] = int(weight)
+    return weights
+
+
+def seeded_id(index: int) -> str:
+    # Deterministic ids let workers pick seeded students without keeping a list
+    return str(uuid.UUID(int=index + 1))
+
+
+def seeded_student(index: int, start: datetime) -> Dict[str, Any]:
+    student = server.Student(
+        id=seeded_id(index),
+        name=f"Seed Student {index:07d}",
+        age=10 + index % 9,
+        class_name=CLASSES[index % len(CLASSES)],
+        gender="female" if index % 2 else "male",
+        contact_info=f"student{index}@example.com",
+        parent_name=f"Parent {index:07d}",
+        parent_phone=f"+1555{index:07d}",
+        address=f"{index} Main St",
+        created_at=start + timedelta(milliseconds=index),
+        updated_at=start + timedelta(milliseconds=index),
+    )
+    return server.student_document(student)
+
+
+async def drop_data():
+    await server.db.students.drop()
+    await server.db.student_summary.drop()
+    await server.db.student_tombstones.drop()
+
+
+async def seed(students: int):
+    await drop_data()
+    await server.ensure_indexes()
+    start = datetime(2024, 1, 1)
+    for offset in range(0, students, SEED_BATCH_SIZE):
+        batch = [seeded_student(index, start) for index in range(offset, min(offset + SEED_BATCH_SIZE, students))]
+        await server.db.students.insert_many(batch, ordered=False)
+    await server.rebuild_summary_counts()
+    await server.student_cache.clear()
+
+
+def percentile(sorted_values: List[float], fraction: float) -> float:
+    """Nearest-rank percentile"""
+    if not sorted_values:
+        return 0.0
+    rank = max(0, min(len(sorted_values) - 1, int(round(fraction * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[rank]
+
+
+def summarize(latencies: List[float], duration: float) -> Dict[str, float]:
+    ordered = sorted(latencies)
+    return {
+        "requests": len(ordered),
+        "throughput_rps": round(len(ordered) / duration, 1) if duration else 0.0,
+        "mean_ms": round(sum(ordered) / len(ordered) * 1000, 3) if ordered else 0.0,
+        "p50_ms": round(percentile(ordered, 0.50) * 1000, 3),
+        "p95_ms": round(percentile(ordered, 0.95) * 1000, 3),
+        "p99_ms": round(percentile(ordered, 0.99) * 1000, 3),
+        "max_ms": round(ordered[-1] * 1000, 3) if ordered else 0.0,
+    }
+
+
+class Workload:
+    """Picks operations and targets from a seeded RNG so runs are repeatable"""
+
+    def __init__(self, students: int, seed_value: int, page_size: int):
+        self.students = students
+        self.page_size = page_size
+        self.rng = random.Random(seed_value)
+
+    def random_id(self) -> str:
+        return seeded_id(self.rng.randrange(self.students))
+
+    def new_student(self) -> Dict[str, Any]:
+        return {
+            "name": f"Load Student {uuid.UUID(int=self.rng.getrandbits(128))}",
+            "age": self.rng.randint(10, 18),
+            "class_name": self.rng.choice(CLASSES),
+            "gender": self.rng.choice(["male", "female"]),
+            "contact_info": "load@example.com",
+        }
+
+
+async def op_list(client: httpx.AsyncClient, workload: Workload) -> httpx.Response:
+    return await client.get("/api/students", params={"limit": workload.page_size})
+
+
+async def op_class(client: httpx.AsyncClient, workload: Workload) -> httpx.Response:
+    return await client.get(f"/api/students/class/{workload.rng.choice(CLASSES)}", params={"limit": workload.page_size})
+
+
+async def op_get(client: httpx.AsyncClient, workload: Workload) -> httpx.Response:
+    return await client.get(f"/api/students/{workload.random_id()}")
+
+
+async def op_stats(client: httpx.AsyncClient, workload: Workload) -> httpx.Response:
+    return await client.get("/api/stats")
+
+
+async def op_create(client: httpx.AsyncClient, workload: Workload) -> httpx.Response:
+    return await client.post("/api/students", json=workload.new_student())
+
+
+async def op_update(client: httpx.AsyncClient, workload: Workload) -> httpx.Response:
+    return await client.put(f"/api/students/{workload.random_id()}", json={"age": workload.rng.randint(10, 18)})
+
+
+async def op_delete(client: httpx.AsyncClient, workload: Workload) -> httpx.Response:
+    return await client.delete(f"/api/students/{workload.random_id()}")
+
+
+OPERATIONS = {
+    "list": op_list,
+    "class": op_class,
+    "get": op_get,
+    "stats": op_stats,
+    "create": op_create,
+    "update": op_update,
+    "delete": op_delete,
+}
+
+
+async def drive(requests: int, concurrency: int, mix: Dict[str, int], workload: Workload) -> Dict[str, Any]:
+    names = list(mix)
+    weights = [mix[name] for name in names]
+    plan = workload.rng.choices(names, weights=weights, k=requests)
+    latencies: Dict[str, List[float]] = defaultdict(list)
+    statuses: Dict[str, Counter] = defaultdict(Counter)
+    errors: Counter = Counter()
+    queue = iter(plan)
+
+    transport = httpx.ASGITransport(app=server.app)
+    limits = httpx.Limits(max_connections=concurrency)
+    async with httpx.AsyncClient(transport=transport, base_url="http://benchmark", limits=limits) as client:
+
+        async def worker():
+            for name in queue:
+                started = time.perf_counter()
+                try:
+                    response = await OPERATIONS[name](client, workload)
+                except Exception:
+                    errors[name] += 1
+                    continue
+                latencies[name].append(time.perf_counter() - started)
+                statuses[name][response.status_code] += 1
+                if response.status_code >= 500:
+                    errors[name] += 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        duration = time.perf_counter() - started
+
+    all_latencies = [latency for values in latencies.values() for latency in values]
+    return {
+        "duration_s": round(duration, 3),
+        "errors": sum(errors.values()),
+        "overall": summarize(all_latencies, duration),
+        "operations": {
+            name: {
+                **summarize(latencies[name], duration),
+                "errors": errors[name],
+                "statuses": {str(code): count for code, count in sorted(statuses[name].items())},
+            }
+            for name in names
+        },
+    }
+
+
+def connect(args):
+    if args.in_memory:
+        try:
+            from mongomock_motor import AsyncMongoMockClient
+        except ImportError:
+            raise SystemExit("--in-memory needs mongomock-motor: pip install mongomock-motor")
+        return AsyncMongoMockClient(), "in-memory"
+    return server.AsyncIOMotorClient(args.mongo_url, **server.MONGO_CLIENT_OPTIONS), args.mongo_url
+
+
+async def run(args) -> Dict[str, Any]:
+    mix = parse_mix(args.mix)
+    client, target = connect(args)
+    server.client = client
+    server.db = client[args.db_name]
+
+    seed_started = time.perf_counter()
+    if not args.skip_seed:
+        await seed(args.students)
+    seed_duration = time.perf_counter() - seed_started
+    # The app runs without its lifespan, so confirm the indexes it would wait for;
+    # otherwise writes take the duplicate-name pre-read and text search answers 503
+    await server.confirm_indexes()
+
+    if args.warmup:
+        await drive(args.warmup, args.concurrency, mix, Workload(args.students, args.seed + 1, args.page_size))
+    result = await drive(args.requests, args.concurrency, mix, Workload(args.students, args.seed, args.page_size))
+
+    if not args.keep_data:
+        await drop_data()
+    client.close()
+
+    return {
+        "benchmark": "api_load",
+        "timestamp": datetime.utcnow().isoformat(),
+        "python": sys.version.split()[0],
+        "config": {
+            "database": target,
+            "db_name": args.db_name,
+            "students": args.students,
+            "requests": args.requests,
+            "warmup": args.warmup,
+            "concurrency": args.concurrency,
+            "page_size": args.page_size,
+            "mix": mix,
+            "seed": args.seed,
+            "cache_backend": server.student_cache.stats().get("backend"),
+        },
+        "seed_duration_s": round(seed_duration, 3),
+        **result,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument("--mongo-url", help="MongoDB to benchmark against, e.g. mongodb://localhost:27017")
+    target.add_argument("--in-memory", action="store_true", help="Use the mongomock-motor stand-in")
+    parser.add_argument("--db-name", default="school_mis_benchmark")
+    parser.add_argument("--students", type=int, default=1000, help="Students to seed (1k to 1M)")
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--warmup", type=int, default=200, help="Unmeasured requests before the run")
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--page-size", type=int, default=server.DEFAULT_PAGE_SIZE)
+    parser.add_argument("--mix", default=DEFAULT_MIX, help=f"Weighted operations (default {DEFAULT_MIX})")
+    parser.add_argument("--seed", type=int, default=42, help="RNG seed for the request plan")
+    parser.add_argument("--skip-seed", action="store_true", help="Reuse data from a --keep-data run")
+    parser.add_argument("--keep-data", action="store_true", help="Leave the seeded database in place")
+    parser.add_argument("--output", help="Also write the JSON report to this file")
+    args = parser.parse_args()
+    if args.students < 1:
+        parser.error("--students must be at least 1")
+
+    report = json.dumps(asyncio.run(run(args)), indent=2)
+    print(report)
+    if args.output:
+        Path(args.output).write_text(report + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""Per-1000-row cost of serializing student lists
+
+Compares the original list path (build a Student per document, let
+FastAPI validate and serialize the list through response_model, encode
+with the stdlib json module) with the fast path used by the list routes
+(encode trusted documents directly with orjson).
+
+Usage (from backend/):
+    python -m benchmarks.serialization --rows 1000 --repeat 50
+"""
+import argparse
+import json
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, Callable, Dict, List
+
+import orjson
+from pydantic import TypeAdapter
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from server import Student, trusted_student  # noqa: E402
+
+STUDENT_LIST = TypeAdapter(List[Student])
+
+
+def make_documents(rows: int) -> List[Dict[str, Any]]:
+    start = datetime(2024, 1, 1)
+    return [
+        {
+            "id": str(uuid.uuid4()),
+            "name": f"Student {i}",
+            "age": 10 + i % 8,
+            "class_name": f"{7 + i % 6}{'ABC'[i % 3]}",
+            "gender": "female" if i % 2 else "male",
+            "contact_info": f"student{i}@example.com",
+            "parent_name": f"Parent {i}",
+            "parent_phone": f"+1555{i:07d}",
+            "address": f"{i} Main St",
+            "created_at": start + timedelta(seconds=i),
+            "updated_at": start + timedelta(seconds=i),
+        }
+        for i in range(rows)
+    ]
+
+
+def original_path(documents: List[Dict[str, Any]]) -> bytes:
+    students = [Student(**document) for document in documents]
+    # What FastAPI does with response_model=List[Student] before JSONResponse
+    validated = STUDENT_LIST.validate_python([student.model_dump() for student in students])
+    content = STUDENT_LIST.dump_python(validated, mode="json")
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode()
+
+
+def fast_path(documents: List[Dict[str, Any]]) -> bytes:
+    return orjson.dumps([trusted_student(document) for document in documents])
+
+
+def measure(path: Callable[[List[Dict[str, Any]]], bytes], documents: List[Dict[str, Any]], repeat: int) -> float:
+    """Best-of-repeat wall time in milliseconds"""
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        path(documents)
+        best = min(best, time.perf_counter() - started)
+    return best * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    documents = make_documents(args.rows)
+    assert orjson.loads(original_path(documents)) == orjson.loads(fast_path(documents))
+
+    scale = 1000 / args.rows
+    original_ms = measure(original_path, documents, args.repeat)
+    fast_ms = measure(fast_path, documents, args.repeat)
+    print(json.dumps({
+        "benchmark": "student_list_serialization",
+        "rows": args.rows,
+        "repeat": args.repeat,
+        "original_ms_per_1000_rows": round(original_ms * scale, 3),
+        "fast_ms_per_1000_rows": round(fast_ms * scale, 3),
+        "speedup": round(original_ms / fast_ms, 1),
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
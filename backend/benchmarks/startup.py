@@ -0,0 +1,130 @@
+"""Cold start benchmark for the School MIS API
+
+Starts the production launcher (`python launch.py`) with one worker, polls
+a health route until it answers 200 and reports how long that took, next
+to the import time of `server` measured in a separate interpreter. Each
+run is a fresh process, so nothing is shared between runs.
+
+/api/health only passes once the database has answered a health ping, so
+point MONGO_URL at a running mongod, or use --path /api/health/live to time
+the app alone.
+
+Usage (from backend/):
+    MONGO_URL=mongodb://localhost:27017 DB_NAME=school_mis python -m benchmarks.startup --runs 5
+    python -m benchmarks.startup --path /api/health/live --output startup.json
+"""
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+from typing import Any, Dict, Optional
+
+from benchmarks.imports import BACKEND_DIR, profile_imports
+
+POLL_INTERVAL = 0.01
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def probe(url: str) -> Optional[int]:
+    """Status code of a GET to `url`, or None while nothing is listening"""
+    try:
+        with urllib.request.urlopen(url, timeout=1) as response:
+            return response.status
+    except urllib.error.HTTPError as e:
+        return e.code
+    except OSError:
+        return None
+
+
+def measure_startup(path: str, timeout: float) -> Dict[str, Any]:
+    """Launch one worker and time the first response and the first 200 from `path`"""
+    port = free_port()
+    env = {
+        "MONGO_URL": "mongodb://localhost:27017",
+        "DB_NAME": "school_mis_benchmark",
+        **os.environ,
+        "HOST": "127.0.0.1",
+        "PORT": str(port),
+        "WEB_CONCURRENCY": "1",
+    }
+    url = f"http://127.0.0.1:{port}{path}"
+    started = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, "launch.py"],
+        cwd=BACKEND_DIR,
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    listening = ready = None
+    try:
+        while time.perf_counter() - started < timeout:
+            if process.poll() is not None:
+                raise RuntimeError(f"launch.py exited with code {process.returncode} before it was ready")
+            status = probe(url)
+            elapsed = time.perf_counter() - started
+            if status is not None and listening is None:
+                listening = elapsed
+            if status == 200:
+                ready = elapsed
+                break
+            time.sleep(POLL_INTERVAL)
+    finally:
+        process.terminate()
+        try:
+            process.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.wait()
+    return {"listening_s": listening, "ready_s": ready}
+
+
+def summarize(values) -> Dict[str, float]:
+    values = [value for value in values if value is not None]
+    if not values:
+        return {}
+    return {
+        "min": round(min(values), 4),
+        "median": round(statistics.median(values), 4),
+        "max": round(max(values), 4),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--path", default="/api/health", help="Route that must answer 200 (default /api/health)")
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--timeout", type=float, default=60, help="Seconds to wait for each run")
+    parser.add_argument("--output", help="Also write the JSON report to this file")
+    args = parser.parse_args()
+
+    runs = [measure_startup(args.path, args.timeout) for _ in range(args.runs)]
+    report = json.dumps({
+        "benchmark": "cold_start",
+        "path": args.path,
+        "runs": args.runs,
+        "timed_out": sum(run["ready_s"] is None for run in runs),
+        "import_server_ms": profile_imports("server")["total_ms"],
+        "listening_s": summarize(run["listening_s"] for run in runs),
+        "ready_s": summarize(run["ready_s"] for run in runs),
+        "samples": runs,
+    }, indent=2)
+    print(report)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(report + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,247 @@
+"""Read-through caching for student lookups
+
+The cache sits in front of MongoDB reads. Backends implement the small
+async `CacheBackend` interface so an in-process LRU can be swapped for a
+shared cache without touching the route handlers.
+"""
+import asyncio
+import time
+import uuid
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Iterable, Optional, Tuple
+
+
+class CacheBackend(ABC):
+    """Minimal key/value store interface a shared cache could implement"""
+
+    @abstractmethod
+    async def get(self, key: str) -> Optional[Any]:
+        """Return the cached value, or None when missing or expired"""
+
+    @abstractmethod
+    async def set(self, key: str, value: Any, ttl: float) -> None:
+        """Store a value that expires after `ttl` seconds"""
+
+    @abstractmethod
+    async def delete(self, *keys: str) -> None:
+        """Remove keys; missing keys are ignored"""
+
+    async def clear(self) -> None:
+        """Drop every entry"""
+
+    def info(self) -> Dict[str, Any]:
+        """Backend specific statistics"""
+        return {}
+
+
+class InMemoryCache(CacheBackend):
+    """Per-process LRU cache with per-entry TTL"""
+
+    def __init__(self, max_entries: int = 10000):
+        self.max_entries = max_entries
+        self.evictions = 0
+        self.expirations = 0
+        self._entries: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+
+    async def get(self, key: str) -> Optional[Any]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            self.expirations += 1
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    async def set(self, key: str, value: Any, ttl: float) -> None:
+        self._entries[key] = (time.monotonic() + ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    async def delete(self, *keys: str) -> None:
+        for key in keys:
+            self._entries.pop(key, None)
+
+    async def clear(self) -> None:
+        self._entries.clear()
+
+    def info(self) -> Dict[str, Any]:
+        return {
+            "backend": "memory",
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
+
+
+class NullCache(CacheBackend):
+    """Backend that never stores anything, used to disable caching"""
+
+    async def get(self, key: str) -> Optional[Any]:
+        return None
+
+    async def set(self, key: str, value: Any, ttl: float) -> None:
+        pass
+
+    async def delete(self, *keys: str) -> None:
+        pass
+
+    def info(self) -> Dict[str, Any]:
+        return {"backend": "none"}
+
+
+def create_cache_backend(name: str, max_entries: int) -> CacheBackend:
+    if name == "memory":
+        return InMemoryCache(max_entries=max_entries)
+    if name == "none":
+        return NullCache()
+    raise ValueError(f"Unknown cache backend: {name}")
+
+
+class _Flight:
+    def __init__(self, task: "asyncio.Task"):
+        self.task = task
+        self.waiters = 0
+
+
+class SingleFlight:
+    """Lets concurrent callers asking for the same key share one in-flight load
+
+    The load runs as its own task and every caller awaits it through
+    `asyncio.shield`, so a caller that is cancelled (for example because its
+    client disconnected) leaves the others unaffected. The load is cancelled
+    only when no caller is left waiting. Results and errors are handed to
+    everyone waiting at the time and never kept afterwards, so the next
+    caller starts a fresh load.
+    """
+
+    def __init__(self):
+        self.loads = 0
+        self.coalesced = 0
+        self.errors = 0
+        self._flights: Dict[str, _Flight] = {}
+
+    def _finish(self, key: str, flight: _Flight, task: "asyncio.Task") -> None:
+        if self._flights.get(key) is flight:
+            del self._flights[key]
+        if not task.cancelled() and task.exception() is not None:
+            self.errors += 1
+
+    async def do(self, key: str, loader: Callable[[], Awaitable[Any]]) -> Any:
+        flight = self._flights.get(key)
+        if flight is None:
+            flight = _Flight(asyncio.ensure_future(loader()))
+            flight.task.add_done_callback(lambda task: self._finish(key, flight, task))
+            self._flights[key] = flight
+            self.loads += 1
+        else:
+            self.coalesced += 1
+
+        flight.waiters += 1
+        try:
+            return await asyncio.shield(flight.task)
+        finally:
+            flight.waiters -= 1
+            if flight.waiters == 0 and not flight.task.done():
+                # Every caller gave up; stop the load and let the next caller start over
+                if self._flights.get(key) is flight:
+                    del self._flights[key]
+                flight.task.cancel()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "loads": self.loads,
+            "coalesced": self.coalesced,
+            "errors": self.errors,
+            "in_flight": len(self._flights),
+        }
+
+
+class ReadThroughCache:
+    """Loads values on miss and tracks hit/miss counters
+
+    Tags group entries that must be invalidated together (for example every
+    cached page of one class). Each tag has a random version stored in the
+    backend and folded into the keys of its entries; invalidating a tag
+    replaces the version, so old entries are never read again and age out
+    through TTL/LRU. This only needs get/set/delete from the backend.
+
+    With a `SingleFlight`, concurrent misses on the same key share one load.
+    The key includes the tag versions, so requests arriving after an
+    invalidation never join a load that started before it.
+    """
+
+    def __init__(self, backend: CacheBackend, ttl: float, single_flight: Optional[SingleFlight] = None):
+        self.backend = backend
+        self.ttl = ttl
+        self.single_flight = single_flight
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    async def _tag_version(self, tag: str) -> str:
+        version_key = f"tag:{tag}"
+        version = await self.backend.get(version_key)
+        if version is None:
+            version = uuid.uuid4().hex
+            # Tag versions outlive the entries they guard
+            await self.backend.set(version_key, version, self.ttl * 2)
+        return version
+
+    async def _resolve_key(self, key: str, tags: Iterable[str]) -> str:
+        versions = [await self._tag_version(tag) for tag in tags]
+        return "@".join([key, *versions]) if versions else key
+
+    async def get_or_load(
+        self,
+        key: str,
+        loader: Callable[[], Awaitable[Optional[Any]]],
+        tags: Iterable[str] = (),
+    ) -> Optional[Any]:
+        """Return the cached value for key, loading and storing it on a miss
+
+        None results are not cached so lookups of missing documents always
+        reach the database.
+        """
+        # Resolve before loading so a concurrent invalidation orphans this entry
+        resolved_key = await self._resolve_key(key, tags)
+        value = await self.backend.get(resolved_key)
+        if value is not None:
+            self.hits += 1
+            return value
+        self.misses += 1
+        if self.single_flight is not None:
+            return await self.single_flight.do(resolved_key, lambda: self._load(resolved_key, loader))
+        return await self._load(resolved_key, loader)
+
+    async def _load(self, resolved_key: str, loader: Callable[[], Awaitable[Optional[Any]]]) -> Optional[Any]:
+        value = await loader()
+        if value is not None:
+            await self.backend.set(resolved_key, value, self.ttl)
+        return value
+
+    async def invalidate(self, *tags: str) -> None:
+        """Make every entry stored under any of the tags unreachable"""
+        if tags:
+            self.invalidations += 1
+            await self.backend.delete(*(f"tag:{tag}" for tag in tags))
+
+    async def clear(self) -> None:
+        await self.backend.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+            "invalidations": self.invalidations,
+            "ttl_seconds": self.ttl,
+            **self.backend.info(),
+        }
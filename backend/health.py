@@ -0,0 +1,195 @@
+"""Background MongoDB health monitoring
+
+Load balancer probes read the state kept by `HealthMonitor` instead of
+pinging MongoDB themselves, so probe traffic never reaches the database
+and a slow database cannot pile up probe requests.
+"""
+import asyncio
+import logging
+import threading
+import time
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from pymongo import monitoring
+
+logger = logging.getLogger(__name__)
+
+# pymongo's default when maxPoolSize is not set
+DEFAULT_MAX_POOL_SIZE = 100
+
+
+class HealthMonitor:
+    """Pings the database on an interval and remembers the outcome
+
+    The database counts as healthy once a ping has succeeded and fewer than
+    `failure_threshold` pings have failed since. A result older than three
+    intervals is treated as unhealthy, so a stalled monitor cannot report
+    stale good news.
+    """
+
+    def __init__(
+        self,
+        ping: Callable[[], Awaitable[Any]],
+        interval: float = 5.0,
+        timeout: float = 2.0,
+        failure_threshold: int = 3,
+    ):
+        self.ping = ping
+        self.interval = interval
+        self.timeout = timeout
+        self.failure_threshold = failure_threshold
+        self.checks = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+        self.latency: Optional[float] = None
+        self.last_error: Optional[str] = None
+        self.last_checked: Optional[datetime] = None
+        self._last_success: Optional[float] = None
+        self._last_checked_monotonic: Optional[float] = None
+        self._task: Optional[asyncio.Task] = None
+
+    async def check(self) -> bool:
+        """Run one ping and record the result"""
+        started = time.perf_counter()
+        try:
+            await asyncio.wait_for(self.ping(), timeout=self.timeout)
+        except Exception as e:
+            self.failures += 1
+            self.consecutive_failures += 1
+            self.last_error = str(e) or type(e).__name__
+            if self.consecutive_failures == self.failure_threshold:
+                logger.error(f"Database health check failing: {self.last_error}")
+        else:
+            if self.consecutive_failures >= self.failure_threshold:
+                logger.info("Database health check recovered")
+            self.consecutive_failures = 0
+            self.last_error = None
+            self._last_success = time.monotonic()
+        finally:
+            self.checks += 1
+            self.latency = time.perf_counter() - started
+            self.last_checked = datetime.utcnow()
+            self._last_checked_monotonic = time.monotonic()
+        return self.consecutive_failures == 0
+
+    async def _run(self):
+        while True:
+            await self.check()
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    @property
+    def healthy(self) -> bool:
+        if self._last_success is None or self.consecutive_failures >= self.failure_threshold:
+            return False
+        return time.monotonic() - self._last_checked_monotonic <= self.interval * 3
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "healthy": self.healthy,
+            "latency_ms": round(self.latency * 1000, 3) if self.latency is not None else None,
+            "consecutive_failures": self.consecutive_failures,
+            "last_checked": self.last_checked,
+            "last_error": self.last_error,
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "healthy": int(self.healthy),
+            "checks": self.checks,
+            "failures": self.failures,
+            "consecutive_failures": self.consecutive_failures,
+            "latency_seconds": self.latency if self.latency is not None else 0.0,
+        }
+
+
+class ConnectionPoolTracker(monitoring.ConnectionPoolListener):
+    """Tracks open and checked-out connections per server pool
+
+    pymongo has no public API for pool usage, so this follows the CMAP
+    events. Listeners run synchronously on driver threads, hence the lock.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._max_size: Dict[Any, int] = {}
+        self._checked_out: Dict[Any, int] = {}
+        self.connections = 0
+        self.check_out_failures = 0
+
+    def pool_created(self, event):
+        with self._lock:
+            self._max_size[event.address] = event.options.get("maxPoolSize", DEFAULT_MAX_POOL_SIZE)
+            self._checked_out.setdefault(event.address, 0)
+
+    def pool_closed(self, event):
+        with self._lock:
+            self._max_size.pop(event.address, None)
+            self._checked_out.pop(event.address, None)
+
+    def connection_checked_out(self, event):
+        with self._lock:
+            self._checked_out[event.address] = self._checked_out.get(event.address, 0) + 1
+
+    def connection_checked_in(self, event):
+        with self._lock:
+            self._checked_out[event.address] = max(0, self._checked_out.get(event.address, 0) - 1)
+
+    def connection_check_out_failed(self, event):
+        with self._lock:
+            self.check_out_failures += 1
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        pass
+
+    def connection_created(self, event):
+        with self._lock:
+            self.connections += 1
+
+    def connection_closed(self, event):
+        with self._lock:
+            self.connections = max(0, self.connections - 1)
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_check_out_started(self, event):
+        pass
+
+    def saturation(self) -> float:
+        """Highest checked-out / maxPoolSize ratio across server pools"""
+        with self._lock:
+            ratios = [
+                self._checked_out.get(address, 0) / size
+                for address, size in self._max_size.items()
+                if size
+            ]
+        return max(ratios, default=0.0)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            checked_out = sum(self._checked_out.values())
+            connections = self.connections
+            check_out_failures = self.check_out_failures
+        return {
+            "connections": connections,
+            "checked_out": checked_out,
+            "saturation": self.saturation(),
+            "check_out_failures": check_out_failures,
+        }
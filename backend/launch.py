@@ -0,0 +1,105 @@
+"""Production launcher for the School MIS API
+
+Runs uvicorn with one worker per available CPU. Workers are started with
+the spawn method and import `server` themselves, so nothing (the Mongo
+client, caches, the health monitor) is shared between processes; each
+worker opens its own database client in the app lifespan. Caches are
+keyed by database watermarks, so writes made through one worker are
+never served stale by another.
+
+With more than one worker, metrics use prometheus_client's multiprocess
+mode: PROMETHEUS_MULTIPROC_DIR (a fresh temporary directory unless set)
+is emptied at launch and any worker's /api/metrics reports all of them.
+
+Usage:
+    python launch.py
+
+Environment:
+    WEB_CONCURRENCY      worker count (default: available CPUs; "auto" is the same)
+    PROMETHEUS_MULTIPROC_DIR  where workers share metrics (default: a new temporary directory)
+    HOST, PORT           bind address (default 0.0.0.0:8000)
+    GRACEFUL_TIMEOUT     seconds to wait for open connections on shutdown (default 20)
+"""
+import math
+import os
+import tempfile
+from pathlib import Path
+
+import uvicorn
+
+# Together with SHUTDOWN_DRAIN_TIMEOUT_SECONDS this must fit in ECS's 30s stop timeout
+DEFAULT_GRACEFUL_TIMEOUT = 20
+
+
+def cgroup_cpu_limit():
+    """CPU quota set by the container runtime (cgroup v2, then v1), if any"""
+    try:
+        quota, period = Path("/sys/fs/cgroup/cpu.max").read_text().split()
+        if quota != "max":
+            return int(quota) / int(period)
+    except (OSError, ValueError):
+        pass
+    try:
+        quota = int(Path("/sys/fs/cgroup/cpu/cpu.cfs_quota_us").read_text())
+        period = int(Path("/sys/fs/cgroup/cpu/cpu.cfs_period_us").read_text())
+        if quota > 0 and period > 0:
+            return quota / period
+    except (OSError, ValueError):
+        pass
+    return None
+
+
+def available_cpus() -> int:
+    """CPUs this process may use: scheduler affinity capped by the cgroup quota"""
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cpus = os.cpu_count() or 1
+    limit = cgroup_cpu_limit()
+    if limit is not None:
+        cpus = min(cpus, math.ceil(limit))
+    return max(1, cpus)
+
+
+def worker_count() -> int:
+    value = os.environ.get("WEB_CONCURRENCY", "").strip()
+    if value and value != "auto":
+        return max(1, int(value))
+    return available_cpus()
+
+
+def prepare_metrics_dir(workers: int):
+    """Point workers at an empty multiprocess metrics directory
+
+    Files left by an earlier run would be reported as live workers, so the
+    directory is emptied first. Workers inherit the environment variable.
+    """
+    # prometheus_client switches modes on the variable's presence, even when empty
+    path = os.environ.pop("PROMETHEUS_MULTIPROC_DIR", "")
+    if path:
+        os.environ["PROMETHEUS_MULTIPROC_DIR"] = path
+    else:
+        if workers == 1:
+            return
+        path = os.environ["PROMETHEUS_MULTIPROC_DIR"] = tempfile.mkdtemp(prefix="prometheus-")
+    directory = Path(path)
+    directory.mkdir(parents=True, exist_ok=True)
+    for stale in directory.glob("*.db"):
+        stale.unlink()
+
+
+def main():
+    workers = worker_count()
+    prepare_metrics_dir(workers)
+    uvicorn.run(
+        "server:app",
+        host=os.environ.get("HOST", "0.0.0.0"),
+        port=int(os.environ.get("PORT", "8000")),
+        workers=workers,
+        proxy_headers=True,
+        timeout_graceful_shutdown=int(os.environ.get("GRACEFUL_TIMEOUT", DEFAULT_GRACEFUL_TIMEOUT)),
+    )
+
+
+if __name__ == "__main__":
+    main()
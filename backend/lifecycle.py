@@ -0,0 +1,44 @@
+"""Request draining for graceful shutdown
+
+The app counts the HTTP requests it is serving so shutdown can wait for
+them to finish before closing the database client they depend on.
+"""
+import asyncio
+
+
+class InFlightRequests:
+    """Counts HTTP requests in progress and flags when the app is draining"""
+
+    def __init__(self):
+        self.count = 0
+        self.draining = False
+
+    async def drain(self, timeout: float) -> int:
+        """Stop taking new work and wait up to `timeout` seconds for requests to finish
+
+        Returns how many requests were still running when the wait ended.
+        """
+        self.draining = True
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while self.count and loop.time() < deadline:
+            await asyncio.sleep(0.05)
+        return self.count
+
+
+class InFlightMiddleware:
+    """Keeps an `InFlightRequests` counter up to date, including streamed bodies"""
+
+    def __init__(self, app, requests: InFlightRequests):
+        self.app = app
+        self.requests = requests
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        self.requests.count += 1
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.requests.count -= 1
@@ -0,0 +1,51 @@
+"""Management commands for the School MIS backend
+
+Usage:
+    python manage.py ensure-indexes
+    python manage.py backfill-search-fields
+    python manage.py rebuild-stats
+"""
+import asyncio
+
+import typer
+from pymongo.errors import OperationFailure
+
+import server
+
+cli = typer.Typer(help="School MIS backend management commands")
+
+
+@cli.callback()
+def main():
+    """School MIS backend management commands"""
+    server.connect_database()
+
+
+@cli.command("ensure-indexes")
+def ensure_indexes():
+    """Create the MongoDB indexes the API relies on"""
+    try:
+        created = asyncio.run(server.ensure_indexes())
+    except OperationFailure as e:
+        typer.echo(f"Index creation failed: {e}", err=True)
+        raise typer.Exit(code=1)
+    typer.echo(f"Indexes ensured: {', '.join(created)}")
+
+
+@cli.command("backfill-search-fields")
+def backfill_search_fields(batch_size: int = typer.Option(1000, min=1)):
+    """Populate name_lower on students stored before prefix search existed"""
+    updated = asyncio.run(server.backfill_search_fields(batch_size))
+    typer.echo(f"Students updated: {updated}")
+
+
+@cli.command("rebuild-stats")
+def rebuild_stats():
+    """Recompute the enrollment statistics summary from the students collection"""
+    counts = asyncio.run(server.rebuild_summary_counts())
+    typer.echo(f"Students counted: {counts[server.COLLECTION_SCOPE]}")
+    typer.echo(f"Summary scopes rebuilt: {len(counts)}")
+
+
+if __name__ == "__main__":
+    cli()
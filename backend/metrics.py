@@ -0,0 +1,285 @@
+"""Prometheus metrics for the School MIS API
+
+Request metrics are recorded by a plain ASGI middleware and MongoDB
+command and connection pool metrics by pymongo event listeners, so each
+request or command costs a couple of label lookups and histogram
+observations.
+
+With several workers (launch.py sets PROMETHEUS_MULTIPROC_DIR) every
+worker writes its samples to files in that directory and a scrape of any
+worker reports all of them: histograms and counters summed, gauges per
+live worker or summed where noted.
+"""
+import asyncio
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, List
+
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge, Histogram, generate_latest
+from prometheus_client import multiprocess
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+from pymongo import monitoring
+
+# prometheus_client picks its value store from this variable when the first metric is created
+MULTIPROCESS = bool(os.environ.get("PROMETHEUS_MULTIPROC_DIR"))
+
+MONGO_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+HTTP_REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds",
+    "HTTP request latency by route template and status",
+    ["method", "route", "status"],
+)
+HTTP_REQUESTS_IN_PROGRESS = Gauge(
+    "http_requests_in_progress",
+    "HTTP requests currently being served",
+    ["method"],
+    multiprocess_mode="livesum",
+)
+# Filled by profiled requests only (see profiling.py)
+HTTP_REQUEST_PHASE_DURATION = Histogram(
+    "http_request_phase_duration_seconds",
+    "Time profiled requests spent per phase: validate, handler, mongo, serialize, total",
+    ["route", "phase"],
+)
+HTTP_REQUEST_MONGO_COMMANDS = Histogram(
+    "http_request_mongo_commands",
+    "MongoDB commands sent per profiled request",
+    ["route"],
+    buckets=(0, 1, 2, 4, 8, 16, 32, 64),
+)
+MONGO_COMMAND_DURATION = Histogram(
+    "mongodb_command_duration_seconds",
+    "MongoDB command latency as reported by the driver",
+    ["command"],
+    buckets=MONGO_BUCKETS,
+)
+MONGO_COMMAND_ERRORS = Counter(
+    "mongodb_command_errors_total",
+    "MongoDB commands that failed",
+    ["command"],
+)
+
+MONGO_POOL_CHECKOUT_WAIT = Histogram(
+    "mongodb_pool_checkout_wait_seconds",
+    "Time spent waiting to check a connection out of the pool, including connection setup",
+    buckets=MONGO_BUCKETS,
+)
+MONGO_POOL_WAIT_QUEUE = Gauge(
+    "mongodb_pool_wait_queue_size",
+    "Connection check-outs currently waiting",
+    multiprocess_mode="livesum",
+)
+MONGO_POOL_CHECKOUT_FAILURES = Counter(
+    "mongodb_pool_checkout_failures_total",
+    "Connection check-outs that failed",
+    ["reason"],
+)
+
+# Requests that match no route share one label value to bound cardinality
+UNMATCHED_ROUTE = "unmatched"
+
+
+class PrometheusMiddleware:
+    """Records latency per route template and status, and in-flight requests"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        in_progress = HTTP_REQUESTS_IN_PROGRESS.labels(method)
+        in_progress.inc()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            # The router stores the matched route in the scope
+            route = getattr(scope.get("route"), "path", UNMATCHED_ROUTE)
+            HTTP_REQUEST_DURATION.labels(method, route, str(status)).observe(time.perf_counter() - started)
+            in_progress.dec()
+
+
+class MongoCommandMetrics(monitoring.CommandListener):
+    """Feeds driver command timings into the MongoDB histograms
+
+    pymongo calls listeners synchronously on its own threads; the
+    Prometheus client is thread safe.
+    """
+
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        MONGO_COMMAND_DURATION.labels(event.command_name).observe(event.duration_micros / 1e6)
+
+    def failed(self, event):
+        MONGO_COMMAND_DURATION.labels(event.command_name).observe(event.duration_micros / 1e6)
+        MONGO_COMMAND_ERRORS.labels(event.command_name).inc()
+
+
+class MongoPoolMetrics(monitoring.ConnectionPoolListener):
+    """Measures connection check-out wait time and queue depth
+
+    pymongo publishes check-out started and completed events on the thread
+    doing the check-out, so a thread-local holds the start time.
+    """
+
+    def __init__(self):
+        self._local = threading.local()
+
+    def connection_check_out_started(self, event):
+        self._local.started = time.perf_counter()
+        MONGO_POOL_WAIT_QUEUE.inc()
+
+    def _check_out_finished(self):
+        started = getattr(self._local, "started", None)
+        if started is not None:
+            self._local.started = None
+            MONGO_POOL_CHECKOUT_WAIT.observe(time.perf_counter() - started)
+            MONGO_POOL_WAIT_QUEUE.dec()
+
+    def connection_checked_out(self, event):
+        self._check_out_finished()
+
+    def connection_check_out_failed(self, event):
+        self._check_out_finished()
+        MONGO_POOL_CHECKOUT_FAILURES.labels(event.reason).inc()
+
+    def connection_checked_in(self, event):
+        pass
+
+    def connection_created(self, event):
+        pass
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        pass
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        pass
+
+    def pool_closed(self, event):
+        pass
+
+
+class StatsCollector:
+    """Exposes a component's stats() dict as Prometheus metrics at scrape time
+
+    Keys listed in `counters` become counters; other numeric values become
+    gauges. Non-numeric values are skipped.
+    """
+
+    def __init__(self, prefix: str, description: str, stats: Callable[[], Dict[str, Any]], counters=()):
+        self.prefix = prefix
+        self.description = description
+        self.stats = stats
+        self.counters = set(counters)
+
+    def collect(self):
+        for key, value in self.stats().items():
+            if isinstance(value, bool) or not isinstance(value, (int, float)):
+                continue
+            name = f"{self.prefix}_{key}"
+            if key in self.counters:
+                yield CounterMetricFamily(name, f"{self.description}: {key}", value=value)
+            else:
+                yield GaugeMetricFamily(name, f"{self.description}: {key}", value=value)
+
+
+class StatsPublisher:
+    """Copies a component's stats() into multiprocess metrics, for multi-worker servers
+
+    A scrape only runs collectors in the worker that serves it, so instead
+    each worker publishes its stats periodically. Counter keys become
+    counters incremented by their growth, summed over workers; other
+    numeric values become gauges labelled with the worker's pid.
+    """
+
+    def __init__(self, prefix: str, description: str, stats: Callable[[], Dict[str, Any]], counters=()):
+        self.prefix = prefix
+        self.description = description
+        self.stats = stats
+        self.counters = set(counters)
+        self.metrics: Dict[str, Any] = {}
+        self.last: Dict[str, float] = {}
+
+    def metric(self, key: str):
+        if key not in self.metrics:
+            name = f"{self.prefix}_{key}"
+            documentation = f"{self.description}: {key}"
+            if key in self.counters:
+                self.metrics[key] = Counter(name, documentation)
+            else:
+                self.metrics[key] = Gauge(name, documentation, multiprocess_mode="liveall")
+        return self.metrics[key]
+
+    def publish(self):
+        for key, value in self.stats().items():
+            if isinstance(value, bool) or not isinstance(value, (int, float)):
+                continue
+            if key in self.counters:
+                last = self.last.get(key, 0)
+                # A component that restarted its count starts over from zero
+                self.metric(key).inc(value - last if value >= last else value)
+                self.last[key] = value
+            else:
+                self.metric(key).set(value)
+
+
+STATS_PUBLISHERS: List[StatsPublisher] = []
+
+
+def register_stats(prefix: str, description: str, stats: Callable[[], Dict[str, Any]], counters=()):
+    if MULTIPROCESS:
+        STATS_PUBLISHERS.append(StatsPublisher(prefix, description, stats, counters))
+    else:
+        REGISTRY.register(StatsCollector(prefix, description, stats, counters))
+
+
+def publish_stats():
+    for publisher in STATS_PUBLISHERS:
+        publisher.publish()
+
+
+async def publish_stats_forever(interval: float):
+    """Keep this worker's published stats at most `interval` seconds old"""
+    while True:
+        publish_stats()
+        await asyncio.sleep(interval)
+
+
+def mark_worker_dead():
+    """Drop this worker's live gauges when it exits"""
+    if MULTIPROCESS:
+        multiprocess.mark_process_dead(os.getpid())
+
+
+def render_latest() -> bytes:
+    if not MULTIPROCESS:
+        return generate_latest(REGISTRY)
+    publish_stats()
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    return generate_latest(registry)
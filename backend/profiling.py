@@ -0,0 +1,237 @@
+"""Per-request profiling on demand
+
+A profiled request records where its time went: `validate` (reading the
+body and solving the handler's parameters), `handler` (the endpoint
+itself, MongoDB included), `mongo` (driver time and command count),
+`serialize` (response validation and JSON encoding) and `total` (until
+the response starts). Requests carrying the configured token in the
+`X-Profile` header get the breakdown back in a Server-Timing header and,
+with `X-Profile-Stack`, a cProfile dump in the profile directory. A
+sampled share of all other requests only feeds the phase histograms.
+
+Requests that are not profiled pay one header scan in the middleware and
+a context variable lookup per endpoint call and MongoDB command.
+"""
+import cProfile
+import functools
+import hmac
+import inspect
+import logging
+import random
+import re
+import threading
+import time
+import uuid
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+from fastapi.routing import APIRoute
+from pymongo import monitoring
+
+from metrics import HTTP_REQUEST_MONGO_COMMANDS, HTTP_REQUEST_PHASE_DURATION, UNMATCHED_ROUTE
+
+logger = logging.getLogger(__name__)
+
+PROFILE_HEADER = b"x-profile"
+PROFILE_STACK_HEADER = b"x-profile-stack"
+
+
+class RequestProfile:
+    """Phase timings and MongoDB usage of one request"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.phases: Dict[str, float] = {}
+        self.mongo_commands = 0
+        self.mongo_seconds = 0.0
+        self.route_started: Optional[float] = None
+        self.endpoint_finished: Optional[float] = None
+        self.stack_file: Optional[str] = None
+        # Commands of one request can finish on several driver threads at once
+        self._lock = threading.Lock()
+
+    def add(self, phase: str, seconds: float):
+        self.phases[phase] = self.phases.get(phase, 0.0) + seconds
+
+    def record_command(self, seconds: float):
+        with self._lock:
+            self.mongo_commands += 1
+            self.mongo_seconds += seconds
+
+    def server_timing(self, total: float) -> str:
+        entries = [f"{phase};dur={seconds * 1000:.3f}" for phase, seconds in self.phases.items()]
+        entries.append(f'mongo;dur={self.mongo_seconds * 1000:.3f};desc="{self.mongo_commands} commands"')
+        if self.stack_file:
+            entries.append(f'stack;desc="{self.stack_file}"')
+        entries.append(f"total;dur={total * 1000:.3f}")
+        return ", ".join(entries)
+
+
+# The profile of the request being served; Motor copies it into the driver's threads
+current_profile: ContextVar[Optional[RequestProfile]] = ContextVar("current_profile", default=None)
+
+
+class MongoCommandProfiler(monitoring.CommandListener):
+    """Charges each MongoDB command to the profiled request that sent it"""
+
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        profile = current_profile.get()
+        if profile is not None:
+            profile.record_command(event.duration_micros / 1e6)
+
+    failed = succeeded
+
+
+class ProfiledRoute(APIRoute):
+    """APIRoute that splits a profiled request into validate, handler and serialize"""
+
+    def get_route_handler(self):
+        endpoint = self.dependant.call
+        if not inspect.iscoroutinefunction(endpoint) or getattr(endpoint, "profiled", False):
+            return super().get_route_handler()
+
+        @functools.wraps(endpoint)
+        async def timed_endpoint(*args, **kwargs):
+            profile = current_profile.get()
+            if profile is None:
+                return await endpoint(*args, **kwargs)
+            started = time.perf_counter()
+            profile.add("validate", started - profile.route_started)
+            try:
+                return await endpoint(*args, **kwargs)
+            finally:
+                profile.endpoint_finished = time.perf_counter()
+                profile.add("handler", profile.endpoint_finished - started)
+
+        # Parameters were already read from the original signature
+        timed_endpoint.profiled = True
+        self.dependant.call = timed_endpoint
+        handler = super().get_route_handler()
+
+        async def timed_handler(request):
+            profile = current_profile.get()
+            if profile is None:
+                return await handler(request)
+            profile.route_started = time.perf_counter()
+            try:
+                response = await handler(request)
+            except Exception:
+                # Invalid requests fail before the endpoint runs
+                if "validate" not in profile.phases:
+                    profile.add("validate", time.perf_counter() - profile.route_started)
+                raise
+            if profile.endpoint_finished is not None:
+                profile.add("serialize", time.perf_counter() - profile.endpoint_finished)
+            return response
+
+        return timed_handler
+
+
+def stack_file_name(method: str, path: str) -> str:
+    slug = re.sub(r"[^A-Za-z0-9]+", "_", path).strip("_") or "root"
+    return f"{time.strftime('%Y%m%dT%H%M%S')}-{method.lower()}-{slug}-{uuid.uuid4().hex[:8]}.prof"
+
+
+class ProfilingMiddleware:
+    """Profiles requests that carry the token in X-Profile, plus a random sample of the rest
+
+    Only token requests get a Server-Timing header, and only they can ask
+    for a call-stack dump (`X-Profile-Stack: 1`, written to `profile_dir`).
+    cProfile sees everything the event loop runs meanwhile, so one dump is
+    taken at a time; a request asking while another is running gets
+    `stack;desc="busy"`.
+    """
+
+    def __init__(self, app, token: str = "", sample_rate: float = 0.0, profile_dir: str = ""):
+        self.app = app
+        self.token = token.encode()
+        self.sample_rate = sample_rate
+        self.profile_dir = Path(profile_dir) if profile_dir else None
+        self._stack_lock = threading.Lock()
+
+    def wanted(self, scope) -> Tuple[bool, bool]:
+        """Whether the request carries the token, and whether it asks for a stack dump"""
+        token = None
+        stack = False
+        for name, value in scope["headers"]:
+            if name == PROFILE_HEADER:
+                token = value
+            elif name == PROFILE_STACK_HEADER:
+                stack = value.lower() in (b"1", b"true")
+        authorized = bool(self.token) and token is not None and hmac.compare_digest(token, self.token)
+        return authorized, authorized and stack and self.profile_dir is not None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        authorized, stack = self.wanted(scope)
+        if not authorized and not (self.sample_rate and random.random() < self.sample_rate):
+            await self.app(scope, receive, send)
+            return
+
+        profile = RequestProfile()
+        profiler = None
+        if stack:
+            profiler = self.start_stack_profile(profile, scope)
+
+        async def send_with_timing(message):
+            if message["type"] == "http.response.start" and authorized:
+                timing = profile.server_timing(time.perf_counter() - profile.started)
+                message = {
+                    **message,
+                    "headers": [
+                        *message.get("headers", []),
+                        (b"server-timing", timing.encode()),
+                        (b"timing-allow-origin", b"*"),
+                    ],
+                }
+            await send(message)
+
+        reset = current_profile.set(profile)
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            current_profile.reset(reset)
+            if profiler is not None:
+                self.finish_stack_profile(profiler, profile)
+            self.observe(scope, profile)
+
+    def start_stack_profile(self, profile: RequestProfile, scope) -> Optional[cProfile.Profile]:
+        if not self._stack_lock.acquire(blocking=False):
+            profile.stack_file = "busy"
+            return None
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            # Another profiler (a debugger, coverage on 3.12+) owns the hook
+            self._stack_lock.release()
+            profile.stack_file = "busy"
+            return None
+        profile.stack_file = stack_file_name(scope["method"], scope["path"])
+        return profiler
+
+    def finish_stack_profile(self, profiler: cProfile.Profile, profile: RequestProfile):
+        profiler.disable()
+        try:
+            self.profile_dir.mkdir(parents=True, exist_ok=True)
+            profiler.dump_stats(self.profile_dir / profile.stack_file)
+        except OSError:
+            logger.exception("Could not write call-stack profile %s", profile.stack_file)
+        finally:
+            self._stack_lock.release()
+
+    @staticmethod
+    def observe(scope, profile: RequestProfile):
+        route = getattr(scope.get("route"), "path", UNMATCHED_ROUTE)
+        for phase, seconds in profile.phases.items():
+            HTTP_REQUEST_PHASE_DURATION.labels(route, phase).observe(seconds)
+        HTTP_REQUEST_PHASE_DURATION.labels(route, "mongo").observe(profile.mongo_seconds)
+        HTTP_REQUEST_PHASE_DURATION.labels(route, "total").observe(time.perf_counter() - profile.started)
+        HTTP_REQUEST_MONGO_COMMANDS.labels(route).observe(profile.mongo_commands)
@@ -0,0 +1,263 @@
+"""Background report jobs
+
+Report jobs are queued in MongoDB, so any replica can answer status
+queries and whichever replica has a free worker builds the report. This
+module holds the parts that do not touch the database: the asyncio worker
+pool that claims and runs jobs, and the CSV/XLSX formatting. The row
+formatters are plain functions of picklable rows, so they can run in a
+process pool and keep CPU-heavy formatting off the event loop.
+"""
+import asyncio
+import csv
+import io
+import logging
+import re
+import tempfile
+import zipfile
+from datetime import datetime
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple
+from xml.sax.saxutils import escape
+
+logger = logging.getLogger(__name__)
+
+REPORT_CONTENT_TYPES = {
+    "csv": "text/csv",
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+}
+
+# Reports larger than this spill from memory to a temporary file
+SPOOL_MAX_BYTES = 8 * 1024 * 1024
+
+
+class JobWorkers:
+    """Runs jobs on a fixed number of asyncio workers
+
+    Each worker calls `claim()` until it returns None, then sleeps until
+    `notify()` is called or `poll_interval` passes; polling picks up jobs
+    queued through other replicas. `run(job)` is responsible for recording
+    the job's outcome; exceptions it raises are only logged and counted.
+    """
+
+    def __init__(
+        self,
+        claim: Callable[[], Awaitable[Optional[Dict[str, Any]]]],
+        run: Callable[[Dict[str, Any]], Awaitable[Any]],
+        concurrency: int = 2,
+        poll_interval: float = 5.0,
+    ):
+        self.claim = claim
+        self.run = run
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        self.running = 0
+        self.completed = 0
+        self.failed = 0
+        self._wakeup = asyncio.Event()
+        self._tasks: List[asyncio.Task] = []
+
+    def notify(self):
+        """Wake idle workers, e.g. right after a job was queued"""
+        self._wakeup.set()
+
+    async def _work(self):
+        while True:
+            # Clear before claiming, so a notify() during the claim is not lost
+            self._wakeup.clear()
+            try:
+                job = await self.claim()
+            except Exception as e:
+                logger.error(f"Claiming a job failed: {e}")
+                job = None
+            if job is None:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            self.running += 1
+            try:
+                await self.run(job)
+                self.completed += 1
+            except Exception:
+                self.failed += 1
+                logger.exception(f"Job {job.get('id')} failed")
+            finally:
+                self.running -= 1
+
+    def start(self):
+        if not self._tasks:
+            self._tasks = [asyncio.create_task(self._work()) for _ in range(self.concurrency)]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "workers": len(self._tasks),
+            "running": self.running,
+            "completed": self.completed,
+            "failed": self.failed,
+        }
+
+
+async def group_rows(
+    cursor, fields: List[str], group_by: str, batch_size: int
+) -> AsyncIterator[Tuple[Any, List[List[Any]]]]:
+    """Yield (group, rows) batches from a cursor sorted by `group_by`
+
+    A batch never mixes groups, so each one can go to a single sheet.
+    """
+    group, rows = None, []
+    async for document in cursor:
+        if rows and (document.get(group_by) != group or len(rows) >= batch_size):
+            yield group, rows
+            rows = []
+        group = document.get(group_by)
+        rows.append([document.get(field) for field in fields])
+    if rows:
+        yield group, rows
+
+
+def format_csv_rows(rows: List[List[Any]]) -> bytes:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in rows:
+        writer.writerow([value.isoformat() if isinstance(value, datetime) else value for value in row])
+    return buffer.getvalue().encode()
+
+
+# Characters XML 1.0 does not allow, even escaped
+ILLEGAL_XML_CHARS = re.compile("[\x00-\x08\x0b\x0c\x0e-\x1f]")
+
+
+def xlsx_cell(value: Any) -> str:
+    if value is None:
+        return "<c/>"
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return f"<c><v>{value}</v></c>"
+    if isinstance(value, datetime):
+        value = value.isoformat()
+    text = escape(ILLEGAL_XML_CHARS.sub("", str(value)))
+    return f'<c t="inlineStr"><is><t xml:space="preserve">{text}</t></is></c>'
+
+
+def format_xlsx_rows(rows: List[List[Any]]) -> bytes:
+    """Rows as SpreadsheetML <row> elements with inline strings"""
+    return "".join("<row>" + "".join(map(xlsx_cell, row)) + "</row>" for row in rows).encode()
+
+
+ROW_FORMATTERS = {"csv": format_csv_rows, "xlsx": format_xlsx_rows}
+
+SHEET_HEADER = (
+    b'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    b'<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>'
+)
+SHEET_FOOTER = b"</sheetData></worksheet>"
+CONTENT_TYPES_XML = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Override PartName="/xl/workbook.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+    "{sheets}</Types>"
+)
+SHEET_CONTENT_TYPE = (
+    '<Override PartName="/xl/worksheets/sheet{n}.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+)
+ROOT_RELS_XML = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" Target="xl/workbook.xml" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument"/>'
+    "</Relationships>"
+)
+WORKBOOK_XML = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+    'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+    "<sheets>{sheets}</sheets></workbook>"
+)
+WORKBOOK_SHEET = '<sheet name="{name}" sheetId="{n}" r:id="rId{n}"/>'
+WORKBOOK_RELS_XML = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    "{sheets}</Relationships>"
+)
+WORKBOOK_SHEET_REL = (
+    '<Relationship Id="rId{n}" Target="worksheets/sheet{n}.xml" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet"/>'
+)
+INVALID_SHEET_NAME_CHARS = re.compile(r"[\[\]:*?/\\]")
+
+
+def sheet_name(group: Any, taken: set) -> str:
+    """Excel sheet names are at most 31 characters, unique and free of []:*?/\\"""
+    base = INVALID_SHEET_NAME_CHARS.sub("_", str(group if group is not None else "Unassigned"))[:31] or "Sheet"
+    name, suffix = base, 1
+    while name.lower() in taken:
+        suffix += 1
+        name = f"{base[:31 - len(str(suffix)) - 1]}~{suffix}"
+    taken.add(name.lower())
+    return name
+
+
+class ReportFile:
+    """A report assembled from formatted row batches
+
+    CSV reports are one file with a header row. XLSX reports get one sheet
+    per group; batches must arrive grouped, as `group_rows` yields them.
+    """
+
+    def __init__(self, format: str, header: List[str]):
+        self.format = format
+        self.header = header
+        self.rows = 0
+        self.file = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_BYTES)
+        self._sheets: List[str] = []
+        self._sheet = None
+        self._group: Any = None
+        if format == "xlsx":
+            self._zip = zipfile.ZipFile(self.file, "w", zipfile.ZIP_DEFLATED)
+        else:
+            self.file.write(format_csv_rows([header]))
+
+    def write(self, group: Any, fragment: bytes, rows: int):
+        """Append a batch formatted by ROW_FORMATTERS[format]"""
+        if self.format == "xlsx" and (self._sheet is None or group != self._group):
+            self._close_sheet()
+            self._sheets.append(sheet_name(group, {name.lower() for name in self._sheets}))
+            self._sheet = self._zip.open(f"xl/worksheets/sheet{len(self._sheets)}.xml", "w")
+            self._sheet.write(SHEET_HEADER + format_xlsx_rows([self.header]))
+        self._group = group
+        (self._sheet or self.file).write(fragment)
+        self.rows += rows
+
+    def _close_sheet(self):
+        if self._sheet is not None:
+            self._sheet.write(SHEET_FOOTER)
+            self._sheet.close()
+            self._sheet = None
+
+    def finish(self):
+        """Complete the file and rewind it for reading"""
+        if self.format == "xlsx":
+            if not self._sheets:
+                # A workbook needs at least one sheet
+                self.write(None, b"", 0)
+            self._close_sheet()
+            numbered = list(enumerate(self._sheets, start=1))
+            self._zip.writestr("[Content_Types].xml", CONTENT_TYPES_XML.format(
+                sheets="".join(SHEET_CONTENT_TYPE.format(n=n) for n, _ in numbered)))
+            self._zip.writestr("_rels/.rels", ROOT_RELS_XML)
+            self._zip.writestr("xl/workbook.xml", WORKBOOK_XML.format(
+                sheets="".join(WORKBOOK_SHEET.format(n=n, name=escape(name, {'"': "&quot;"})) for n, name in numbered)))
+            self._zip.writestr("xl/_rels/workbook.xml.rels", WORKBOOK_RELS_XML.format(
+                sheets="".join(WORKBOOK_SHEET_REL.format(n=n) for n, _ in numbered)))
+            self._zip.close()
+        self.file.seek(0)
+        return self.file
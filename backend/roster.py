@@ -0,0 +1,195 @@
+"""Columnar in-memory index of the student roster
+
+Keeps the fields roster filters use (age, gender, class) in numpy arrays,
+with gender and class stored as integer category codes, so a filter is a
+few vectorized comparisons instead of a MongoDB query plus a model per
+matching student. The index does not talk to MongoDB; the caller loads
+it and keeps it current (see `sync_roster_index` in server.py).
+"""
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+EPOCH = datetime(1970, 1, 1)
+MIN_CAPACITY = 1024
+
+
+def to_millis(value: datetime) -> int:
+    """MongoDB's stored precision, as an integer the arrays can hold"""
+    return (value - EPOCH) // timedelta(milliseconds=1)
+
+
+class Categories:
+    """Dictionary encoding of a string column"""
+
+    def __init__(self):
+        self.values: List[str] = []
+        self.codes: Dict[str, int] = {}
+
+    def code(self, value: str) -> int:
+        code = self.codes.get(value)
+        if code is None:
+            code = self.codes[value] = len(self.values)
+            self.values.append(value)
+        return code
+
+    def lookup(self, values: Iterable[str]) -> List[int]:
+        """Codes of the given values; values never seen have no code"""
+        return [self.codes[value] for value in values if value in self.codes]
+
+
+class RosterIndex:
+    """Students' id, name, age, gender and class, filterable with numpy masks
+
+    Rows stay in created_at order, the order the list endpoints use, so a
+    filter's matches need no sorting. Deleted rows are only flagged and get
+    dropped when a compaction rewrites the arrays.
+    """
+
+    COLUMNS = ("age", "gender", "class_code", "created_at", "updated_at", "alive")
+
+    def __init__(self):
+        self.size = 0
+        self.live = 0
+        self.ids: List[str] = []
+        self.names: List[str] = []
+        self.rows: Dict[str, int] = {}
+        self.genders = Categories()
+        self.classes = Categories()
+        self.age = np.zeros(MIN_CAPACITY, dtype=np.int32)
+        self.gender = np.zeros(MIN_CAPACITY, dtype=np.int32)
+        self.class_code = np.zeros(MIN_CAPACITY, dtype=np.int32)
+        self.created_at = np.zeros(MIN_CAPACITY, dtype=np.int64)
+        self.updated_at = np.zeros(MIN_CAPACITY, dtype=np.int64)
+        self.alive = np.zeros(MIN_CAPACITY, dtype=bool)
+        self.ordered = True
+        self.synced_at: Optional[float] = None
+        self.queries = 0
+        self.upserts = 0
+        self.removals = 0
+        self.compactions = 0
+
+    def _resize(self, capacity: int, keep: Optional[np.ndarray] = None):
+        """Move the live part of every column into arrays of `capacity` rows"""
+        for column in self.COLUMNS:
+            old = getattr(self, column)
+            new = np.zeros(capacity, dtype=old.dtype)
+            if keep is None:
+                new[:self.size] = old[:self.size]
+            else:
+                new[:len(keep)] = old[keep]
+            setattr(self, column, new)
+
+    def upsert(self, student: Dict[str, Any]) -> bool:
+        """Add or update a student; returns False when the index already has a newer version"""
+        updated_at = to_millis(student["updated_at"])
+        row = self.rows.get(student["id"])
+        if row is None:
+            if self.size == len(self.alive):
+                self._resize(2 * self.size)
+            row = self.size
+            self.size += 1
+            self.live += 1
+            self.rows[student["id"]] = row
+            self.ids.append(student["id"])
+            self.names.append(student["name"])
+            self.created_at[row] = to_millis(student["created_at"])
+            self.alive[row] = True
+            if row and self.created_at[row] < self.created_at[row - 1]:
+                self.ordered = False
+        elif updated_at < self.updated_at[row]:
+            return False
+        else:
+            self.names[row] = student["name"]
+        self.age[row] = student["age"]
+        self.gender[row] = self.genders.code(student["gender"])
+        self.class_code[row] = self.classes.code(student["class_name"])
+        self.updated_at[row] = updated_at
+        self.upserts += 1
+        return True
+
+    def remove(self, student_ids: Iterable[str]):
+        for student_id in student_ids:
+            row = self.rows.pop(student_id, None)
+            if row is not None:
+                self.alive[row] = False
+                self.live -= 1
+                self.removals += 1
+        if self.size - self.live > max(MIN_CAPACITY, self.live):
+            self.compact()
+
+    def compact(self):
+        """Drop deleted rows and restore created_at order"""
+        keep = np.flatnonzero(self.alive[:self.size])
+        if not self.ordered:
+            keep = keep[np.argsort(self.created_at[keep], kind="stable")]
+        self._resize(max(MIN_CAPACITY, 2 * len(keep)), keep)
+        self.ids = [self.ids[row] for row in keep]
+        self.names = [self.names[row] for row in keep]
+        self.rows = {student_id: row for row, student_id in enumerate(self.ids)}
+        self.size = self.live = len(keep)
+        self.ordered = True
+        self.compactions += 1
+
+    def query(
+        self,
+        age_min: Optional[int] = None,
+        age_max: Optional[int] = None,
+        genders: Optional[List[str]] = None,
+        class_names: Optional[List[str]] = None,
+        offset: int = 0,
+        limit: int = 100,
+    ) -> Tuple[int, List[Dict[str, Any]]]:
+        """Students matching every given filter, in created_at order
+
+        A list of genders or class names matches any of them. Returns the
+        total number of matches and the requested slice.
+        """
+        if not self.ordered:
+            self.compact()
+        self.queries += 1
+        size = self.size
+        mask = self.alive[:size].copy()
+        if age_min is not None:
+            mask &= self.age[:size] >= age_min
+        if age_max is not None:
+            mask &= self.age[:size] <= age_max
+        for values, categories, column in (
+            (genders, self.genders, self.gender),
+            (class_names, self.classes, self.class_code),
+        ):
+            if values:
+                # Filters name a handful of values, where OR-ed comparisons beat np.isin
+                selected = np.zeros(size, dtype=bool)
+                for code in categories.lookup(values):
+                    selected |= column[:size] == code
+                mask &= selected
+        matches = np.flatnonzero(mask)
+        return len(matches), [
+            {
+                "id": self.ids[row],
+                "name": self.names[row],
+                "age": int(self.age[row]),
+                "gender": self.genders.values[self.gender[row]],
+                "class_name": self.classes.values[self.class_code[row]],
+            }
+            for row in matches[offset:offset + limit].tolist()
+        ]
+
+    def staleness(self) -> Optional[float]:
+        """Seconds since the last completed sync, or None before the first one"""
+        return None if self.synced_at is None else time.monotonic() - self.synced_at
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "students": self.live,
+            "rows": self.size,
+            "memory_bytes": sum(getattr(self, column).nbytes for column in self.COLUMNS),
+            "staleness_seconds": self.staleness() or 0.0,
+            "queries": self.queries,
+            "upserts": self.upserts,
+            "removals": self.removals,
+            "compactions": self.compactions,
+        }
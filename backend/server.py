@@ -1,28 +1,183 @@
-from fastapi import FastAPI, APIRouter, HTTPException
+from fastapi import FastAPI, APIRouter, HTTPException, Query, Request, Response
 from dotenv import load_dotenv
+from fastapi.responses import ORJSONResponse, StreamingResponse
 from starlette.middleware.cors import CORSMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ASCENDING, TEXT, IndexModel, ReturnDocument, UpdateMany, UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError, OperationFailure, PyMongoError
 import os
+import io
+import asyncio
+import csv
 import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import asynccontextmanager
 from pathlib import Path
-from pydantic import BaseModel, Field
-from typing import List, Optional
+from pydantic import BaseModel, Field, ValidationError
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple, Union
 import uuid
-from datetime import datetime
+import json
+import base64
+import binascii
+import hashlib
+import time
+import itertools
+import orjson
+import re
+from collections import Counter
+from datetime import datetime, timedelta
+
+from admission import AdmissionController, AdmissionMiddleware
+from batching import GroupCommit
+from cache import ReadThroughCache, SingleFlight, create_cache_backend
+from health import ConnectionPoolTracker, HealthMonitor
+from lifecycle import InFlightMiddleware, InFlightRequests
+from reports import REPORT_CONTENT_TYPES, ROW_FORMATTERS, JobWorkers, ReportFile, group_rows
+from metrics import (
+    CONTENT_TYPE_LATEST, MULTIPROCESS, MongoCommandMetrics, MongoPoolMetrics, PrometheusMiddleware,
+    mark_worker_dead, publish_stats_forever, register_stats, render_latest,
+)
+from profiling import MongoCommandProfiler, ProfiledRoute, ProfilingMiddleware
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
-# MongoDB connection
-mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
-db = client[os.environ['DB_NAME']]
+# Driver settings read from the environment; unset variables keep pymongo's defaults
+MONGO_INT_OPTIONS = {
+    'MONGO_MAX_POOL_SIZE': 'maxPoolSize',
+    'MONGO_MIN_POOL_SIZE': 'minPoolSize',
+    'MONGO_MAX_IDLE_TIME_MS': 'maxIdleTimeMS',
+    'MONGO_WAIT_QUEUE_TIMEOUT_MS': 'waitQueueTimeoutMS',
+    'MONGO_SERVER_SELECTION_TIMEOUT_MS': 'serverSelectionTimeoutMS',
+    'MONGO_CONNECT_TIMEOUT_MS': 'connectTimeoutMS',
+    'MONGO_SOCKET_TIMEOUT_MS': 'socketTimeoutMS',
+}
 
-# Create the main app without a prefix
-app = FastAPI()
+def mongo_client_options() -> Dict[str, Any]:
+    options = {
+        option: int(os.environ[name])
+        for name, option in MONGO_INT_OPTIONS.items()
+        if os.environ.get(name)
+    }
+    # Comma separated, in preference order; snappy and zstd need python-snappy / zstandard
+    if os.environ.get('MONGO_COMPRESSORS'):
+        options['compressors'] = os.environ['MONGO_COMPRESSORS']
+    return options
+
+MONGO_CLIENT_OPTIONS = mongo_client_options()
+MONGO_WARMUP_TIMEOUT_SECONDS = float(os.environ.get('MONGO_WARMUP_TIMEOUT_SECONDS', '10'))
+
+# MongoDB connection, opened per process by the app lifespan (or a management
+# command) so worker processes never share a client or its sockets
+pool_tracker = ConnectionPoolTracker()
+client: Optional[AsyncIOMotorClient] = None
+db = None
+
+def connect_database():
+    """Create this process's Motor client and point `db` at the configured database"""
+    global client, db
+    client = AsyncIOMotorClient(
+        os.environ['MONGO_URL'],
+        event_listeners=[MongoCommandMetrics(), MongoCommandProfiler(), MongoPoolMetrics(), pool_tracker],
+        **MONGO_CLIENT_OPTIONS,
+    )
+    db = client[os.environ['DB_NAME']]
+    return db
+
+# Optional case-insensitive name uniqueness; queries on name must pass the same collation
+NAME_CASE_INSENSITIVE = os.environ.get('STUDENT_NAME_CASE_INSENSITIVE', 'false').lower() == 'true'
+NAME_COLLATION = {"locale": "en", "strength": 2} if NAME_CASE_INSENSITIVE else None
+ENSURE_INDEXES_ON_STARTUP = os.environ.get('ENSURE_INDEXES_ON_STARTUP', 'true').lower() == 'true'
+# Bring data written by older releases up to date in the background after startup
+MIGRATE_DATA_ON_STARTUP = os.environ.get('MIGRATE_DATA_ON_STARTUP', 'true').lower() == 'true'
+
+# Delta sync: deletions are remembered this long, so older sync tokens must reload everything
+STUDENT_TOMBSTONE_TTL_SECONDS = int(os.environ.get('STUDENT_TOMBSTONE_TTL_SECONDS', str(30 * 24 * 3600)))
+# Changes younger than this wait for the next sync, so writes still in flight (stamped by
+# app server clocks) cannot commit behind a sync token that was already handed out
+SYNC_SETTLE_SECONDS = float(os.environ.get('SYNC_SETTLE_SECONDS', '2'))
+
+# Report jobs: queued in MongoDB and built by background workers in any replica
+REPORT_WORKERS = int(os.environ.get('REPORT_WORKERS', '2'))
+# Processes formatting report rows; 0 formats in a thread of this process instead
+REPORT_PROCESSES = int(os.environ.get('REPORT_PROCESSES', '1'))
+# A job still running after this long is failed; if its worker died, another one retries it
+REPORT_JOB_TIMEOUT_SECONDS = float(os.environ.get('REPORT_JOB_TIMEOUT_SECONDS', '600'))
+REPORT_MAX_ATTEMPTS = int(os.environ.get('REPORT_MAX_ATTEMPTS', '3'))
+REPORT_TTL_SECONDS = int(os.environ.get('REPORT_TTL_SECONDS', str(24 * 3600)))
+REPORT_POLL_INTERVAL_SECONDS = float(os.environ.get('REPORT_POLL_INTERVAL_SECONDS', '5'))
+
+# Group commit: creates arriving within this window share one insert_many and one
+# summary update, up to the batch size; 0 inserts every create on its own
+STUDENT_CREATE_BATCH_WINDOW_MS = float(os.environ.get('STUDENT_CREATE_BATCH_WINDOW_MS', '0'))
+STUDENT_CREATE_BATCH_MAX = int(os.environ.get('STUDENT_CREATE_BATCH_MAX', '100'))
+
+# Columnar in-memory roster index serving /students/query (imports numpy); off by default
+ROSTER_INDEX_ENABLED = os.environ.get('ROSTER_INDEX_ENABLED', 'false').lower() == 'true'
+ROSTER_REFRESH_SECONDS = float(os.environ.get('ROSTER_REFRESH_SECONDS', '2'))
+# Past this age the index is not trusted and queries go to MongoDB instead
+ROSTER_MAX_STALENESS_SECONDS = float(os.environ.get('ROSTER_MAX_STALENESS_SECONDS', '30'))
+
+# Per-request profiling: requests sending this token in X-Profile get a Server-Timing
+# breakdown; unset turns the header off
+PROFILE_TOKEN = os.environ.get('PROFILE_TOKEN', '')
+# Share of all requests profiled into the phase histograms, e.g. 0.01
+PROFILE_SAMPLE_RATE = float(os.environ.get('PROFILE_SAMPLE_RATE', '0'))
+# Token requests sending X-Profile-Stack: 1 get a cProfile dump written here; unset disables dumps
+PROFILE_DIR = os.environ.get('PROFILE_DIR', '')
+
+# Multi-worker servers only: how stale another worker's component stats may be in a scrape
+METRICS_PUBLISH_INTERVAL_SECONDS = float(os.environ.get('METRICS_PUBLISH_INTERVAL_SECONDS', '5'))
+
+# Identical concurrent reads share one Mongo query
+read_flights = SingleFlight()
+register_stats(
+    "read_coalescing", "Concurrent identical reads sharing one query", read_flights.stats,
+    counters=("loads", "coalesced", "errors"),
+)
+
+# Read-through cache for student lookups
+student_cache = ReadThroughCache(
+    create_cache_backend(
+        os.environ.get('CACHE_BACKEND', 'memory'),
+        max_entries=int(os.environ.get('CACHE_MAX_ENTRIES', '10000')),
+    ),
+    ttl=float(os.environ.get('CACHE_TTL_SECONDS', '30')),
+    single_flight=read_flights,
+)
+register_stats(
+    "student_cache", "Student read cache", student_cache.stats,
+    counters=("hits", "misses", "invalidations", "evictions", "expirations"),
+)
+
+async def ping_database():
+    await db.admin.command('ping')
+
+# Background database health; probes read its cached state
+health_monitor = HealthMonitor(
+    ping_database,
+    interval=float(os.environ.get('HEALTH_CHECK_INTERVAL_SECONDS', '5')),
+    timeout=float(os.environ.get('HEALTH_CHECK_TIMEOUT_SECONDS', '2')),
+    failure_threshold=int(os.environ.get('HEALTH_FAILURE_THRESHOLD', '3')),
+)
+# Readiness fails once this share of any server's connection pool is checked out
+POOL_SATURATION_THRESHOLD = float(os.environ.get('HEALTH_POOL_SATURATION_THRESHOLD', '0.9'))
+register_stats(
+    "mongodb_health", "Background database health check", health_monitor.stats,
+    counters=("checks", "failures"),
+)
+register_stats(
+    "mongodb_pool", "MongoDB connection pool usage", pool_tracker.stats,
+    counters=("check_out_failures",),
+)
+
+# Cache-Control sent with ETagged student reads; clients must revalidate before reuse
+STUDENT_CACHE_CONTROL = os.environ.get('STUDENT_CACHE_CONTROL', 'no-cache')
 
 # Create a router with the /api prefix
-api_router = APIRouter(prefix="/api")
+# ProfiledRoute only adds timing to requests the profiling middleware picked
+api_router = APIRouter(prefix="/api", route_class=ProfiledRoute)
 
 # Define Models
 class Student(BaseModel):
@@ -38,6 +193,20 @@ class Student(BaseModel):
     created_at: datetime = Field(default_factory=datetime.utcnow)
     updated_at: datetime = Field(default_factory=datetime.utcnow)
 
+class SparseStudent(BaseModel):
+    """A student returned with ?fields=: only the requested fields, plus id"""
+    id: str
+    name: Optional[str] = None
+    age: Optional[int] = None
+    class_name: Optional[str] = None
+    gender: Optional[str] = None
+    contact_info: Optional[str] = None
+    parent_name: Optional[str] = None
+    parent_phone: Optional[str] = None
+    address: Optional[str] = None
+    created_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
+
 class StudentCreate(BaseModel):
     name: str
     age: int
@@ -58,59 +227,1358 @@ class StudentUpdate(BaseModel):
     parent_phone: Optional[str] = None
     address: Optional[str] = None
 
+class BulkImportRowResult(BaseModel):
+    index: int
+    status: str
+    id: Optional[str] = None
+    error: Optional[str] = None
+
+class BulkImportResult(BaseModel):
+    created: int
+    failed: int
+    results: List[BulkImportRowResult]
+
+class EnrollmentStats(BaseModel):
+    total: int
+    by_class: Dict[str, int]
+    by_gender: Dict[str, int]
+    by_age: Dict[int, int]
+
+# Upper bound on ids per batch request, so one $in query stays cheap
+MAX_BATCH_IDS = 1000
+
+class StudentIds(BaseModel):
+    ids: List[str] = Field(..., min_length=1, max_length=MAX_BATCH_IDS)
+
+class BatchGetResult(BaseModel):
+    students: List[Union[Student, SparseStudent]]
+    missing: List[str]
+
+class BatchDeleteResult(BaseModel):
+    deleted: List[str]
+    missing: List[str]
+
+class StudentChanges(BaseModel):
+    changed: List[Union[Student, SparseStudent]]
+    deleted: List[str]
+    sync_token: str
+    has_more: bool
+
+class RosterEntry(BaseModel):
+    id: str
+    name: str
+    age: int
+    gender: str
+    class_name: str
+
+class RosterQueryResult(BaseModel):
+    total: int
+    students: List[RosterEntry]
+
+class ReportRequest(BaseModel):
+    format: str = Field("csv", pattern="^(csv|xlsx)$")
+    class_name: Optional[str] = None
+
+class ReportJob(BaseModel):
+    id: str
+    status: str
+    format: str
+    class_name: Optional[str] = None
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    attempts: int = 0
+    rows: Optional[int] = None
+    size: Optional[int] = None
+    error: Optional[str] = None
+    download_url: Optional[str] = None
+
+# Indexes
+def student_indexes() -> List[IndexModel]:
+    name_options = {"collation": NAME_COLLATION} if NAME_COLLATION else {}
+    return [
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+        IndexModel([("name", ASCENDING)], name="name_unique", unique=True, **name_options),
+        # Serves class filters and keyset pages within a class
+        IndexModel(
+            [("class_name", ASCENDING), ("created_at", ASCENDING), ("id", ASCENDING)],
+            name="class_name_created_at_id",
+        ),
+        # Serves keyset pages over the whole collection
+        IndexModel([("created_at", ASCENDING), ("id", ASCENDING)], name="created_at_id"),
+        # Serves delta sync, which pages through changes in update order
+        IndexModel([("updated_at", ASCENDING), ("id", ASCENDING)], name="updated_at_id"),
+        # Serves prefix search as a range scan, ordered for keyset pages
+        IndexModel([("name_lower", ASCENDING), ("id", ASCENDING)], name="name_lower_id"),
+        # Full-text search; no stemming or stop words since these are names and addresses
+        IndexModel(
+            [("name", TEXT), ("parent_name", TEXT), ("address", TEXT)],
+            name="student_text",
+            weights={"name": 10, "parent_name": 3, "address": 1},
+            default_language="none",
+        ),
+    ]
+
+def tombstone_indexes() -> List[IndexModel]:
+    return [
+        # MongoDB's TTL monitor drops tombstones once they are this old; changing the
+        # TTL of an existing index needs collMod, create_indexes reports a conflict
+        IndexModel(
+            [("deleted_at", ASCENDING)], name="deleted_at_ttl",
+            expireAfterSeconds=STUDENT_TOMBSTONE_TTL_SECONDS,
+        ),
+        IndexModel([("deleted_at", ASCENDING), ("id", ASCENDING)], name="deleted_at_id"),
+    ]
+
+def report_job_indexes() -> List[IndexModel]:
+    return [
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+        # Serves workers claiming the oldest queued or abandoned job
+        IndexModel([("status", ASCENDING), ("created_at", ASCENDING)], name="status_created_at"),
+        # Jobs are dropped once expires_at passes
+        IndexModel([("expires_at", ASCENDING)], name="expires_at_ttl", expireAfterSeconds=0),
+    ]
+
+def report_chunk_indexes() -> List[IndexModel]:
+    return [
+        IndexModel(
+            [("job_id", ASCENDING), ("attempt", ASCENDING), ("n", ASCENDING)],
+            name="job_id_attempt_n", unique=True,
+        ),
+        IndexModel([("expires_at", ASCENDING)], name="expires_at_ttl", expireAfterSeconds=0),
+    ]
+
+# Student indexes requests depend on for correctness, not just speed: the
+# unique keys reject duplicates and $text queries fail without a text index
+REQUIRED_STUDENT_INDEXES = ("id_unique", "name_unique", "student_text")
+
+async def ensure_indexes(required: Optional[bool] = None) -> List[str]:
+    """Create any missing indexes; existing indexes with the same spec are left alone
+
+    `required=True` creates only REQUIRED_STUDENT_INDEXES and `False` only
+    the others, so a failing index in one group cannot stop the other.
+    """
+    indexes = [
+        index for index in student_indexes()
+        if required is None or (index.document["name"] in REQUIRED_STUDENT_INDEXES) == required
+    ]
+    created = await db.students.create_indexes(indexes)
+    if required:
+        return created
+    created += await db.student_tombstones.create_indexes(tombstone_indexes())
+    created += await db.report_jobs.create_indexes(report_job_indexes())
+    return created + await db.report_chunks.create_indexes(report_chunk_indexes())
+
+# Set once the unique name and text indexes are known to exist. Until then (the
+# background build is still running or failed, or ENSURE_INDEXES_ON_STARTUP is off
+# and they were never created) writes look names up first, as they did before the
+# index existed, and text search answers 503
+name_index_confirmed = False
+text_index_confirmed = False
+
+async def confirm_indexes(report: bool = True) -> bool:
+    """Check which required indexes exist; returns whether name_unique does"""
+    global name_index_confirmed, text_index_confirmed
+    try:
+        indexes = await db.students.index_information()
+        name_index_confirmed = "name_unique" in indexes
+        text_index_confirmed = "student_text" in indexes
+    except PyMongoError as e:
+        logger.error(f"Could not list student indexes: {e}")
+    if report and not name_index_confirmed:
+        logger.error("Unique name index missing; checking names before every write until restart")
+    if report and not text_index_confirmed:
+        logger.error("Text index missing; text search is unavailable until restart")
+    return name_index_confirmed
+
+async def check_name_available(name: str, student_id: Optional[str] = None):
+    """Reject a name another student has, unless the unique index already does"""
+    if name_index_confirmed:
+        return
+    query: Dict[str, Any] = {"name": name}
+    if student_id is not None:
+        query["id"] = {"$ne": student_id}
+    name_options = {"collation": NAME_COLLATION} if NAME_COLLATION else {}
+    if await db.students.find_one(query, {"_id": 1}, **name_options):
+        raise HTTPException(status_code=400, detail="Student with this name already exists")
+
+def name_key(name: str) -> str:
+    """Normalize a name the same way the unique name index compares it"""
+    return name.casefold() if NAME_CASE_INSENSITIVE else name
+
+def search_name(name: str) -> str:
+    """Normalized name stored in name_lower for case-insensitive prefix search"""
+    return name.strip().lower()
+
+def student_document(student: Student) -> Dict[str, Any]:
+    """Stored form of a student: the model plus derived search fields"""
+    return {**student.dict(), "name_lower": search_name(student.name)}
+
+async def backfill_search_fields(batch_size: int = 1000) -> int:
+    """Populate name_lower on students stored before prefix search existed
+
+    Prefix search only matches name_lower, so these students are invisible
+    to it until backfilled. Safe to rerun; returns the number updated.
+    """
+    updated = 0
+    operations = []
+    missing = db.students.find({"name_lower": {"$exists": False}}, {"_id": 1, "name": 1}, batch_size=batch_size)
+    async for student in missing:
+        operations.append(UpdateOne({"_id": student["_id"]}, {"$set": {"name_lower": search_name(student["name"])}}))
+        if len(operations) >= batch_size:
+            await db.students.bulk_write(operations, ordered=False)
+            updated += len(operations)
+            operations = []
+    if operations:
+        await db.students.bulk_write(operations, ordered=False)
+        updated += len(operations)
+    return updated
+
+# Pagination
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+# Keyset order: created_at with id as a unique tie-breaker
+STUDENT_SORT = [("created_at", 1), ("id", 1)]
+
+def encode_cursor_payload(payload: Dict[str, Any]) -> str:
+    return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode().rstrip("=")
+
+def decode_cursor_payload(cursor: str) -> Dict[str, Any]:
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except (binascii.Error, ValueError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if not isinstance(payload, dict):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return payload
+
+def encode_cursor(student: Dict[str, Any]) -> str:
+    """Encode the sort key of the last student on a page as an opaque cursor"""
+    created_at = student["created_at"]
+    if isinstance(created_at, datetime):
+        created_at = created_at.isoformat()
+    return encode_cursor_payload({"created_at": created_at, "id": student["id"]})
+
+def after_key(field: str, value: Any, student_id: str) -> dict:
+    """Match documents sorting after (value, id) in a (field, id) keyset order"""
+    return {
+        "$or": [
+            {field: {"$gt": value}},
+            {field: value, "id": {"$gt": student_id}},
+        ]
+    }
+
+def decode_cursor(cursor: str) -> dict:
+    """Turn an opaque cursor into a query matching everything after it"""
+    payload = decode_cursor_payload(cursor)
+    try:
+        created_at = datetime.fromisoformat(payload["created_at"])
+        student_id = str(payload["id"])
+    except (ValueError, KeyError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return after_key("created_at", created_at, student_id)
+
+async def load_students_page(
+    query: dict, limit: int, after: Optional[dict], fields: Optional[List[str]] = None
+) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """Fetch one keyset page of trusted student documents and the cursor for the next page, if any"""
+    if after:
+        query = {"$and": [query, after]} if query else after
+    
+    # Fetch one extra document to know whether another page exists
+    students = await db.students.find(
+        query, fields_projection(fields), sort=STUDENT_SORT, limit=limit + 1
+    ).to_list(limit + 1)
+    next_cursor = encode_cursor(students[limit - 1]) if len(students) > limit else None
+    return [shape_student(student, fields) for student in students[:limit]], next_cursor
+
+def set_next_cursor(response: Response, next_cursor: Optional[str]):
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
+
+# Fast serialization
+# Every stored student was validated by Student on the way in, so list routes
+# skip building Student objects and FastAPI's response_model pass and encode
+# the raw documents with orjson. response_model stays for the OpenAPI schema.
+STUDENT_FIELDS = list(Student.model_fields)
+STUDENT_PROJECTION = {"_id": 0, **{field: 1 for field in STUDENT_FIELDS}}
+# Optional fields can be missing from documents written before they existed
+STUDENT_OPTIONAL_DEFAULTS = {
+    name: None for name, field in Student.model_fields.items()
+    if not field.is_required() and field.default is None
+}
+
+def trusted_student(student: Dict[str, Any]) -> Dict[str, Any]:
+    return {**STUDENT_OPTIONAL_DEFAULTS, **student}
+
+# Sparse fieldsets
+def parse_fields(fields: Optional[str]) -> Optional[List[str]]:
+    """Validate a comma separated ?fields= list against Student; id is always included"""
+    if fields is None:
+        return None
+    requested = {field.strip() for field in fields.split(",") if field.strip()}
+    unknown = requested - set(STUDENT_FIELDS)
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(sorted(unknown))}")
+    requested.add("id")
+    return [field for field in STUDENT_FIELDS if field in requested]
+
+def fields_projection(fields: Optional[List[str]]) -> Dict[str, int]:
+    if fields is None:
+        return STUDENT_PROJECTION
+    # The keyset sort key and the ETag watermark are always fetched; shape_student drops them
+    return {"_id": 0, **{field: 1 for field in fields}, "created_at": 1, "updated_at": 1}
+
+def shape_student(student: Dict[str, Any], fields: Optional[List[str]]) -> Dict[str, Any]:
+    if fields is None:
+        return trusted_student(student)
+    return {field: student.get(field) for field in fields}
+
+FIELDS_QUERY = Query(
+    None,
+    description="Comma separated Student fields to return, e.g. id,name,class_name",
+)
+
+def student_list_response(students: List[Dict[str, Any]], etag: str, next_cursor: Optional[str]) -> ORJSONResponse:
+    response = ORJSONResponse(students)
+    set_next_cursor(response, next_cursor)
+    set_cache_headers(response, etag)
+    return response
+
+# Cache keys; tags let writes invalidate every cached page of a class at once
+def student_tag(student_id: str) -> str:
+    return f"student:{student_id}"
+
+def class_tag(class_name: str) -> str:
+    return f"class:{class_name}"
+
+async def invalidate_student_cache(student_ids: List[str], class_names: List[str]):
+    tags = [student_tag(student_id) for student_id in student_ids]
+    tags.extend(class_tag(class_name) for class_name in class_names)
+    await student_cache.invalidate(*tags)
+
+# Summary
+# student_summary holds one document per scope: "students" for the whole
+# collection, "class:<name>", "gender:<value>" and "age:<n>". Each carries the
+# student count behind /api/stats; the collection and class documents also
+# carry the version watermark behind ETags. Every write updates both with a
+# single unordered bulk_write of atomic $inc operations, and the documents live
+# in Mongo so every replica agrees on them.
+COLLECTION_SCOPE = "students"
+
+def class_scope(class_name: str) -> str:
+    return f"class:{class_name}"
+
+def summary_scopes(student: Dict[str, Any]) -> List[str]:
+    """Summary documents whose counts include this student"""
+    scopes = [COLLECTION_SCOPE]
+    if student.get("class_name") is not None:
+        scopes.append(class_scope(student["class_name"]))
+    if student.get("gender") is not None:
+        scopes.append(f"gender:{student['gender']}")
+    if student.get("age") is not None:
+        scopes.append(f"age:{student['age']}")
+    return scopes
+
+async def get_version(scope: str) -> int:
+    summary = await db.student_summary.find_one({"_id": scope}, {"version": 1})
+    return summary.get("version", 0) if summary else 0
+
+async def record_student_changes(
+    student_ids: List[str], removed: List[Dict[str, Any]], added: List[Dict[str, Any]]
+):
+    """Update counts and ETag watermarks, and drop cached entries affected by a write
+
+    removed holds students as they were before the write and added as they
+    are after it, so an update passes its old and new versions.
+    """
+    update_roster_index(student_ids, added)
+    counts = Counter()
+    for student in added:
+        counts.update(summary_scopes(student))
+    for student in removed:
+        counts.subtract(summary_scopes(student))
+    
+    classes = sorted({student["class_name"] for student in removed + added if student.get("class_name")})
+    versioned = [COLLECTION_SCOPE] + [class_scope(class_name) for class_name in classes]
+    operations = []
+    for scope in dict.fromkeys(versioned + list(counts)):
+        increments = {}
+        if scope in versioned:
+            increments["version"] = 1
+        if counts[scope]:
+            increments["count"] = counts[scope]
+        if increments:
+            operations.append(UpdateOne({"_id": scope}, {"$inc": increments}, upsert=True))
+    
+    await db.student_summary.bulk_write(operations, ordered=False)
+    await invalidate_student_cache(student_ids, classes)
+
+async def rebuild_summary_counts() -> Dict[str, int]:
+    """Recompute every summary count from the students collection with $group
+
+    Version watermarks are left alone. Counts drift if writes land while
+    this runs, so run it when the API is quiet.
+    """
+    facets = await db.students.aggregate([
+        {"$facet": {
+            "students": [{"$count": "count"}],
+            "class": [{"$group": {"_id": "$class_name", "count": {"$sum": 1}}}],
+            "gender": [{"$group": {"_id": "$gender", "count": {"$sum": 1}}}],
+            "age": [{"$group": {"_id": "$age", "count": {"$sum": 1}}}],
+        }}
+    ]).to_list(1)
+    facets = facets[0] if facets else {}
+    
+    counts = {COLLECTION_SCOPE: facets["students"][0]["count"] if facets.get("students") else 0}
+    for kind in ("class", "gender", "age"):
+        for group in facets.get(kind, []):
+            if group["_id"] is not None:
+                counts[f"{kind}:{group['_id']}"] = group["count"]
+    
+    operations = [UpdateOne({"_id": scope}, {"$set": {"count": count}}, upsert=True) for scope, count in counts.items()]
+    # Marks the counts as built from the collection rather than from writes alone
+    operations[0] = UpdateOne(
+        {"_id": COLLECTION_SCOPE}, {"$set": {"count": counts[COLLECTION_SCOPE], "rebuilt_at": datetime.utcnow()}}, upsert=True
+    )
+    # Scopes that no longer have any students
+    operations.append(UpdateMany({"_id": {"$nin": list(counts)}}, {"$set": {"count": 0}}))
+    await db.student_summary.bulk_write(operations, ordered=False)
+    return counts
+
+async def seed_summary_counts() -> bool:
+    """Rebuild the counts once for a database whose students predate the summary
+
+    Writes create the summary documents as they go, so the collection
+    document alone does not prove the counts cover older students; only a
+    rebuild marks it. Returns whether a rebuild ran.
+    """
+    if await db.student_summary.find_one({"_id": COLLECTION_SCOPE, "rebuilt_at": {"$exists": True}}, {"_id": 1}):
+        return False
+    await rebuild_summary_counts()
+    return True
+
+# ETags
+def make_etag(*parts: Any) -> str:
+    """Strong ETag for a watermark plus everything else that shapes the response"""
+    digest = hashlib.sha1("|".join(str(part) for part in parts).encode()).hexdigest()[:20]
+    return f'"{digest}"'
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    # If-None-Match uses weak comparison
+    candidates = (tag.strip() for tag in if_none_match.split(","))
+    return etag in (tag[2:] if tag.startswith("W/") else tag for tag in candidates)
+
+def set_cache_headers(response: Response, etag: str):
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = STUDENT_CACHE_CONTROL
+
+def not_modified(etag: str) -> Response:
+    response = Response(status_code=304)
+    set_cache_headers(response, etag)
+    return response
+
+async def scope_etag(scope: str, request: Request) -> str:
+    # Read the watermark before any data so a concurrent write can only make
+    # the ETag older than the body, never newer
+    return make_etag(scope, await get_version(scope), request.url.query)
+
+def student_etag(student_id: str, updated_at: Any, fields: Optional[List[str]] = None) -> str:
+    if isinstance(updated_at, datetime):
+        updated_at = updated_at.isoformat()
+    return make_etag(student_tag(student_id), updated_at, ",".join(fields or []))
+
+# Search
+def search_cursor_condition(mode: str, cursor: str) -> dict:
+    """Keyset condition for the page after a search cursor"""
+    payload = decode_cursor_payload(cursor)
+    try:
+        student_id = str(payload["id"])
+        if mode == "prefix":
+            key = str(payload["name_lower"])
+            return {"$or": [{"name_lower": {"$gt": key}}, {"name_lower": key, "id": {"$gt": student_id}}]}
+        score = float(payload["score"])
+    except (ValueError, KeyError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return {"$or": [{"_score": {"$lt": score}}, {"_score": score, "id": {"$gt": student_id}}]}
+
+async def search_students_page(
+    mode: str, q: str, limit: int, cursor: Optional[str], fields: Optional[List[str]]
+) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """One page of search results, best matches first, with the cursor for the next page"""
+    after = search_cursor_condition(mode, cursor) if cursor else None
+    projection = fields_projection(fields)
+    
+    if mode == "prefix":
+        # An anchored, case-sensitive regex on name_lower is an index range scan
+        query = {"name_lower": {"$regex": f"^{re.escape(search_name(q))}"}}
+        if after:
+            query = {"$and": [query, after]}
+        students = await db.students.find(
+            query, {**projection, "name_lower": 1}, sort=[("name_lower", 1), ("id", 1)], limit=limit + 1
+        ).to_list(limit + 1)
+        next_cursor = None
+        if len(students) > limit:
+            last = students[limit - 1]
+            next_cursor = encode_cursor_payload({"name_lower": last["name_lower"], "id": last["id"]})
+        for student in students:
+            student.pop("name_lower", None)
+    else:
+        pipeline = [
+            {"$match": {"$text": {"$search": q}}},
+            {"$addFields": {"_score": {"$meta": "textScore"}}},
+        ]
+        if after:
+            pipeline.append({"$match": after})
+        pipeline += [
+            {"$sort": {"_score": -1, "id": 1}},
+            {"$limit": limit + 1},
+            {"$project": {**projection, "_score": 1}},
+        ]
+        students = await db.students.aggregate(pipeline).to_list(limit + 1)
+        next_cursor = None
+        if len(students) > limit:
+            last = students[limit - 1]
+            next_cursor = encode_cursor_payload({"score": last["_score"], "id": last["id"]})
+        for student in students:
+            student.pop("_score", None)
+    
+    return [shape_student(student, fields) for student in students[:limit]], next_cursor
+
+# Delta sync; a sync token holds one keyset position per stream
+CHANGES_SORT = [("updated_at", 1), ("id", 1)]
+TOMBSTONES_SORT = [("deleted_at", 1), ("id", 1)]
+SyncPosition = Tuple[datetime, str]
+
+def encode_sync_token(changed: SyncPosition, deleted: SyncPosition) -> str:
+    return encode_cursor_payload({
+        "changed": [changed[0].isoformat(), changed[1]],
+        "deleted": [deleted[0].isoformat(), deleted[1]],
+    })
+
+def decode_sync_token(token: str) -> Tuple[SyncPosition, SyncPosition]:
+    try:
+        payload = decode_cursor_payload(token)
+        positions = tuple(
+            (datetime.fromisoformat(payload[stream][0]), str(payload[stream][1]))
+            for stream in ("changed", "deleted")
+        )
+    except (HTTPException, ValueError, KeyError, IndexError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid sync token")
+    return positions
+
+def sync_until(now: datetime) -> datetime:
+    """Upper bound of a sync pass: changes younger than the settle window wait for the next one"""
+    until = now - timedelta(seconds=SYNC_SETTLE_SECONDS)
+    # MongoDB stores milliseconds; a finer bound could split one stored instant across tokens
+    return until.replace(microsecond=until.microsecond // 1000 * 1000)
+
+async def load_stream_page(
+    collection, field: str, sort, projection: Dict[str, int],
+    after: Optional[SyncPosition], until: datetime, limit: int,
+) -> Tuple[List[Dict[str, Any]], SyncPosition, bool]:
+    """Fetch up to `limit` documents after a keyset position and before `until`
+
+    Returns the documents, the position to resume from and whether more are waiting.
+    """
+    query = {field: {"$lt": until}}
+    if after:
+        query = {"$and": [query, after_key(field, *after)]}
+    documents = await collection.find(query, projection, sort=sort, limit=limit + 1).to_list(limit + 1)
+    if len(documents) > limit:
+        last = documents[limit - 1]
+        return documents[:limit], (last[field], last["id"]), True
+    # Everything before `until` has been seen; resume at `until` itself
+    return documents, (until, ""), False
+
+# Roster index
+ROSTER_PROJECTION = {
+    "_id": 0, "id": 1, "name": 1, "age": 1, "gender": 1, "class_name": 1, "created_at": 1, "updated_at": 1,
+}
+ROSTER_SYNC_BATCH_SIZE = 5000
+
+# The RosterIndex, set once its first full load has finished
+roster_index = None
+
+async def sync_roster_index(index, positions: Optional[Tuple[SyncPosition, SyncPosition]]) -> Tuple[SyncPosition, SyncPosition]:
+    """Apply students changed and deleted since `positions`, using the delta sync streams
+
+    Without positions every student is loaded. Returns the positions to resume from.
+    """
+    until = sync_until(datetime.utcnow())
+    changed_after, deleted_after = positions or (None, (until, ""))
+    more = True
+    while more:
+        (changed, changed_after, more_changed), (deleted, deleted_after, more_deleted) = await asyncio.gather(
+            load_stream_page(
+                db.students, "updated_at", CHANGES_SORT, ROSTER_PROJECTION,
+                changed_after, until, ROSTER_SYNC_BATCH_SIZE,
+            ),
+            load_stream_page(
+                db.student_tombstones, "deleted_at", TOMBSTONES_SORT, {"_id": 0, "id": 1, "deleted_at": 1},
+                deleted_after, until, ROSTER_SYNC_BATCH_SIZE,
+            ),
+        )
+        for student in changed:
+            index.upsert(student)
+        index.remove(tombstone["id"] for tombstone in deleted)
+        more = more_changed or more_deleted
+    return changed_after, deleted_after
+
+async def maintain_roster_index():
+    """Load the roster index, then apply changes from every process every ROSTER_REFRESH_SECONDS"""
+    global roster_index
+    # numpy is only imported when the index is enabled
+    from roster import RosterIndex
+    index = RosterIndex()
+    positions = None
+    while True:
+        try:
+            positions = await sync_roster_index(index, positions)
+            index.synced_at = time.monotonic()
+            if roster_index is None:
+                logger.info(f"Roster index loaded: {index.live} students")
+                roster_index = index
+        except PyMongoError as e:
+            logger.error(f"Roster index sync failed: {e}")
+        await asyncio.sleep(ROSTER_REFRESH_SECONDS)
+
+def current_roster_index():
+    """The roster index if it is loaded and recently synced, else None"""
+    if roster_index is None or roster_index.staleness() > ROSTER_MAX_STALENESS_SECONDS:
+        return None
+    return roster_index
+
+def update_roster_index(student_ids: List[str], added: List[Dict[str, Any]]):
+    """Apply this process's own writes right away; other processes' arrive with the next sync"""
+    if roster_index is None:
+        return
+    for student in added:
+        roster_index.upsert(student)
+    added_ids = {student["id"] for student in added}
+    roster_index.remove(student_id for student_id in student_ids if student_id not in added_ids)
+
+register_stats(
+    "roster_index", "In-memory roster index",
+    lambda: roster_index.stats() if roster_index is not None else {},
+    counters=("queries", "upserts", "removals", "compactions"),
+)
+
+# Batch deletes claim students before removing them; single writes leave claimed
+# students alone, unless the claim is this old and its request must have died
+DELETE_CLAIM_TIMEOUT = timedelta(seconds=60)
+
+def unclaimed() -> Dict[str, Any]:
+    """Filter for students no batch delete is about to remove"""
+    return {"$or": [
+        {"delete_claim": {"$exists": False}},
+        {"delete_claimed_at": {"$lt": datetime.utcnow() - DELETE_CLAIM_TIMEOUT}},
+    ]}
+
+async def record_tombstones(student_ids: List[str]):
+    """Remember deletions so delta sync can report them until the TTL expires"""
+    deleted_at = datetime.utcnow()
+    await db.student_tombstones.insert_many(
+        [{"id": student_id, "deleted_at": deleted_at} for student_id in student_ids], ordered=False
+    )
+
+# Export
+EXPORT_BATCH_SIZE = 1000
+MAX_EXPORT_BATCH_SIZE = 10000
+
+async def stream_students_ndjson(cursor, batch_size: int, fields: Optional[List[str]] = None) -> AsyncIterator[bytes]:
+    """Yield students as newline-delimited JSON, one chunk per cursor batch"""
+    lines = []
+    async for student in cursor:
+        lines.append(orjson.dumps(shape_student(student, fields)))
+        if len(lines) >= batch_size:
+            yield b"\n".join(lines) + b"\n"
+            lines = []
+    if lines:
+        yield b"\n".join(lines) + b"\n"
+
+async def stream_students_csv(cursor, batch_size: int, fields: Optional[List[str]] = None) -> AsyncIterator[str]:
+    """Yield students as CSV with a header row, one chunk per cursor batch"""
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=fields or STUDENT_FIELDS)
+    writer.writeheader()
+    rows = 0
+    
+    # Send the header before the first batch arrives
+    yield buffer.getvalue()
+    buffer.seek(0)
+    buffer.truncate()
+    async for student in cursor:
+        row = shape_student(student, fields)
+        for field in ("created_at", "updated_at"):
+            if isinstance(row.get(field), datetime):
+                row[field] = row[field].isoformat()
+        writer.writerow(row)
+        rows += 1
+        if rows >= batch_size:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+            rows = 0
+    if rows:
+        yield buffer.getvalue()
+
+# Report jobs
+REPORT_FIELDS = [
+    "class_name", "name", "age", "gender", "contact_info", "parent_name", "parent_phone", "address", "id",
+]
+# Grouped by class for one sheet per class; follows the class_name_created_at_id index
+REPORT_SORT = [("class_name", ASCENDING), ("created_at", ASCENDING), ("id", ASCENDING)]
+REPORT_BATCH_SIZE = 1000
+# Stored artifact chunk size, far below MongoDB's 16MB document limit
+REPORT_CHUNK_BYTES = 1024 * 1024
+
+report_processes: Optional[ProcessPoolExecutor] = None
+
+def report_executor() -> Optional[ProcessPoolExecutor]:
+    """Process pool for report formatting, started on first use"""
+    global report_processes
+    if REPORT_PROCESSES <= 0:
+        return None
+    if report_processes is None:
+        # Spawned, not forked: a fork would copy the Motor client and its threads
+        report_processes = ProcessPoolExecutor(REPORT_PROCESSES, mp_context=multiprocessing.get_context("spawn"))
+    return report_processes
+
+async def claim_report_job() -> Optional[Dict[str, Any]]:
+    """Lease the oldest queued job, or a running one whose worker stopped before its lease ran out"""
+    while True:
+        now = datetime.utcnow()
+        job = await db.report_jobs.find_one_and_update(
+            {"$or": [{"status": "queued"}, {"status": "running", "lease_until": {"$lt": now}}]},
+            {
+                "$set": {
+                    "status": "running",
+                    "started_at": now,
+                    "lease_until": now + timedelta(seconds=REPORT_JOB_TIMEOUT_SECONDS),
+                },
+                "$inc": {"attempts": 1},
+            },
+            sort=[("created_at", ASCENDING)],
+            projection={"_id": 0},
+            return_document=ReturnDocument.AFTER,
+        )
+        if job is None or job["attempts"] <= REPORT_MAX_ATTEMPTS:
+            return job
+        await finish_report_job(job, {"status": "failed", "error": f"Gave up after {REPORT_MAX_ATTEMPTS} attempts"})
+
+async def finish_report_job(job: Dict[str, Any], fields: Dict[str, Any], expires_at: Optional[datetime] = None) -> bool:
+    """Record a job's outcome, unless a later attempt has taken the job over"""
+    finished_at = datetime.utcnow()
+    result = await db.report_jobs.update_one(
+        {"id": job["id"], "attempts": job["attempts"]},
+        {
+            "$set": {
+                **fields,
+                "finished_at": finished_at,
+                "expires_at": expires_at or finished_at + timedelta(seconds=REPORT_TTL_SECONDS),
+            },
+            "$unset": {"lease_until": ""},
+        },
+    )
+    return result.modified_count == 1
+
+async def build_report(job: Dict[str, Any]) -> ReportFile:
+    """Stream the job's students from MongoDB into a report file"""
+    loop = asyncio.get_running_loop()
+    query = {"class_name": job["class_name"]} if job.get("class_name") else {}
+    projection = {"_id": 0, **{field: 1 for field in REPORT_FIELDS}}
+    cursor = db.students.find(query, projection, batch_size=REPORT_BATCH_SIZE).sort(REPORT_SORT)
+    format_rows = ROW_FORMATTERS[job["format"]]
+    report = ReportFile(job["format"], REPORT_FIELDS)
+    try:
+        async for class_name, rows in group_rows(cursor, REPORT_FIELDS, "class_name", REPORT_BATCH_SIZE):
+            fragment = await loop.run_in_executor(report_executor(), format_rows, rows)
+            # Compressing and spooling to disk block, so they run in a thread
+            await asyncio.to_thread(report.write, class_name, fragment, len(rows))
+        await asyncio.to_thread(report.finish)
+    except BaseException:
+        report.file.close()
+        raise
+    return report
+
+async def store_report(job: Dict[str, Any], file, expires_at: datetime) -> int:
+    """Copy a finished report into report_chunks, so any replica can serve it; returns its size"""
+    size = 0
+    for n in itertools.count():
+        data = await asyncio.to_thread(file.read, REPORT_CHUNK_BYTES)
+        if not data:
+            return size
+        await db.report_chunks.insert_one(
+            {"job_id": job["id"], "attempt": job["attempts"], "n": n, "data": data, "expires_at": expires_at}
+        )
+        size += len(data)
+
+async def produce_report(job: Dict[str, Any]) -> Tuple[int, int, datetime]:
+    report = await build_report(job)
+    try:
+        expires_at = datetime.utcnow() + timedelta(seconds=REPORT_TTL_SECONDS)
+        size = await store_report(job, report.file, expires_at)
+    finally:
+        report.file.close()
+    return report.rows, size, expires_at
+
+async def run_report_job(job: Dict[str, Any]):
+    """Build and store one report, then record the outcome on the job"""
+    try:
+        rows, size, expires_at = await asyncio.wait_for(produce_report(job), REPORT_JOB_TIMEOUT_SECONDS)
+    except Exception as e:
+        if isinstance(e, asyncio.TimeoutError):
+            error = f"Timed out after {REPORT_JOB_TIMEOUT_SECONDS:g} seconds"
+        else:
+            error = str(e) or type(e).__name__
+        await finish_report_job(job, {"status": "failed", "error": error})
+        raise
+    await finish_report_job(job, {"status": "completed", "rows": rows, "size": size}, expires_at)
+
+report_workers = JobWorkers(
+    claim_report_job,
+    run_report_job,
+    concurrency=REPORT_WORKERS,
+    poll_interval=REPORT_POLL_INTERVAL_SECONDS,
+)
+register_stats(
+    "report_jobs", "Background report jobs", report_workers.stats,
+    counters=("completed", "failed"),
+)
+
+def report_filename(job: Dict[str, Any]) -> str:
+    label = re.sub(r"[^A-Za-z0-9_-]+", "_", job.get("class_name") or "all")
+    return f"roster-{label}.{job['format']}"
+
+# Bulk import
+MAX_BULK_IMPORT_ROWS = 100000
+BULK_INSERT_CHUNK_SIZE = 1000
+DUPLICATE_KEY_ERROR = 11000
+
+async def read_bulk_rows(request: Request) -> List[Any]:
+    """Read import rows from a JSON array body or an uploaded CSV file"""
+    content_type = request.headers.get("content-type", "")
+    if content_type.startswith("multipart/form-data"):
+        form = await request.form()
+        upload = form.get("file")
+        if upload is None or isinstance(upload, str):
+            raise HTTPException(status_code=400, detail="Expected a CSV upload in the 'file' field")
+        try:
+            text = (await upload.read()).decode("utf-8-sig")
+        except UnicodeDecodeError:
+            raise HTTPException(status_code=400, detail="CSV must be UTF-8")
+        # Empty CSV cells mean "not provided" for optional fields
+        return [
+            {key: value for key, value in row.items() if value != ""}
+            for row in csv.DictReader(io.StringIO(text))
+        ]
+    
+    try:
+        rows = await request.json()
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid JSON body")
+    if not isinstance(rows, list):
+        raise HTTPException(status_code=400, detail="Expected a JSON array of students")
+    return rows
+
+def validation_message(error: ValidationError) -> str:
+    return "; ".join(
+        f"{'.'.join(str(part) for part in item['loc'])}: {item['msg']}" for item in error.errors()
+    )
+
 # Student routes
+async def create_students_batch(students: List[Student]) -> List[Optional[Exception]]:
+    """Store concurrently created students with one insert_many and one summary update
+
+    Returns, per student, the error its own insert_one would have raised, or None.
+    """
+    outcomes: List[Optional[Exception]] = [None] * len(students)
+    try:
+        await db.students.insert_many([student_document(student) for student in students], ordered=False)
+    except BulkWriteError as e:
+        for write_error in e.details.get("writeErrors", []):
+            code = write_error.get("code")
+            error_type = DuplicateKeyError if code == DUPLICATE_KEY_ERROR else OperationFailure
+            outcomes[write_error["index"]] = error_type(write_error.get("errmsg", "Write failed"), code, write_error)
+    created = [student.dict() for student, outcome in zip(students, outcomes) if outcome is None]
+    if created:
+        await record_student_changes([], [], created)
+    return outcomes
+
+student_creates = GroupCommit(
+    create_students_batch,
+    max_batch=STUDENT_CREATE_BATCH_MAX,
+    max_delay=STUDENT_CREATE_BATCH_WINDOW_MS / 1000,
+) if STUDENT_CREATE_BATCH_WINDOW_MS > 0 else None
+register_stats(
+    "student_create_batching", "Group commit of student creates",
+    lambda: student_creates.stats() if student_creates is not None else {},
+    counters=("batches", "items", "full_batches", "errors"),
+)
+
 @api_router.post("/students", response_model=Student)
 async def create_student(student: StudentCreate):
     student_dict = student.dict()
     student_obj = Student(**student_dict)
     
-    # Check if student with same name already exists
-    existing_student = await db.students.find_one({"name": student_obj.name})
-    if existing_student:
+    # The unique name index rejects duplicates atomically
+    await check_name_available(student_obj.name)
+    try:
+        if student_creates is not None:
+            # Inserted and counted together with concurrent creates
+            await student_creates.submit(student_obj)
+        else:
+            _ = await db.students.insert_one(student_document(student_obj))
+    except DuplicateKeyError:
         raise HTTPException(status_code=400, detail="Student with this name already exists")
-    
-    _ = await db.students.insert_one(student_obj.dict())
+    if student_creates is None:
+        await record_student_changes([], [], [student_obj.dict()])
     return student_obj
 
-@api_router.get("/students", response_model=List[Student])
-async def get_students():
-    students = await db.students.find().to_list(1000)
-    return [Student(**student) for student in students]
+@api_router.post("/students/bulk", response_model=BulkImportResult)
+async def bulk_create_students(request: Request):
+    """Import many students from a JSON array or a CSV upload"""
+    rows = await read_bulk_rows(request)
+    if len(rows) > MAX_BULK_IMPORT_ROWS:
+        raise HTTPException(status_code=413, detail=f"At most {MAX_BULK_IMPORT_ROWS} students per import")
+    
+    results: Dict[int, BulkImportRowResult] = {}
+    candidates: Dict[int, Student] = {}
+    for index, row in enumerate(rows):
+        if not isinstance(row, dict):
+            results[index] = BulkImportRowResult(index=index, status="error", error="Expected an object")
+            continue
+        try:
+            candidates[index] = Student(**StudentCreate(**row).dict())
+        except ValidationError as e:
+            results[index] = BulkImportRowResult(index=index, status="error", error=validation_message(e))
+    
+    # One query checks every name in the batch against existing students
+    names = list({student.name for student in candidates.values()})
+    existing = []
+    if names:
+        name_options = {"collation": NAME_COLLATION} if NAME_COLLATION else {}
+        existing = await db.students.find(
+            {"name": {"$in": names}}, {"_id": 0, "name": 1}, **name_options
+        ).to_list(None)
+    taken = {name_key(student["name"]) for student in existing}
+    
+    pending = []
+    for index, student in candidates.items():
+        if name_key(student.name) in taken:
+            results[index] = BulkImportRowResult(
+                index=index, status="error", error="Student with this name already exists"
+            )
+            continue
+        taken.add(name_key(student.name))
+        pending.append((index, student))
+    
+    try:
+        for start in range(0, len(pending), BULK_INSERT_CHUNK_SIZE):
+            chunk = pending[start:start + BULK_INSERT_CHUNK_SIZE]
+            failed: Dict[int, str] = {}
+            try:
+                await db.students.insert_many([student_document(student) for _, student in chunk], ordered=False)
+            except BulkWriteError as e:
+                for write_error in e.details.get("writeErrors", []):
+                    if write_error.get("code") == DUPLICATE_KEY_ERROR:
+                        failed[write_error["index"]] = "Student with this name already exists"
+                    else:
+                        failed[write_error["index"]] = write_error.get("errmsg", "Write failed")
+            for position, (index, student) in enumerate(chunk):
+                if position in failed:
+                    results[index] = BulkImportRowResult(index=index, status="error", error=failed[position])
+                else:
+                    results[index] = BulkImportRowResult(index=index, status="created", id=student.id)
+    finally:
+        # If a later chunk fails (e.g. the connection drops), the request errors but the
+        # chunks already stored must still reach the counts, watermarks and caches
+        created = [
+            student.dict() for index, student in pending
+            if index in results and results[index].status == "created"
+        ]
+        if created:
+            await record_student_changes([], [], created)
+    
+    ordered_results = [results[index] for index in range(len(rows))]
+    created = sum(1 for result in ordered_results if result.status == "created")
+    return BulkImportResult(created=created, failed=len(rows) - created, results=ordered_results)
+
+@api_router.post("/students/batch-get", response_model=BatchGetResult)
+async def batch_get_students(batch: StudentIds, fields: Optional[str] = FIELDS_QUERY):
+    """Fetch several students with one $in query, in request order"""
+    selected = parse_fields(fields)
+    ids = list(dict.fromkeys(batch.ids))
+    found = await db.students.find({"id": {"$in": ids}}, fields_projection(selected)).to_list(len(ids))
+    by_id = {student["id"]: student for student in found}
+    return ORJSONResponse({
+        "students": [shape_student(by_id[student_id], selected) for student_id in ids if student_id in by_id],
+        "missing": [student_id for student_id in ids if student_id not in by_id],
+    })
+
+@api_router.post("/students/batch-delete", response_model=BatchDeleteResult)
+async def batch_delete_students(batch: StudentIds):
+    """Delete several students with one delete_many"""
+    ids = list(dict.fromkeys(batch.ids))
+    # Claim the students first, so the counts and tombstones below cover exactly
+    # what this request deletes even when other deletes race it
+    token = str(uuid.uuid4())
+    await db.students.update_many(
+        {"id": {"$in": ids}, **unclaimed()},
+        {"$set": {"delete_claim": token, "delete_claimed_at": datetime.utcnow()}},
+    )
+    # The summary counts need the class, gender and age of what is deleted
+    found = await db.students.find(
+        {"id": {"$in": ids}, "delete_claim": token}, {"_id": 0, "id": 1, "class_name": 1, "gender": 1, "age": 1}
+    ).to_list(len(ids))
+    deleted_ids = [student["id"] for student in found]
+    if found:
+        await db.students.delete_many({"id": {"$in": deleted_ids}, "delete_claim": token})
+        await asyncio.gather(
+            record_tombstones(deleted_ids),
+            record_student_changes(deleted_ids, found, []),
+        )
+    deleted = set(deleted_ids)
+    return {
+        "deleted": [student_id for student_id in ids if student_id in deleted],
+        "missing": [student_id for student_id in ids if student_id not in deleted],
+    }
+
+@api_router.get("/students", response_model=Union[List[Student], List[SparseStudent]])
+async def get_students(
+    request: Request,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    fields: Optional[str] = FIELDS_QUERY,
+):
+    after = decode_cursor(cursor) if cursor else None
+    selected = parse_fields(fields)
+    etag = await scope_etag(COLLECTION_SCOPE, request)
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return not_modified(etag)
+    
+    # The ETag covers the collection version and query string, so reads after a write
+    # never share a query that started before it
+    page, next_cursor = await read_flights.do(
+        f"students-page:{etag}", lambda: load_students_page({}, limit, after, selected)
+    )
+    return student_list_response(page, etag, next_cursor)
+
+@api_router.get("/students/search", response_model=Union[List[Student], List[SparseStudent]])
+async def search_students(
+    q: str = Query(..., min_length=1, max_length=200),
+    mode: str = Query("prefix", pattern="^(prefix|text)$"),
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    fields: Optional[str] = FIELDS_QUERY,
+):
+    """Prefix search on name, or ranked full-text search over name, parent_name and address"""
+    if mode == "text" and not text_index_confirmed:
+        raise HTTPException(status_code=503, detail="Text search is not available yet")
+    page, next_cursor = await search_students_page(mode, q, limit, cursor, parse_fields(fields))
+    response = ORJSONResponse(page)
+    set_next_cursor(response, next_cursor)
+    return response
+
+@api_router.get("/students/export")
+async def export_students(
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$"),
+    batch_size: int = Query(EXPORT_BATCH_SIZE, ge=1, le=MAX_EXPORT_BATCH_SIZE),
+    fields: Optional[str] = FIELDS_QUERY,
+):
+    """Stream the whole student collection as NDJSON or CSV in constant memory"""
+    selected = parse_fields(fields)
+    # Natural order avoids an in-memory sort over the whole collection
+    cursor = db.students.find({}, fields_projection(selected), batch_size=batch_size)
+    if format == "csv":
+        return StreamingResponse(
+            stream_students_csv(cursor, batch_size, selected),
+            media_type="text/csv",
+            headers={"Content-Disposition": 'attachment; filename="students.csv"'},
+        )
+    return StreamingResponse(
+        stream_students_ndjson(cursor, batch_size, selected),
+        media_type="application/x-ndjson",
+        headers={"Content-Disposition": 'attachment; filename="students.ndjson"'},
+    )
+
+@api_router.get("/students/query", response_model=RosterQueryResult)
+async def query_students(
+    age_min: Optional[int] = None,
+    age_max: Optional[int] = None,
+    gender: Optional[List[str]] = Query(None),
+    class_name: Optional[List[str]] = Query(None),
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    offset: int = Query(0, ge=0),
+):
+    """Students filtered by age range, gender and class, in created_at order
+
+    Repeat gender or class_name to match any of several values. Served from
+    the in-memory roster index when it is enabled and current, otherwise
+    from MongoDB.
+    """
+    index = current_roster_index()
+    if index is not None:
+        total, students = index.query(age_min, age_max, gender, class_name, offset, limit)
+        return ORJSONResponse({"total": total, "students": students})
+
+    query: Dict[str, Any] = {}
+    if age_min is not None or age_max is not None:
+        query["age"] = {
+            **({"$gte": age_min} if age_min is not None else {}),
+            **({"$lte": age_max} if age_max is not None else {}),
+        }
+    if gender:
+        query["gender"] = {"$in": gender}
+    if class_name:
+        query["class_name"] = {"$in": class_name}
+    projection = {"_id": 0, **{field: 1 for field in RosterEntry.model_fields}}
+    total, students = await asyncio.gather(
+        db.students.count_documents(query),
+        db.students.find(query, projection, sort=STUDENT_SORT, skip=offset, limit=limit).to_list(limit),
+    )
+    return ORJSONResponse({"total": total, "students": students})
+
+@api_router.get("/students/changes", response_model=StudentChanges)
+async def get_student_changes(
+    since: Optional[str] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    fields: Optional[str] = FIELDS_QUERY,
+):
+    """Students created or updated, and ids deleted, since a sync token
+
+    Without `since` every student is returned. Call again with `sync_token` while
+    `has_more` is true, then keep the token for the next refresh. Apply `changed`
+    before `deleted`; a student may show up in several responses if it keeps changing.
+    """
+    selected = parse_fields(fields)
+    now = datetime.utcnow()
+    until = sync_until(now)
+    if since:
+        changed_after, deleted_after = decode_sync_token(since)
+        if deleted_after[0] < now - timedelta(seconds=STUDENT_TOMBSTONE_TTL_SECONDS):
+            raise HTTPException(status_code=410, detail="Sync token expired; reload all students")
+    else:
+        # Deletions before the first sync are irrelevant to a client that has nothing yet
+        changed_after, deleted_after = None, (until, "")
 
-@api_router.get("/students/{student_id}", response_model=Student)
-async def get_student(student_id: str):
-    student = await db.students.find_one({"id": student_id})
+    (changed, changed_position, more_changed), (deleted, deleted_position, more_deleted) = await asyncio.gather(
+        load_stream_page(
+            db.students, "updated_at", CHANGES_SORT, fields_projection(selected),
+            changed_after, until, limit,
+        ),
+        load_stream_page(
+            db.student_tombstones, "deleted_at", TOMBSTONES_SORT, {"_id": 0, "id": 1, "deleted_at": 1},
+            deleted_after, until, limit,
+        ),
+    )
+    return ORJSONResponse({
+        "changed": [shape_student(student, selected) for student in changed],
+        "deleted": [tombstone["id"] for tombstone in deleted],
+        "sync_token": encode_sync_token(changed_position, deleted_position),
+        "has_more": more_changed or more_deleted,
+    })
+
+@api_router.get("/students/{student_id}", response_model=Union[Student, SparseStudent])
+async def get_student(
+    student_id: str,
+    request: Request,
+    response: Response,
+    fields: Optional[str] = FIELDS_QUERY,
+):
+    selected = parse_fields(fields)
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match:
+        # Revalidation only needs the watermark, not the document
+        watermark = await db.students.find_one({"id": student_id}, {"_id": 0, "updated_at": 1})
+        if watermark:
+            etag = student_etag(student_id, watermark.get("updated_at"), selected)
+            if etag_matches(if_none_match, etag):
+                return not_modified(etag)
+    
+    # Entries are keyed by the collection watermark, which every write bumps, so
+    # writes made through another process (which cannot drop this process's
+    # entries) are never served from here; tags still drop local entries early
+    version = await get_version(COLLECTION_SCOPE)
+    if selected is not None:
+        async def load_sparse():
+            return await db.students.find_one({"id": student_id}, fields_projection(selected))
+        
+        student = await student_cache.get_or_load(
+            f"{student_tag(student_id)}:{version}:{','.join(selected)}", load_sparse, tags=[student_tag(student_id)]
+        )
+        if not student:
+            raise HTTPException(status_code=404, detail="Student not found")
+        sparse_response = ORJSONResponse(shape_student(student, selected))
+        set_cache_headers(sparse_response, student_etag(student_id, student.get("updated_at"), selected))
+        return sparse_response
+    
+    async def load():
+        student = await db.students.find_one({"id": student_id})
+        return Student(**student) if student else None
+    
+    student = await student_cache.get_or_load(
+        f"{student_tag(student_id)}:{version}", load, tags=[student_tag(student_id)]
+    )
     if not student:
         raise HTTPException(status_code=404, detail="Student not found")
-    return Student(**student)
+    set_cache_headers(response, student_etag(student.id, student.updated_at))
+    return student
 
 @api_router.put("/students/{student_id}", response_model=Student)
 async def update_student(student_id: str, student_update: StudentUpdate):
-    student = await db.students.find_one({"id": student_id})
-    if not student:
-        raise HTTPException(status_code=404, detail="Student not found")
-    
     update_dict = student_update.dict(exclude_unset=True)
     update_dict["updated_at"] = datetime.utcnow()
+    if update_dict.get("name") is not None:
+        await check_name_available(update_dict["name"], student_id)
+        update_dict["name_lower"] = search_name(update_dict["name"])
     
-    await db.students.update_one({"id": student_id}, {"$set": update_dict})
+    # One round trip: the previous document is returned so caches of the old
+    # class can be invalidated, and the new one is the same document with the
+    # $set fields applied
+    try:
+        student = await db.students.find_one_and_update(
+            {"id": student_id, **unclaimed()},
+            {"$set": update_dict},
+            projection={"_id": 0, "delete_claim": 0, "delete_claimed_at": 0},
+            return_document=ReturnDocument.BEFORE,
+        )
+    except DuplicateKeyError:
+        raise HTTPException(status_code=400, detail="Student with this name already exists")
+    if not student:
+        raise HTTPException(status_code=404, detail="Student not found")
     
-    updated_student = await db.students.find_one({"id": student_id})
+    updated_student = {**student, **update_dict}
+    await record_student_changes([student_id], [student], [updated_student])
     return Student(**updated_student)
 
 @api_router.delete("/students/{student_id}")
 async def delete_student(student_id: str):
-    student = await db.students.find_one({"id": student_id})
+    # One round trip that also reports what the summary counts must drop
+    student = await db.students.find_one_and_delete(
+        {"id": student_id, **unclaimed()}, projection={"_id": 0, "class_name": 1, "gender": 1, "age": 1}
+    )
     if not student:
         raise HTTPException(status_code=404, detail="Student not found")
     
-    await db.students.delete_one({"id": student_id})
+    await asyncio.gather(
+        record_tombstones([student_id]),
+        record_student_changes([student_id], [student], []),
+    )
     return {"message": "Student deleted successfully"}
 
-@api_router.get("/students/class/{class_name}", response_model=List[Student])
-async def get_students_by_class(class_name: str):
-    students = await db.students.find({"class_name": class_name}).to_list(1000)
-    return [Student(**student) for student in students]
+@api_router.get("/students/class/{class_name}", response_model=Union[List[Student], List[SparseStudent]])
+async def get_students_by_class(
+    class_name: str,
+    request: Request,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    fields: Optional[str] = FIELDS_QUERY,
+):
+    after = decode_cursor(cursor) if cursor else None
+    selected = parse_fields(fields)
+    etag = await scope_etag(class_scope(class_name), request)
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return not_modified(etag)
+    
+    async def load():
+        return await load_students_page({"class_name": class_name}, limit, after, selected)
+    
+    # Keyed by the ETag (class watermark plus query), so a write made by another
+    # worker, which cannot drop this worker's entries, still changes the key
+    page, next_cursor = await student_cache.get_or_load(
+        f"class-page:{class_name}:{etag}",
+        load,
+        tags=[class_tag(class_name)],
+    )
+    return student_list_response(page, etag, next_cursor)
+
+@api_router.post("/reports", response_model=ReportJob, status_code=202)
+async def create_report(request: ReportRequest):
+    """Queue a roster report; poll GET /api/reports/{id} until it is completed"""
+    now = datetime.utcnow()
+    job = {
+        "id": str(uuid.uuid4()),
+        "status": "queued",
+        "format": request.format,
+        "class_name": request.class_name,
+        "created_at": now,
+        "attempts": 0,
+        # Replaced when the job finishes; drops jobs that were never picked up
+        "expires_at": now + timedelta(seconds=REPORT_TTL_SECONDS),
+    }
+    await db.report_jobs.insert_one(job)
+    report_workers.notify()
+    job.pop("_id", None)
+    return job
+
+@api_router.get("/reports/{job_id}", response_model=ReportJob)
+async def get_report(job_id: str):
+    job = await db.report_jobs.find_one({"id": job_id}, {"_id": 0})
+    if not job:
+        raise HTTPException(status_code=404, detail="Report not found")
+    if job["status"] == "completed":
+        job["download_url"] = f"/api/reports/{job_id}/download"
+    return job
+
+@api_router.get("/reports/{job_id}/download")
+async def download_report(job_id: str):
+    job = await db.report_jobs.find_one({"id": job_id}, {"_id": 0})
+    if not job:
+        raise HTTPException(status_code=404, detail="Report not found")
+    if job["status"] != "completed":
+        raise HTTPException(status_code=409, detail="Report is not ready")
+    # A few chunks per batch, so the download holds a few MB in memory at most
+    cursor = db.report_chunks.find(
+        {"job_id": job_id, "attempt": job["attempts"]}, {"_id": 0, "data": 1}, batch_size=4,
+    ).sort("n", ASCENDING)
+
+    async def chunks():
+        async for chunk in cursor:
+            yield chunk["data"]
+
+    return StreamingResponse(
+        chunks(),
+        media_type=REPORT_CONTENT_TYPES[job["format"]],
+        headers={
+            "Content-Disposition": f'attachment; filename="{report_filename(job)}"',
+            "Content-Length": str(job["size"]),
+        },
+    )
+
+@api_router.get("/stats", response_model=EnrollmentStats)
+async def get_stats():
+    """Student counts per class, per gender and per age, read from the summary collection"""
+    summaries = await db.student_summary.find({"count": {"$gt": 0}}, {"count": 1}).to_list(None)
+    stats = {"total": 0, "by_class": {}, "by_gender": {}, "by_age": {}}
+    for summary in summaries:
+        kind, _, key = summary["_id"].partition(":")
+        if kind == COLLECTION_SCOPE:
+            stats["total"] = summary["count"]
+        elif kind == "class":
+            stats["by_class"][key] = summary["count"]
+        elif kind == "gender":
+            stats["by_gender"][key] = summary["count"]
+        elif kind == "age":
+            stats["by_age"][int(key)] = summary["count"]
+    return stats
+
+@api_router.get("/cache/stats")
+async def cache_stats():
+    """Hit/miss counters and occupancy of the student read cache"""
+    return student_cache.stats()
+
+@api_router.get("/metrics")
+async def metrics():
+    """Prometheus metrics in the text exposition format"""
+    return Response(render_latest(), media_type=CONTENT_TYPE_LATEST)
 
 @api_router.get("/")
 async def root():
@@ -118,37 +1586,209 @@ async def root():
 
 @api_router.get("/health")
 async def health_check():
-    """Health check endpoint for load balancer"""
-    try:
-        # Test database connection
-        await db.admin.command('ping')
-        return {
-            "status": "healthy",
-            "timestamp": datetime.utcnow(),
-            "database": "connected"
-        }
-    except Exception as e:
-        logger.error(f"Health check failed: {e}")
+    """Health check endpoint for load balancer; reads the background monitor's state"""
+    if not health_monitor.healthy:
         raise HTTPException(status_code=503, detail="Service unavailable")
+    return {
+        "status": "healthy",
+        "timestamp": datetime.utcnow(),
+        "database": "connected",
+        **health_monitor.snapshot(),
+    }
+
+@api_router.get("/health/live")
+async def liveness():
+    """Liveness probe: the process is serving requests, regardless of the database"""
+    return {"status": "alive", "timestamp": datetime.utcnow()}
+
+@api_router.get("/health/ready")
+async def readiness():
+    """Readiness probe: the database is reachable and the connection pool has headroom"""
+    saturation = pool_tracker.saturation()
+    ready = not in_flight.draining and health_monitor.healthy and saturation < POOL_SATURATION_THRESHOLD
+    body = {
+        "status": "ready" if ready else "not ready",
+        "timestamp": datetime.utcnow(),
+        "database": health_monitor.snapshot(),
+        "pool": pool_tracker.stats(),
+        # False means duplicate names are only caught by a pre-read, which races
+        "name_index": name_index_confirmed,
+        "text_index": text_index_confirmed,
+    }
+    if not ready:
+        return ORJSONResponse(body, status_code=503)
+    return body
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+async def warm_up_pool(min_size: int, timeout: float) -> int:
+    """Open `min_size` connections up front so early requests skip connection setup
+
+    Concurrent pings force separate check-outs; pymongo's own minPoolSize
+    maintenance only fills the pool in the background. Returns the number
+    of open connections when done or when `timeout` runs out.
+    """
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    try:
+        await asyncio.wait_for(
+            asyncio.gather(*(db.admin.command('ping') for _ in range(min_size))),
+            timeout=timeout,
+        )
+        while pool_tracker.connections < min_size and loop.time() < deadline:
+            await asyncio.sleep(0.05)
+    except Exception as e:
+        logger.warning(f"Connection pool warm-up incomplete: {e}")
+    return pool_tracker.connections
+
+async def build_indexes():
+    """Create missing indexes after startup, required ones first"""
+    # Existing deployments usually have them already, which confirms them right away
+    await confirm_indexes(report=False)
+    await create_indexes(required=True)
+    await confirm_indexes()
+    await create_indexes(required=False)
+
+async def create_indexes(required: bool):
+    if not ENSURE_INDEXES_ON_STARTUP:
+        return
+    try:
+        await ensure_indexes(required)
+    except PyMongoError as e:
+        # Existing duplicates, conflicting index options or an unreachable server;
+        # keep serving and let `python manage.py ensure-indexes` report the details
+        logger.error(f"Index creation failed: {e}")
+
+async def migrate_data():
+    """Bring data written by older releases up to date, once per database"""
+    if not MIGRATE_DATA_ON_STARTUP:
+        return
+    try:
+        updated = await backfill_search_fields()
+        if updated:
+            logger.info(f"Search fields backfilled for {updated} students")
+    except PyMongoError as e:
+        # `python manage.py backfill-search-fields` does the same by hand
+        logger.error(f"Search field backfill failed: {e}")
+    try:
+        if await seed_summary_counts():
+            logger.info("Summary counts rebuilt from the students collection")
+    except PyMongoError as e:
+        # `python manage.py rebuild-stats` does the same by hand
+        logger.error(f"Summary rebuild failed: {e}")
+
+# Admission control: bounded concurrency and queueing for database-bound requests
+ADMISSION_MAX_CONCURRENT = int(os.environ.get('ADMISSION_MAX_CONCURRENT', '100'))
+ADMISSION_RETRY_AFTER_SECONDS = int(os.environ.get('ADMISSION_RETRY_AFTER_SECONDS', '1'))
+admission = AdmissionController(
+    max_concurrent=ADMISSION_MAX_CONCURRENT,
+    max_queue=int(os.environ.get('ADMISSION_MAX_QUEUE', '200')),
+    queue_timeout=float(os.environ.get('ADMISSION_QUEUE_TIMEOUT_SECONDS', '2')),
+)
+register_stats(
+    "admission", "Admission control", admission.stats,
+    counters=(
+        "admitted", "waited", "shed", "shed_queue_full", "shed_timeout", "shed_evicted",
+        "shed_read", "shed_write",
+    ),
+)
+
+# Probes and metrics must answer even when the database is saturated
+ADMISSION_EXEMPT_PATHS = {
+    "/api/", "/api/health", "/api/health/live", "/api/health/ready", "/api/metrics", "/api/cache/stats",
+}
+READ_ONLY_POSTS = {"/api/students/batch-get"}
+
+def admission_priority(method: str, path: str) -> Optional[str]:
+    if not path.startswith("/api/") or path in ADMISSION_EXEMPT_PATHS or method == "OPTIONS":
+        return None
+    if method in ("GET", "HEAD") or path in READ_ONLY_POSTS:
+        return "read"
+    return "write"
+
+# Requests being served, so shutdown can wait for them before closing the client
+in_flight = InFlightRequests()
+SHUTDOWN_DRAIN_TIMEOUT_SECONDS = float(os.environ.get('SHUTDOWN_DRAIN_TIMEOUT_SECONDS', '5'))
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    connect_database()
+    # Startup finishes before the server accepts requests, so probes only pass once warm
+    min_size = MONGO_CLIENT_OPTIONS.get('minPoolSize', 0)
+    if min_size:
+        opened = await warm_up_pool(min_size, MONGO_WARMUP_TIMEOUT_SECONDS)
+        logger.info(f"Connection pool warmed up: {opened}/{min_size} connections open")
+    health_monitor.start()
+    if REPORT_WORKERS > 0:
+        report_workers.start()
+    roster_maintenance = asyncio.create_task(maintain_roster_index()) if ROSTER_INDEX_ENABLED else None
+    # With several workers each one publishes its component stats for the others' scrapes
+    stats_publisher = asyncio.create_task(publish_stats_forever(METRICS_PUBLISH_INTERVAL_SECONDS)) if MULTIPROCESS else None
+    # Index builds can take a while on a large collection, or wait out server
+    # selection while the database is unreachable, so they don't hold up startup;
+    # writes and text search fall back until the required ones are confirmed
+    index_build = asyncio.create_task(build_indexes())
+    data_migration = asyncio.create_task(migrate_data())
+    yield
+    remaining = await in_flight.drain(SHUTDOWN_DRAIN_TIMEOUT_SECONDS)
+    if remaining:
+        logger.warning(f"Closing the database client with {remaining} requests still running")
+    if not index_build.done():
+        index_build.cancel()
+        logger.warning("Shutting down before index creation finished")
+    if not data_migration.done():
+        data_migration.cancel()
+        logger.warning("Shutting down before the data migration finished")
+    # Unfinished report jobs are retried by another worker once their lease runs out
+    await report_workers.stop()
+    if roster_maintenance is not None:
+        roster_maintenance.cancel()
+    if stats_publisher is not None:
+        stats_publisher.cancel()
+    mark_worker_dead()
+    if report_processes is not None:
+        report_processes.shutdown(wait=False, cancel_futures=True)
+    await health_monitor.stop()
+    client.close()
+
+# Create the main app without a prefix
+app = FastAPI(lifespan=lifespan)
 
 # Include the router in the main app
 app.include_router(api_router)
 
+# Inside CORS, so rejected requests still carry CORS headers for the browser
+if ADMISSION_MAX_CONCURRENT > 0:
+    app.add_middleware(
+        AdmissionMiddleware,
+        controller=admission,
+        classify=admission_priority,
+        retry_after=ADMISSION_RETRY_AFTER_SECONDS,
+    )
+
 app.add_middleware(
     CORSMiddleware,
     allow_credentials=True,
     allow_origins=["*"],
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER, "ETag", "Retry-After", "Server-Timing"],
 )
 
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
-logger = logging.getLogger(__name__)
+app.add_middleware(InFlightMiddleware, requests=in_flight)
+
+if PROFILE_TOKEN or PROFILE_SAMPLE_RATE > 0:
+    app.add_middleware(
+        ProfilingMiddleware,
+        token=PROFILE_TOKEN,
+        sample_rate=PROFILE_SAMPLE_RATE,
+        profile_dir=PROFILE_DIR,
+    )
 
-@app.on_event("shutdown")
-async def shutdown_db_client():
-    client.close()
\ No newline at end of file
+# Outermost, so latency includes every other middleware
+app.add_middleware(PrometheusMiddleware)
@@ -126,6 +126,17 @@ stop_local() {
     log_success "Local environment stopped"
 }
 
+# Data maintenance on the local stack
+maintain() {
+    log_info "Backfilling search fields..."
+    docker-compose exec backend python manage.py backfill-search-fields
+    
+    log_info "Rebuilding enrollment statistics..."
+    docker-compose exec backend python manage.py rebuild-stats
+    
+    log_success "Data maintenance completed"
+}
+
 # Deploy to AWS
 deploy_aws() {
     log_info "Deploying to AWS..."
@@ -194,6 +205,9 @@ main() {
         "stop")
             stop_local
             ;;
+        "maintain")
+            maintain
+            ;;
         "deploy")
             check_prerequisites
             setup_environment
@@ -205,7 +219,7 @@ main() {
             cleanup
             ;;
         *)
-            echo "Usage: $0 {check|setup|build|test|start|stop|deploy|clean}"
+            echo "Usage: $0 {check|setup|build|test|start|stop|maintain|deploy|clean}"
             echo ""
             echo "Commands:"
             echo "  check   - Check prerequisites"
@@ -214,6 +228,7 @@ main() {
             echo "  test    - Run tests"
             echo "  start   - Start local development environment"
             echo "  stop    - Stop local development environment"
+            echo "  maintain - Rebuild derived data (search fields, stats counts) on the local stack"
             echo "  deploy  - Deploy to AWS (requires AWS credentials)"
             echo "  clean   - Clean up Docker images and temporary files"
             exit 1
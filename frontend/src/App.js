@@ -4,6 +4,8 @@ import axios from "axios";
 
 const BACKEND_URL = process.env.REACT_APP_BACKEND_URL;
 const API = `${BACKEND_URL}/api`;
+// Students fetched per request; further pages load on demand
+const PAGE_SIZE = 100;
 
 // Language Context
 const LanguageContext = createContext();
@@ -44,6 +46,7 @@ const translations = {
     edit: "Edit",
     delete: "Delete",
     back: "Back",
+    loadMore: "Load more",
     
     // Gender options
     male: "Male",
@@ -102,6 +105,7 @@ const translations = {
     edit: "Bearbeiten",
     delete: "Löschen",
     back: "Zurück",
+    loadMore: "Mehr laden",
     
     // Gender options
     male: "Männlich",
@@ -442,7 +446,7 @@ const StudentRegistrationForm = ({ onSubmit, onCancel }) => {
 };
 
 // Student List Component
-const StudentList = ({ students, onBack }) => {
+const StudentList = ({ students, hasMore, onLoadMore, onBack }) => {
   const { t } = useLanguage();
 
   return (
@@ -453,7 +457,7 @@ const StudentList = ({ students, onBack }) => {
             <div>
               <h2 className="text-2xl font-bold text-gray-800">{t('studentList')}</h2>
               <p className="text-gray-600 mt-1">
-                {t('totalStudents')}: {students.length}
+                {t('totalStudents')}: {students.length}{hasMore ? '+' : ''}
               </p>
             </div>
             <button
@@ -520,6 +524,16 @@ const StudentList = ({ students, onBack }) => {
               ))}
             </div>
           )}
+          {hasMore && (
+            <div className="mt-6 text-center">
+              <button
+                onClick={onLoadMore}
+                className="px-6 py-2 bg-purple-600 text-white rounded-lg hover:bg-purple-700 transition-colors"
+              >
+                {t('loadMore')}
+              </button>
+            </div>
+          )}
         </div>
       </div>
     </div>
@@ -531,6 +545,7 @@ const MainApp = () => {
   const { t } = useLanguage();
   const [currentView, setCurrentView] = useState('home');
   const [students, setStudents] = useState([]);
+  const [nextCursor, setNextCursor] = useState(null);
   const [loading, setLoading] = useState(false);
   const [message, setMessage] = useState('');
 
@@ -558,11 +573,15 @@ const MainApp = () => {
     }
   };
 
-  const fetchStudents = async () => {
+  // Loads the first page, or the page after `cursor` appended to the list
+  const fetchStudents = async (cursor = null) => {
     try {
       setLoading(true);
-      const response = await axios.get(`${API}/students`);
-      setStudents(response.data);
+      const response = await axios.get(`${API}/students`, {
+        params: cursor ? { limit: PAGE_SIZE, cursor } : { limit: PAGE_SIZE },
+      });
+      setStudents((loaded) => (cursor ? [...loaded, ...response.data] : response.data));
+      setNextCursor(response.headers['x-next-cursor'] || null);
     } catch (error) {
       console.error('Error fetching students:', error);
       showMessage(t('error'), 'error');
@@ -590,6 +609,8 @@ const MainApp = () => {
       return (
         <StudentList
           students={students}
+          hasMore={nextCursor !== null}
+          onLoadMore={() => fetchStudents(nextCursor)}
           onBack={() => setCurrentView('home')}
         />
       );
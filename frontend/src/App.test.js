@@ -154,7 +154,7 @@ describe('School MIS Frontend Tests', () => {
       }
     ];
 
-    mockedAxios.get.mockResolvedValueOnce({ data: mockStudents });
+    mockedAxios.get.mockResolvedValueOnce({ data: mockStudents, headers: {} });
 
     render(<App />);
     
@@ -170,6 +170,41 @@ describe('School MIS Frontend Tests', () => {
     });
   });
 
+  test('loads the next page with the cursor on demand', async () => {
+    const student = (id, name) => ({
+      id,
+      name,
+      age: 16,
+      class_name: '10A',
+      gender: 'male',
+      contact_info: '',
+      created_at: new Date().toISOString(),
+      updated_at: new Date().toISOString()
+    });
+    mockedAxios.get
+      .mockResolvedValueOnce({ data: [student('1', 'John Doe')], headers: { 'x-next-cursor': 'abc' } })
+      .mockResolvedValueOnce({ data: [student('2', 'Jane Smith')], headers: {} });
+
+    render(<App />);
+    fireEvent.click(screen.getByText('View Students'));
+
+    await waitFor(() => {
+      expect(screen.getByText('Total Students: 1+')).toBeInTheDocument();
+    });
+    expect(mockedAxios.get).toHaveBeenCalledTimes(1);
+    expect(mockedAxios.get.mock.calls[0][1].params).toEqual({ limit: 100 });
+
+    fireEvent.click(screen.getByText('Load more'));
+
+    await waitFor(() => {
+      expect(screen.getByText('Total Students: 2')).toBeInTheDocument();
+      expect(screen.getByText('John Doe')).toBeInTheDocument();
+      expect(screen.getByText('Jane Smith')).toBeInTheDocument();
+    });
+    expect(mockedAxios.get.mock.calls[1][1].params).toEqual({ limit: 100, cursor: 'abc' });
+    expect(screen.queryByText('Load more')).not.toBeInTheDocument();
+  });
+
   test('handles API error gracefully', async () => {
     mockedAxios.get.mockRejectedValueOnce(new Error('Network Error'));
 
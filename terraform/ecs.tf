@@ -228,7 +228,7 @@ resource "aws_ecs_task_definition" "main" {
       healthCheck = {
         command = [
           "CMD-SHELL",
-          "curl -f http://localhost:${var.app_port}/api/ || exit 1"
+          "curl -f http://localhost:${var.app_port}/api/health/live || exit 1"
         ]
         interval    = 30
         timeout     = 5
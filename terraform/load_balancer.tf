@@ -185,12 +185,15 @@ resource "aws_lb_target_group" "backend" {
   vpc_id      = aws_vpc.main.id
   target_type = "ip"
 
+  # Liveness only: ECS replaces tasks that fail this check, and backend and frontend
+  # share a task, so a database blip or load spike must not fail it. Saturation is
+  # handled by admission control; /api/health/ready is for dashboards and alerts.
   health_check {
     enabled             = true
     healthy_threshold   = 2
     interval            = 30
     matcher             = "200"
-    path                = "/api/"
+    path                = "/api/health/live"
     port                = "traffic-port"
     protocol            = "HTTP"
     timeout             = 5
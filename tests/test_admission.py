@@ -0,0 +1,123 @@
+import asyncio
+import os
+import sys
+
+import pytest
+from fastapi.testclient import TestClient
+
+# Add the backend directory to Python path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'backend'))
+
+import server
+from admission import AdmissionController, AdmissionMiddleware
+
+
+class TestAdmissionController:
+    """Test cases for concurrency limiting and load shedding"""
+
+    def test_admits_up_to_the_limit_then_queues(self):
+        async def scenario():
+            controller = AdmissionController(max_concurrent=1, max_queue=5, queue_timeout=1)
+            assert await controller.acquire("read") is None
+            waiter = asyncio.ensure_future(controller.acquire("read"))
+            await asyncio.sleep(0)
+            assert controller.stats()["queue_depth"] == 1
+            controller.release()
+            assert await waiter is None
+            assert controller.in_flight == 1
+            controller.release()
+            assert controller.stats()["in_flight"] == 0
+            assert controller.stats()["waited"] == 1
+        asyncio.run(scenario())
+
+    def test_writes_are_admitted_before_reads(self):
+        async def scenario():
+            controller = AdmissionController(max_concurrent=1, max_queue=5, queue_timeout=1)
+            await controller.acquire("read")
+            order = []
+
+            async def request(priority):
+                await controller.acquire(priority)
+                order.append(priority)
+                controller.release()
+
+            waiters = [asyncio.ensure_future(request(priority)) for priority in ("read", "write", "read")]
+            await asyncio.sleep(0)
+            controller.release()
+            await asyncio.gather(*waiters)
+            assert order == ["write", "read", "read"]
+        asyncio.run(scenario())
+
+    def test_wait_deadline_sheds(self):
+        async def scenario():
+            controller = AdmissionController(max_concurrent=1, max_queue=5, queue_timeout=0.01)
+            await controller.acquire("read")
+            assert await controller.acquire("read") == "timeout"
+            stats = controller.stats()
+            assert stats["queue_depth"] == 0
+            assert stats["shed_timeout"] == 1
+            # The abandoned entry is skipped when the slot frees up
+            controller.release()
+            assert controller.in_flight == 0
+        asyncio.run(scenario())
+
+    def test_full_queue_sheds_or_evicts_lower_priority(self):
+        async def scenario():
+            controller = AdmissionController(max_concurrent=1, max_queue=1, queue_timeout=1)
+            await controller.acquire("write")
+            queued_read = asyncio.ensure_future(controller.acquire("read"))
+            await asyncio.sleep(0)
+            assert await controller.acquire("read") == "queue_full"
+
+            queued_write = asyncio.ensure_future(controller.acquire("write"))
+            await asyncio.sleep(0)
+            assert await queued_read == "evicted"
+            controller.release()
+            assert await queued_write is None
+            stats = controller.stats()
+            assert stats["shed_queue_full"] == 1
+            assert stats["shed_evicted"] == 1
+            assert stats["shed_read"] == 2
+            assert stats["shed"] == 2
+        asyncio.run(scenario())
+
+    def test_cancelled_waiter_leaves_the_queue(self):
+        async def scenario():
+            controller = AdmissionController(max_concurrent=1, max_queue=5, queue_timeout=1)
+            await controller.acquire("read")
+            waiter = asyncio.ensure_future(controller.acquire("read"))
+            await asyncio.sleep(0)
+            waiter.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await waiter
+            assert controller.stats()["queue_depth"] == 0
+            assert controller.stats()["shed"] == 0
+            controller.release()
+            assert controller.in_flight == 0
+        asyncio.run(scenario())
+
+
+class TestAdmissionMiddleware:
+    """Test cases for shedding at the HTTP layer"""
+
+    def test_shed_requests_get_503_with_retry_after(self):
+        controller = AdmissionController(max_concurrent=0, max_queue=0, queue_timeout=0)
+
+        async def app(scope, receive, send):
+            await send({"type": "http.response.start", "status": 200, "headers": []})
+            await send({"type": "http.response.body", "body": b"ok"})
+
+        client = TestClient(AdmissionMiddleware(app, controller, server.admission_priority, retry_after=2))
+        response = client.get("/api/students")
+        assert response.status_code == 503
+        assert response.headers["retry-after"] == "2"
+        # Probes bypass admission entirely
+        assert client.get("/api/health/ready").status_code == 200
+
+    def test_request_priorities(self):
+        assert server.admission_priority("GET", "/api/students") == "read"
+        assert server.admission_priority("POST", "/api/students/batch-get") == "read"
+        assert server.admission_priority("POST", "/api/students") == "write"
+        assert server.admission_priority("DELETE", "/api/students/1") == "write"
+        assert server.admission_priority("GET", "/api/health") is None
+        assert server.admission_priority("GET", "/docs") is None
@@ -1,19 +1,45 @@
 import pytest
 import asyncio
+import httpx
 from httpx import AsyncClient
 from fastapi.testclient import TestClient
-from unittest.mock import AsyncMock, patch
+from unittest.mock import AsyncMock, Mock, patch
+from pymongo.errors import AutoReconnect, BulkWriteError, DuplicateKeyError
 import sys
 import os
+import io
+import csv
+import json
+import time
+from datetime import datetime
 
 # Add the backend directory to Python path
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'backend'))
 
+import server
+from health import HealthMonitor
 from server import app, db
 
 # Test client
 client = TestClient(app)
 
+def mock_side_collections(mock_db, version=0):
+    """Mock the bookkeeping collections that student reads and writes touch"""
+    mock_db.student_summary.find_one = AsyncMock(return_value={"_id": "students", "version": version})
+    mock_db.student_summary.bulk_write = AsyncMock(return_value=None)
+    mock_db.student_tombstones.insert_many = AsyncMock(return_value=None)
+
+@pytest.fixture(autouse=True)
+def clear_student_cache():
+    """Keep cached lookups from leaking between tests"""
+    asyncio.run(server.student_cache.clear())
+
+@pytest.fixture(autouse=True)
+def required_indexes_confirmed(monkeypatch):
+    """Requests rely on the unique name and text indexes, as they do once startup confirmed them"""
+    monkeypatch.setattr(server, "name_index_confirmed", True)
+    monkeypatch.setattr(server, "text_index_confirmed", True)
+
 class TestSchoolMISAPI:
     """Test cases for School MIS API endpoints"""
     
@@ -31,28 +57,123 @@ class TestSchoolMISAPI:
         """Test health check endpoint when database is healthy"""
         # Mock successful database ping
         mock_db.admin.command = AsyncMock(return_value={"ok": 1})
+        monitor = HealthMonitor(server.ping_database)
+        asyncio.run(monitor.check())
         
-        response = client.get("/api/health")
+        with patch('server.health_monitor', monitor):
+            response = client.get("/api/health")
         assert response.status_code == 200
         data = response.json()
         assert data["status"] == "healthy"
         assert "timestamp" in data
         assert data["database"] == "connected"
+        assert data["consecutive_failures"] == 0
+        assert data["latency_ms"] is not None
     
     @patch('server.db')
     def test_health_check_failure(self, mock_db):
         """Test health check endpoint when database is unhealthy"""
         # Mock database connection failure
         mock_db.admin.command = AsyncMock(side_effect=Exception("Database connection failed"))
+        monitor = HealthMonitor(server.ping_database, failure_threshold=1)
+        asyncio.run(monitor.check())
         
-        response = client.get("/api/health")
+        with patch('server.health_monitor', monitor):
+            response = client.get("/api/health")
         assert response.status_code == 503
         data = response.json()
         assert "Service unavailable" in data["detail"]
+
+    @patch('server.db')
+    def test_health_check_does_not_ping(self, mock_db):
+        """Probes are answered from the monitor's cached state"""
+        mock_db.admin.command = AsyncMock(return_value={"ok": 1})
+        monitor = HealthMonitor(server.ping_database)
+        asyncio.run(monitor.check())
+        mock_db.admin.command.reset_mock()
+
+        with patch('server.health_monitor', monitor):
+            for _ in range(3):
+                assert client.get("/api/health").status_code == 200
+        mock_db.admin.command.assert_not_called()
+
+    def test_health_check_before_first_ping(self):
+        """No successful ping yet means not healthy"""
+        with patch('server.health_monitor', HealthMonitor(server.ping_database)):
+            assert client.get("/api/health").status_code == 503
+            assert client.get("/api/health/ready").status_code == 503
+
+    @patch('server.db')
+    def test_liveness_ignores_database(self, mock_db):
+        """Liveness stays up while the database is down"""
+        mock_db.admin.command = AsyncMock(side_effect=Exception("Database connection failed"))
+        monitor = HealthMonitor(server.ping_database, failure_threshold=1)
+        asyncio.run(monitor.check())
+
+        with patch('server.health_monitor', monitor):
+            response = client.get("/api/health/live")
+        assert response.status_code == 200
+        assert response.json()["status"] == "alive"
+
+    @patch('server.db')
+    def test_readiness(self, mock_db):
+        """Readiness reflects database health and pool saturation"""
+        mock_db.admin.command = AsyncMock(return_value={"ok": 1})
+        monitor = HealthMonitor(server.ping_database)
+        asyncio.run(monitor.check())
+
+        with patch('server.health_monitor', monitor), \
+                patch.object(server.pool_tracker, 'saturation', return_value=0.1):
+            response = client.get("/api/health/ready")
+        assert response.status_code == 200
+        assert response.json()["status"] == "ready"
+
+        with patch('server.health_monitor', monitor), \
+                patch.object(server.pool_tracker, 'saturation', return_value=0.95):
+            response = client.get("/api/health/ready")
+        assert response.status_code == 503
+        data = response.json()
+        assert data["status"] == "not ready"
+        assert data["database"]["healthy"] is True
+    
+    def test_mongo_client_options_from_env(self):
+        """Pool settings come from the environment and unset ones keep driver defaults"""
+        env = {
+            "MONGO_MAX_POOL_SIZE": "50",
+            "MONGO_MIN_POOL_SIZE": "5",
+            "MONGO_SERVER_SELECTION_TIMEOUT_MS": "3000",
+            "MONGO_COMPRESSORS": "zstd,zlib",
+        }
+        with patch.dict(os.environ, env):
+            options = server.mongo_client_options()
+        assert options == {
+            "maxPoolSize": 50,
+            "minPoolSize": 5,
+            "serverSelectionTimeoutMS": 3000,
+            "compressors": "zstd,zlib",
+        }
+        assert "socketTimeoutMS" not in options
+
+    @patch('server.db')
+    def test_warm_up_pool(self, mock_db):
+        """Warm-up issues one concurrent ping per wanted connection"""
+        mock_db.admin.command = AsyncMock(return_value={"ok": 1})
+        with patch.object(server.pool_tracker, 'connections', 3):
+            opened = asyncio.run(server.warm_up_pool(3, timeout=1))
+        assert opened == 3
+        assert mock_db.admin.command.await_count == 3
+
+    @patch('server.db')
+    def test_warm_up_pool_gives_up_after_timeout(self, mock_db):
+        """An unreachable database does not block startup forever"""
+        mock_db.admin.command = AsyncMock(side_effect=Exception("No servers available"))
+        with patch.object(server.pool_tracker, 'connections', 0):
+            assert asyncio.run(server.warm_up_pool(3, timeout=0.1)) == 0
     
     @patch('server.db')
     def test_create_student_success(self, mock_db):
         """Test successful student creation"""
+        mock_side_collections(mock_db)
         # Mock database operations
         mock_db.students.find_one = AsyncMock(return_value=None)
         mock_db.students.insert_one = AsyncMock(return_value=None)
@@ -75,12 +196,14 @@ class TestSchoolMISAPI:
         assert data["age"] == student_data["age"]
         assert "id" in data
         assert "created_at" in data
+        # Duplicate detection relies on the unique index, not a pre-read
+        mock_db.students.find_one.assert_not_called()
     
     @patch('server.db')
     def test_create_student_duplicate(self, mock_db):
         """Test student creation with duplicate name"""
-        # Mock existing student
-        mock_db.students.find_one = AsyncMock(return_value={"name": "John Doe"})
+        # Mock the unique name index rejecting the insert
+        mock_db.students.insert_one = AsyncMock(side_effect=DuplicateKeyError("E11000 duplicate key"))
         
         student_data = {
             "name": "John Doe",
@@ -95,9 +218,48 @@ class TestSchoolMISAPI:
         data = response.json()
         assert "already exists" in data["detail"]
     
+    @patch('server.db')
+    def test_create_student_checks_name_without_index(self, mock_db, monkeypatch):
+        """Test duplicates are still rejected while the unique name index is missing"""
+        monkeypatch.setattr(server, "name_index_confirmed", False)
+        mock_db.students.find_one = AsyncMock(return_value={"_id": "existing"})
+        mock_db.students.insert_one = AsyncMock()
+        
+        response = client.post("/api/students", json={
+            "name": "John Doe", "age": 16, "class_name": "10A", "gender": "male", "contact_info": ""
+        })
+        assert response.status_code == 400
+        assert mock_db.students.find_one.call_args.args[0] == {"name": "John Doe"}
+        mock_db.students.insert_one.assert_not_called()
+        
+        mock_db.students.find_one_and_update = AsyncMock()
+        response = client.put("/api/students/1", json={"name": "John Doe"})
+        assert response.status_code == 400
+        assert mock_db.students.find_one.call_args.args[0] == {"name": "John Doe", "id": {"$ne": "1"}}
+        mock_db.students.find_one_and_update.assert_not_called()
+    
+    @patch('server.db')
+    def test_confirm_indexes(self, mock_db, monkeypatch):
+        monkeypatch.setattr(server, "name_index_confirmed", False)
+        mock_db.students.index_information = AsyncMock(return_value={"_id_": {}, "id_unique": {}})
+        assert asyncio.run(server.confirm_indexes()) is False
+        assert server.text_index_confirmed is False
+        mock_db.students.index_information = AsyncMock(return_value={"name_unique": {}, "student_text": {}})
+        assert asyncio.run(server.confirm_indexes()) is True
+        assert server.text_index_confirmed is True
+    
+    @patch('server.db')
+    def test_text_search_unavailable_without_index(self, mock_db, monkeypatch):
+        """Test text search answers 503 instead of failing while its index is missing"""
+        monkeypatch.setattr(server, "text_index_confirmed", False)
+        response = client.get("/api/students/search?q=john&mode=text")
+        assert response.status_code == 503
+        mock_db.students.aggregate.assert_not_called()
+    
     @patch('server.db')
     def test_get_students(self, mock_db):
         """Test getting all students"""
+        mock_side_collections(mock_db)
         # Mock students data
         mock_students = [
             {
@@ -119,9 +281,88 @@ class TestSchoolMISAPI:
         assert len(data) == 1
         assert data[0]["name"] == "John Doe"
     
+    @patch('server.db')
+    def test_get_students_fast_path(self, mock_db):
+        """Test list routes project away _id and fill optional fields without Student objects"""
+        mock_side_collections(mock_db)
+        mock_db.students.find.return_value.to_list = AsyncMock(return_value=[{
+            "id": "1",
+            "name": "John Doe",
+            "age": 16,
+            "class_name": "10A",
+            "gender": "male",
+            "contact_info": "john.doe@email.com",
+            "created_at": datetime(2024, 1, 1, 8, 30, 0, 123000),
+            "updated_at": datetime(2024, 1, 1, 8, 30, 0, 123000)
+        }])
+        
+        with patch('server.Student') as mock_student:
+            response = client.get("/api/students")
+            mock_student.assert_not_called()
+        assert response.status_code == 200
+        data = response.json()
+        assert data[0]["parent_name"] is None
+        assert data[0]["created_at"] == "2024-01-01T08:30:00.123000"
+        projection = mock_db.students.find.call_args.args[1]
+        assert projection["_id"] == 0
+        assert projection["name"] == 1
+    
+    @patch('server.db')
+    def test_get_students_sparse_fields(self, mock_db):
+        """Test ?fields= becomes a Mongo projection and trims the response"""
+        mock_side_collections(mock_db)
+        mock_db.students.find.return_value.to_list = AsyncMock(return_value=[
+            {"id": "1", "name": "John Doe", "created_at": datetime(2024, 1, 1), "updated_at": datetime(2024, 1, 1)},
+            {"id": "2", "name": "Jane Doe", "created_at": datetime(2024, 1, 2), "updated_at": datetime(2024, 1, 2)},
+        ])
+        
+        response = client.get("/api/students?fields=name&limit=1")
+        assert response.status_code == 200
+        assert response.json() == [{"id": "1", "name": "John Doe"}]
+        # The next cursor still works although created_at was not requested
+        assert "X-Next-Cursor" in response.headers
+        projection = mock_db.students.find.call_args.args[1]
+        assert projection == {"_id": 0, "id": 1, "name": 1, "created_at": 1, "updated_at": 1}
+    
+    @patch('server.db')
+    def test_get_student_sparse_fields(self, mock_db):
+        """Test a single student can be fetched with a subset of fields"""
+        mock_side_collections(mock_db)
+        mock_db.students.find_one = AsyncMock(return_value={
+            "id": "1", "class_name": "10A", "created_at": datetime(2024, 1, 1), "updated_at": datetime(2024, 1, 1)
+        })
+        
+        response = client.get("/api/students/1?fields=class_name")
+        assert response.status_code == 200
+        assert response.json() == {"id": "1", "class_name": "10A"}
+        assert "ETag" in response.headers
+        assert mock_db.students.find_one.call_args.args[1]["class_name"] == 1
+        assert "address" not in mock_db.students.find_one.call_args.args[1]
+    
+    def test_sparse_fields_documented_in_openapi(self):
+        """Test routes taking ?fields= document the sparse shape next to the full one"""
+        schema = app.openapi()
+        sparse = schema["components"]["schemas"]["SparseStudent"]
+        assert sparse["required"] == ["id"]
+        assert set(sparse["properties"]) == set(server.STUDENT_FIELDS)
+        for path in ("/api/students", "/api/students/search", "/api/students/class/{class_name}"):
+            listed = schema["paths"][path]["get"]["responses"]["200"]["content"]["application/json"]["schema"]
+            assert {option["items"]["$ref"].rsplit("/", 1)[1] for option in listed["anyOf"]} == {
+                "Student", "SparseStudent",
+            }
+        by_id = schema["paths"]["/api/students/{student_id}"]["get"]["responses"]["200"]["content"]["application/json"]["schema"]
+        assert {option["$ref"].rsplit("/", 1)[1] for option in by_id["anyOf"]} == {"Student", "SparseStudent"}
+    
+    def test_sparse_fields_rejects_unknown_fields(self):
+        """Test fields are validated against the Student model"""
+        response = client.get("/api/students?fields=name,password")
+        assert response.status_code == 400
+        assert "password" in response.json()["detail"]
+    
     @patch('server.db')
     def test_get_student_by_id(self, mock_db):
         """Test getting a specific student by ID"""
+        mock_side_collections(mock_db)
         # Mock student data
         mock_student = {
             "id": "1",
@@ -141,9 +382,27 @@ class TestSchoolMISAPI:
         assert data["name"] == "John Doe"
         assert data["id"] == "1"
     
+    @patch('server.db')
+    def test_get_student_cache_follows_collection_watermark(self, mock_db):
+        """Test a write made by another process (watermark bumped elsewhere) is not served from cache"""
+        mock_side_collections(mock_db, version=1)
+        student = {
+            "id": "1", "name": "John Doe", "age": 16, "class_name": "10A", "gender": "male",
+            "contact_info": "", "created_at": datetime(2024, 1, 1), "updated_at": datetime(2024, 1, 1),
+        }
+        mock_db.students.find_one = AsyncMock(return_value=student)
+        assert client.get("/api/students/1").json()["age"] == 16
+        assert client.get("/api/students/1?fields=age").json() == {"id": "1", "age": 16}
+        
+        mock_side_collections(mock_db, version=2)
+        mock_db.students.find_one = AsyncMock(return_value=None)
+        assert client.get("/api/students/1").status_code == 404
+        assert client.get("/api/students/1?fields=age").status_code == 404
+    
     @patch('server.db')
     def test_get_student_not_found(self, mock_db):
         """Test getting non-existent student"""
+        mock_side_collections(mock_db)
         mock_db.students.find_one = AsyncMock(return_value=None)
         
         response = client.get("/api/students/999")
@@ -154,6 +413,7 @@ class TestSchoolMISAPI:
     @patch('server.db')
     def test_update_student(self, mock_db):
         """Test updating a student"""
+        mock_side_collections(mock_db)
         # Mock existing student
         mock_student = {
             "id": "1",
@@ -166,37 +426,76 @@ class TestSchoolMISAPI:
             "updated_at": "2024-01-01T00:00:00"
         }
         
-        updated_student = mock_student.copy()
-        updated_student["age"] = 17
-        
-        mock_db.students.find_one = AsyncMock(side_effect=[mock_student, updated_student])
-        mock_db.students.update_one = AsyncMock(return_value=None)
+        mock_db.students.find_one_and_update = AsyncMock(return_value=mock_student)
         
         update_data = {"age": 17}
         response = client.put("/api/students/1", json=update_data)
         assert response.status_code == 200
         data = response.json()
         assert data["age"] == 17
+        assert data["name"] == "John Doe"
+        assert mock_db.students.find_one_and_update.call_args.args[1]["$set"]["age"] == 17
     
     @patch('server.db')
     def test_delete_student(self, mock_db):
         """Test deleting a student"""
+        mock_side_collections(mock_db)
         # Mock existing student
         mock_student = {
             "id": "1",
             "name": "John Doe"
         }
-        mock_db.students.find_one = AsyncMock(return_value=mock_student)
-        mock_db.students.delete_one = AsyncMock(return_value=None)
+        mock_db.students.find_one_and_delete = AsyncMock(return_value=mock_student)
         
         response = client.delete("/api/students/1")
         assert response.status_code == 200
         data = response.json()
         assert "deleted successfully" in data["message"]
+        tombstones = mock_db.student_tombstones.insert_many.call_args.args[0]
+        assert [tombstone["id"] for tombstone in tombstones] == ["1"]
+        assert isinstance(tombstones[0]["deleted_at"], datetime)
+    
+    @patch('server.db')
+    def test_update_student_class_change(self, mock_db):
+        """Test moving a student to another class touches both classes"""
+        mock_side_collections(mock_db)
+        mock_db.students.find_one_and_update = AsyncMock(return_value={
+            "id": "1",
+            "name": "John Doe",
+            "age": 16,
+            "class_name": "10A",
+            "gender": "male",
+            "contact_info": "john.doe@email.com",
+            "created_at": "2024-01-01T00:00:00",
+            "updated_at": "2024-01-01T00:00:00"
+        })
+        
+        response = client.put("/api/students/1", json={"class_name": "10B"})
+        assert response.status_code == 200
+        assert response.json()["class_name"] == "10B"
+        operations = mock_db.student_summary.bulk_write.call_args.args[0]
+        assert [operation._filter["_id"] for operation in operations] == ["students", "class:10A", "class:10B"]
+    
+    @patch('server.db')
+    def test_update_student_not_found(self, mock_db):
+        """Test updating a non-existent student"""
+        mock_db.students.find_one_and_update = AsyncMock(return_value=None)
+        
+        response = client.put("/api/students/999", json={"age": 17})
+        assert response.status_code == 404
+    
+    @patch('server.db')
+    def test_delete_student_not_found(self, mock_db):
+        """Test deleting a non-existent student"""
+        mock_db.students.find_one_and_delete = AsyncMock(return_value=None)
+        
+        response = client.delete("/api/students/999")
+        assert response.status_code == 404
     
     @patch('server.db')
     def test_get_students_by_class(self, mock_db):
         """Test getting students by class"""
+        mock_side_collections(mock_db)
         # Mock students data
         mock_students = [
             {
@@ -218,6 +517,966 @@ class TestSchoolMISAPI:
         assert len(data) == 1
         assert data[0]["class_name"] == "10A"
 
+    @patch('server.db')
+    def test_get_students_next_cursor(self, mock_db):
+        """Test a full page of students returns a cursor for the next page"""
+        mock_side_collections(mock_db)
+        mock_students = [
+            {
+                "id": str(i),
+                "name": f"Student {i}",
+                "age": 16,
+                "class_name": "10A",
+                "gender": "male",
+                "contact_info": "student@email.com",
+                "created_at": f"2024-01-0{i}T00:00:00",
+                "updated_at": f"2024-01-0{i}T00:00:00"
+            }
+            for i in range(1, 4)
+        ]
+        mock_db.students.find.return_value.to_list = AsyncMock(return_value=mock_students)
+        
+        response = client.get("/api/students?limit=2")
+        assert response.status_code == 200
+        assert len(response.json()) == 2
+        # One extra document is requested to detect the next page
+        assert mock_db.students.find.call_args.kwargs["limit"] == 3
+        next_cursor = response.headers["X-Next-Cursor"]
+        
+        mock_db.students.find.return_value.to_list = AsyncMock(return_value=mock_students[2:])
+        response = client.get(f"/api/students?limit=2&cursor={next_cursor}")
+        assert response.status_code == 200
+        assert len(response.json()) == 1
+        assert "X-Next-Cursor" not in response.headers
+        query = mock_db.students.find.call_args.args[0]
+        assert query["$or"][1]["id"] == {"$gt": "2"}
+    
+    @patch('server.db')
+    def test_get_students_by_class_cursor_keeps_filter(self, mock_db):
+        """Test the class filter is combined with the cursor condition"""
+        mock_side_collections(mock_db)
+        mock_db.students.find.return_value.to_list = AsyncMock(return_value=[])
+        cursor = server.encode_cursor({"id": "1", "created_at": datetime(2024, 1, 1)})
+        
+        response = client.get(f"/api/students/class/10A?cursor={cursor}")
+        assert response.status_code == 200
+        query = mock_db.students.find.call_args.args[0]
+        assert query["$and"][0] == {"class_name": "10A"}
+        assert "$or" in query["$and"][1]
+    
+    def test_get_students_invalid_cursor(self):
+        """Test a malformed cursor is rejected"""
+        response = client.get("/api/students?cursor=not-a-cursor")
+        assert response.status_code == 400
+        assert "Invalid cursor" in response.json()["detail"]
+    
+    def test_get_students_limit_bounds(self):
+        """Test page size is validated"""
+        assert client.get("/api/students?limit=0").status_code == 422
+        assert client.get("/api/students?limit=100000").status_code == 422
+
+    @patch('server.db')
+    def test_search_students_prefix(self, mock_db):
+        """Test prefix search is an anchored range on the normalized name"""
+        mock_students = [
+            {"id": "1", "name": "John Doe", "name_lower": "john doe", "created_at": "2024-01-01T00:00:00"},
+            {"id": "2", "name": "Johnny Cash", "name_lower": "johnny cash", "created_at": "2024-01-01T00:00:00"},
+        ]
+        mock_db.students.find.return_value.to_list = AsyncMock(
+            side_effect=lambda length: [dict(student) for student in mock_students]
+        )
+        
+        response = client.get("/api/students/search?q=JOHN&limit=1&fields=name")
+        assert response.status_code == 200
+        assert response.json() == [{"id": "1", "name": "John Doe"}]
+        query, projection = mock_db.students.find.call_args.args
+        assert query == {"name_lower": {"$regex": "^john"}}
+        assert mock_db.students.find.call_args.kwargs["sort"] == [("name_lower", 1), ("id", 1)]
+        
+        next_cursor = response.headers["X-Next-Cursor"]
+        client.get(f"/api/students/search?q=JOHN&limit=1&cursor={next_cursor}")
+        query = mock_db.students.find.call_args.args[0]
+        assert query["$and"][1]["$or"][1] == {"name_lower": "john doe", "id": {"$gt": "1"}}
+    
+    @patch('server.db')
+    def test_search_students_text(self, mock_db):
+        """Test text search ranks by text score and pages on (score, id)"""
+        mock_students = [
+            {"id": "2", "name": "Maria Schmidt", "_score": 7.5},
+            {"id": "1", "name": "Klaus Schmidt", "_score": 2.0},
+        ]
+        mock_db.students.aggregate.return_value.to_list = AsyncMock(
+            side_effect=lambda length: [dict(student) for student in mock_students]
+        )
+        
+        response = client.get("/api/students/search?q=schmidt&mode=text&limit=1&fields=name")
+        assert response.status_code == 200
+        assert response.json() == [{"id": "2", "name": "Maria Schmidt"}]
+        pipeline = mock_db.students.aggregate.call_args.args[0]
+        assert pipeline[0] == {"$match": {"$text": {"$search": "schmidt"}}}
+        assert {"$sort": {"_score": -1, "id": 1}} in pipeline
+        
+        next_cursor = response.headers["X-Next-Cursor"]
+        client.get(f"/api/students/search?q=schmidt&mode=text&limit=1&cursor={next_cursor}")
+        pipeline = mock_db.students.aggregate.call_args.args[0]
+        assert pipeline[2] == {"$match": {"$or": [{"_score": {"$lt": 7.5}}, {"_score": 7.5, "id": {"$gt": "2"}}]}}
+    
+    def test_search_students_requires_query(self):
+        """Test the search term is required"""
+        assert client.get("/api/students/search").status_code == 422
+        assert client.get("/api/students/search?q=a&mode=fuzzy").status_code == 422
+    
+    @patch('server.db')
+    def test_writes_store_normalized_name(self, mock_db):
+        """Test creates and renames keep name_lower in sync for prefix search"""
+        mock_side_collections(mock_db)
+        mock_db.students.insert_one = AsyncMock(return_value=None)
+        mock_db.students.find_one_and_update = AsyncMock(return_value={
+            "id": "1", "name": "John Doe", "age": 16, "class_name": "10A", "gender": "male",
+            "contact_info": "john.doe@email.com", "created_at": "2024-01-01T00:00:00"
+        })
+        
+        client.post("/api/students", json={
+            "name": "John Doe", "age": 16, "class_name": "10A",
+            "gender": "male", "contact_info": "john.doe@email.com"
+        })
+        assert mock_db.students.insert_one.call_args.args[0]["name_lower"] == "john doe"
+        client.put("/api/students/1", json={"name": "Jonathan Doe"})
+        assert mock_db.students.find_one_and_update.call_args.args[1]["$set"]["name_lower"] == "jonathan doe"
+    
+    @patch('server.db')
+    def test_export_students_ndjson(self, mock_db):
+        """Test streaming the student collection as NDJSON"""
+        mock_students = [
+            {
+                "id": str(i),
+                "name": f"Student {i}",
+                "age": 16,
+                "class_name": "10A",
+                "gender": "male",
+                "contact_info": "student@email.com",
+                "created_at": "2024-01-01T00:00:00",
+                "updated_at": "2024-01-01T00:00:00"
+            }
+            for i in range(3)
+        ]
+        mock_db.students.find.return_value.__aiter__.return_value = mock_students
+        
+        response = client.get("/api/students/export?batch_size=2")
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("application/x-ndjson")
+        lines = response.text.splitlines()
+        assert [json.loads(line)["name"] for line in lines] == ["Student 0", "Student 1", "Student 2"]
+        assert mock_db.students.find.call_args.kwargs["batch_size"] == 2
+    
+    @patch('server.db')
+    def test_export_students_csv(self, mock_db):
+        """Test streaming the student collection as CSV"""
+        mock_students = [
+            {
+                "id": "1",
+                "name": "John Doe",
+                "age": 16,
+                "class_name": "10A",
+                "gender": "male",
+                "contact_info": "john.doe@email.com",
+                "address": "123 Main St, Springfield",
+                "created_at": "2024-01-01T00:00:00",
+                "updated_at": "2024-01-01T00:00:00"
+            }
+        ]
+        mock_db.students.find.return_value.__aiter__.return_value = mock_students
+        
+        response = client.get("/api/students/export?format=csv")
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/csv")
+        rows = list(csv.DictReader(io.StringIO(response.text)))
+        assert len(rows) == 1
+        assert rows[0]["address"] == "123 Main St, Springfield"
+        assert rows[0]["created_at"] == "2024-01-01T00:00:00"
+    
+    def test_export_students_invalid_format(self):
+        """Test unsupported export formats are rejected"""
+        response = client.get("/api/students/export?format=xml")
+        assert response.status_code == 422
+
+    @patch('server.db')
+    def test_bulk_create_students_json(self, mock_db):
+        """Test bulk import from a JSON array with per-row results"""
+        mock_side_collections(mock_db)
+        mock_db.students.find.return_value.to_list = AsyncMock(return_value=[{"name": "Existing"}])
+        mock_db.students.insert_many = AsyncMock(return_value=None)
+        
+        rows = [
+            {"name": "John Doe", "age": 16, "class_name": "10A", "gender": "male", "contact_info": "john@email.com"},
+            {"name": "Existing", "age": 15, "class_name": "10A", "gender": "female", "contact_info": "e@email.com"},
+            {"name": "No Age", "class_name": "10A", "gender": "male", "contact_info": "n@email.com"},
+            {"name": "John Doe", "age": 17, "class_name": "10B", "gender": "male", "contact_info": "j2@email.com"},
+        ]
+        response = client.post("/api/students/bulk", json=rows)
+        assert response.status_code == 200
+        data = response.json()
+        assert data["created"] == 1
+        assert data["failed"] == 3
+        assert [result["status"] for result in data["results"]] == ["created", "error", "error", "error"]
+        assert "already exists" in data["results"][1]["error"]
+        assert "age" in data["results"][2]["error"]
+        assert "already exists" in data["results"][3]["error"]
+        
+        # A single $in query covers the whole batch
+        mock_db.students.find.assert_called_once()
+        assert set(mock_db.students.find.call_args.args[0]["name"]["$in"]) == {"John Doe", "Existing"}
+        inserted = mock_db.students.insert_many.call_args.args[0]
+        assert [student["name"] for student in inserted] == ["John Doe"]
+        assert mock_db.students.insert_many.call_args.kwargs["ordered"] is False
+    
+    @patch('server.db')
+    def test_bulk_create_students_csv(self, mock_db):
+        """Test bulk import from an uploaded CSV file"""
+        mock_side_collections(mock_db)
+        mock_db.students.find.return_value.to_list = AsyncMock(return_value=[])
+        mock_db.students.insert_many = AsyncMock(return_value=None)
+        
+        csv_data = (
+            "name,age,class_name,gender,contact_info,parent_name\n"
+            "John Doe,16,10A,male,john@email.com,\n"
+            "Maria Schmidt,15,10B,female,maria@email.com,Klaus Schmidt\n"
+        )
+        response = client.post("/api/students/bulk", files={"file": ("students.csv", csv_data, "text/csv")})
+        assert response.status_code == 200
+        assert response.json()["created"] == 2
+        inserted = mock_db.students.insert_many.call_args.args[0]
+        assert inserted[0]["age"] == 16
+        assert inserted[0]["parent_name"] is None
+        assert inserted[1]["parent_name"] == "Klaus Schmidt"
+    
+    @patch('server.db')
+    def test_bulk_create_students_csv_not_utf8(self, mock_db):
+        """Test a CSV in another encoding is rejected instead of failing the request"""
+        mock_db.students.insert_many = AsyncMock()
+        csv_data = "name,age,class_name,gender,contact_info\nJürgen Müller,16,10A,male,\n".encode("latin-1")
+        response = client.post("/api/students/bulk", files={"file": ("students.csv", csv_data, "text/csv")})
+        assert response.status_code == 400
+        assert response.json()["detail"] == "CSV must be UTF-8"
+        mock_db.students.insert_many.assert_not_called()
+    
+    @patch('server.db')
+    def test_bulk_create_records_stored_chunks_when_a_later_chunk_fails(self, mock_db):
+        """Test rows inserted before a connection error still update counts and watermarks"""
+        mock_side_collections(mock_db)
+        mock_db.students.find.return_value.to_list = AsyncMock(return_value=[])
+        mock_db.students.insert_many = AsyncMock(side_effect=[None, AutoReconnect("connection reset")])
+        
+        rows = [
+            {"name": f"Student {i}", "age": 16, "class_name": "10A", "gender": "male", "contact_info": ""}
+            for i in range(server.BULK_INSERT_CHUNK_SIZE + 1)
+        ]
+        failing_client = TestClient(app, raise_server_exceptions=False)
+        assert failing_client.post("/api/students/bulk", json=rows).status_code == 500
+        operations = {
+            operation._filter["_id"]: operation._doc["$inc"]
+            for operation in mock_db.student_summary.bulk_write.call_args.args[0]
+        }
+        assert operations["students"] == {"version": 1, "count": server.BULK_INSERT_CHUNK_SIZE}
+    
+    @patch('server.db')
+    def test_bulk_create_students_chunks_and_write_errors(self, mock_db):
+        """Test inserts are chunked and duplicate key errors map back to rows"""
+        mock_side_collections(mock_db)
+        mock_db.students.find.return_value.to_list = AsyncMock(return_value=[])
+        mock_db.students.insert_many = AsyncMock(side_effect=[
+            None,
+            BulkWriteError({"writeErrors": [{"index": 0, "code": 11000, "errmsg": "E11000 duplicate key"}]}),
+        ])
+        
+        rows = [
+            {"name": f"Student {i}", "age": 16, "class_name": "10A", "gender": "male", "contact_info": "s@email.com"}
+            for i in range(3)
+        ]
+        with patch('server.BULK_INSERT_CHUNK_SIZE', 2):
+            response = client.post("/api/students/bulk", json=rows)
+        assert response.status_code == 200
+        data = response.json()
+        assert mock_db.students.insert_many.await_count == 2
+        assert data["created"] == 2
+        assert data["results"][2]["status"] == "error"
+        assert "already exists" in data["results"][2]["error"]
+    
+    def test_bulk_create_students_rejects_non_array(self):
+        """Test the JSON body must be an array"""
+        response = client.post("/api/students/bulk", json={"name": "John Doe"})
+        assert response.status_code == 400
+
+    @patch('server.db')
+    def test_update_student_duplicate_name(self, mock_db):
+        """Test renaming a student to an existing name"""
+        mock_db.students.find_one_and_update = AsyncMock(side_effect=DuplicateKeyError("E11000 duplicate key"))
+        
+        response = client.put("/api/students/1", json={"name": "Jane Doe"})
+        assert response.status_code == 400
+        assert "already exists" in response.json()["detail"]
+    
+    @patch('server.db')
+    def test_ensure_indexes(self, mock_db):
+        """Test the index bootstrap covers lookups, uniqueness and keyset order"""
+        mock_db.students.create_indexes = AsyncMock(return_value=["id_unique"])
+        mock_db.student_tombstones.create_indexes = AsyncMock(return_value=["deleted_at_ttl"])
+        mock_db.report_jobs.create_indexes = AsyncMock(return_value=["status_created_at"])
+        mock_db.report_chunks.create_indexes = AsyncMock(return_value=["job_id_attempt_n"])
+        
+        assert asyncio.run(server.ensure_indexes()) == [
+            "id_unique", "deleted_at_ttl", "status_created_at", "job_id_attempt_n",
+        ]
+        indexes = {index.document["name"]: index.document for index in mock_db.students.create_indexes.call_args.args[0]}
+        assert indexes["id_unique"]["unique"] is True
+        assert indexes["name_unique"]["unique"] is True
+        assert list(indexes["class_name_created_at_id"]["key"]) == ["class_name", "created_at", "id"]
+        assert list(indexes["created_at_id"]["key"]) == ["created_at", "id"]
+        assert list(indexes["updated_at_id"]["key"]) == ["updated_at", "id"]
+        tombstone_indexes = {
+            index.document["name"]: index.document
+            for index in mock_db.student_tombstones.create_indexes.call_args.args[0]
+        }
+        assert tombstone_indexes["deleted_at_ttl"]["expireAfterSeconds"] == server.STUDENT_TOMBSTONE_TTL_SECONDS
+        
+        mock_db.students.create_indexes = AsyncMock(return_value=["id_unique"])
+        assert asyncio.run(server.ensure_indexes(required=True)) == ["id_unique"]
+        required = [index.document["name"] for index in mock_db.students.create_indexes.call_args.args[0]]
+        assert required == ["id_unique", "name_unique", "student_text"]
+        asyncio.run(server.ensure_indexes(required=False))
+        others = [index.document["name"] for index in mock_db.students.create_indexes.call_args.args[0]]
+        assert set(others).isdisjoint(required) and "created_at_id" in others
+
+    @patch('server.db')
+    def test_get_student_is_cached_until_updated(self, mock_db):
+        """Test repeated lookups are served from cache and writes invalidate them"""
+        mock_side_collections(mock_db)
+        mock_student = {
+            "id": "1",
+            "name": "John Doe",
+            "age": 16,
+            "class_name": "10A",
+            "gender": "male",
+            "contact_info": "john.doe@email.com",
+            "created_at": "2024-01-01T00:00:00",
+            "updated_at": "2024-01-01T00:00:00"
+        }
+        updated_student = {**mock_student, "age": 17}
+        mock_db.students.find_one = AsyncMock(side_effect=[mock_student, updated_student])
+        mock_db.students.find_one_and_update = AsyncMock(return_value=mock_student)
+        
+        assert client.get("/api/students/1").json()["age"] == 16
+        assert client.get("/api/students/1").json()["age"] == 16
+        assert mock_db.students.find_one.await_count == 1
+        
+        client.put("/api/students/1", json={"age": 17})
+        assert client.get("/api/students/1").json()["age"] == 17
+        assert mock_db.students.find_one.await_count == 2
+        assert client.get("/api/cache/stats").json()["hits"] >= 1
+    
+    @patch('server.db')
+    def test_get_students_by_class_cache_invalidated_by_create(self, mock_db):
+        """Test creating a student drops the cached roster of its class"""
+        mock_side_collections(mock_db)
+        mock_db.students.find.return_value.to_list = AsyncMock(return_value=[])
+        mock_db.students.insert_one = AsyncMock(return_value=None)
+        
+        client.get("/api/students/class/10A")
+        client.get("/api/students/class/10A")
+        client.get("/api/students/class/10B")
+        assert mock_db.students.find.call_count == 2
+        
+        client.post("/api/students", json={
+            "name": "John Doe", "age": 16, "class_name": "10A",
+            "gender": "male", "contact_info": "john.doe@email.com"
+        })
+        client.get("/api/students/class/10A")
+        client.get("/api/students/class/10B")
+        assert mock_db.students.find.call_count == 3
+
+    @patch('server.db')
+    def test_get_students_etag_not_modified(self, mock_db):
+        """Test a matching If-None-Match returns 304 without reading students"""
+        mock_side_collections(mock_db, version=7)
+        mock_db.students.find.return_value.to_list = AsyncMock(return_value=[])
+        
+        response = client.get("/api/students")
+        assert response.status_code == 200
+        etag = response.headers["ETag"]
+        assert response.headers["Cache-Control"] == "no-cache"
+        assert mock_db.students.find.call_count == 1
+        
+        response = client.get("/api/students", headers={"If-None-Match": etag})
+        assert response.status_code == 304
+        assert response.headers["ETag"] == etag
+        assert mock_db.students.find.call_count == 1
+        
+        # Other pages and newer watermarks get different ETags
+        assert client.get("/api/students?limit=5").headers["ETag"] != etag
+        mock_side_collections(mock_db, version=8)
+        response = client.get("/api/students", headers={"If-None-Match": etag})
+        assert response.status_code == 200
+        assert response.headers["ETag"] != etag
+    
+    @patch('server.db')
+    def test_get_students_by_class_etag_uses_class_watermark(self, mock_db):
+        """Test class rosters revalidate against the class watermark"""
+        mock_side_collections(mock_db, version=3)
+        mock_db.students.find.return_value.to_list = AsyncMock(return_value=[])
+        
+        etag = client.get("/api/students/class/10A").headers["ETag"]
+        response = client.get("/api/students/class/10A", headers={"If-None-Match": f'W/{etag}, "other"'})
+        assert response.status_code == 304
+        assert mock_db.student_summary.find_one.call_args.args[0] == {"_id": "class:10A"}
+    
+    @patch('server.db')
+    def test_get_students_by_class_body_follows_watermark(self, mock_db):
+        """Test a write this worker did not see (watermark bumped elsewhere) bypasses the cached page"""
+        mock_side_collections(mock_db, version=3)
+        student = {
+            "id": "1", "name": "John Doe", "age": 10, "class_name": "10A", "gender": "male",
+            "contact_info": "", "created_at": datetime(2024, 1, 1), "updated_at": datetime(2024, 1, 1),
+        }
+        mock_db.students.find.return_value.to_list = AsyncMock(return_value=[student])
+        assert client.get("/api/students/class/10A").json()[0]["age"] == 10
+        
+        mock_side_collections(mock_db, version=4)
+        mock_db.students.find.return_value.to_list = AsyncMock(return_value=[{**student, "age": 99}])
+        response = client.get("/api/students/class/10A")
+        assert response.json()[0]["age"] == 99
+        etag = response.headers["ETag"]
+        assert client.get("/api/students/class/10A", headers={"If-None-Match": etag}).status_code == 304
+    
+    @patch('server.db')
+    def test_get_student_etag_not_modified(self, mock_db):
+        """Test a single student revalidates against its updated_at"""
+        mock_side_collections(mock_db)
+        mock_student = {
+            "id": "1",
+            "name": "John Doe",
+            "age": 16,
+            "class_name": "10A",
+            "gender": "male",
+            "contact_info": "john.doe@email.com",
+            "created_at": datetime(2024, 1, 1),
+            "updated_at": datetime(2024, 1, 1)
+        }
+        mock_db.students.find_one = AsyncMock(return_value=mock_student)
+        
+        etag = client.get("/api/students/1").headers["ETag"]
+        mock_db.students.find_one = AsyncMock(return_value={"updated_at": datetime(2024, 1, 1)})
+        response = client.get("/api/students/1", headers={"If-None-Match": etag})
+        assert response.status_code == 304
+        # Only the watermark is fetched
+        assert mock_db.students.find_one.call_args.args[1] == {"_id": 0, "updated_at": 1}
+    
+    @patch('server.db')
+    def test_writes_bump_watermarks(self, mock_db):
+        """Test a write bumps the collection and affected class watermarks"""
+        mock_side_collections(mock_db)
+        mock_db.students.find_one_and_delete = AsyncMock(return_value={"class_name": "10A"})
+        
+        client.delete("/api/students/1")
+        operations = mock_db.student_summary.bulk_write.call_args.args[0]
+        assert [operation._filter for operation in operations] == [{"_id": "students"}, {"_id": "class:10A"}]
+
+    @patch('server.db')
+    def test_create_student_increments_stats(self, mock_db):
+        """Test a create increments the total, class, gender and age counts"""
+        mock_side_collections(mock_db)
+        mock_db.students.insert_one = AsyncMock(return_value=None)
+        
+        client.post("/api/students", json={
+            "name": "John Doe", "age": 16, "class_name": "10A",
+            "gender": "male", "contact_info": "john.doe@email.com"
+        })
+        operations = mock_db.student_summary.bulk_write.call_args.args[0]
+        increments = {operation._filter["_id"]: operation._doc["$inc"] for operation in operations}
+        assert increments == {
+            "students": {"version": 1, "count": 1},
+            "class:10A": {"version": 1, "count": 1},
+            "gender:male": {"count": 1},
+            "age:16": {"count": 1},
+        }
+    
+    @patch('server.db')
+    def test_update_student_moves_stats(self, mock_db):
+        """Test an update moves counts only for the dimensions that changed"""
+        mock_side_collections(mock_db)
+        mock_db.students.find_one_and_update = AsyncMock(return_value={
+            "id": "1", "name": "John Doe", "age": 16, "class_name": "10A", "gender": "male",
+            "contact_info": "john.doe@email.com", "created_at": "2024-01-01T00:00:00"
+        })
+        
+        client.put("/api/students/1", json={"age": 17, "contact_info": "new@email.com"})
+        operations = mock_db.student_summary.bulk_write.call_args.args[0]
+        increments = {operation._filter["_id"]: operation._doc["$inc"] for operation in operations}
+        assert increments == {
+            "students": {"version": 1},
+            "class:10A": {"version": 1},
+            "age:16": {"count": -1},
+            "age:17": {"count": 1},
+        }
+    
+    @patch('server.db')
+    def test_delete_student_decrements_stats(self, mock_db):
+        """Test a delete decrements every count the student was part of"""
+        mock_side_collections(mock_db)
+        mock_db.students.find_one_and_delete = AsyncMock(
+            return_value={"class_name": "10A", "gender": "female", "age": 15}
+        )
+        
+        client.delete("/api/students/1")
+        operations = mock_db.student_summary.bulk_write.call_args.args[0]
+        increments = {operation._filter["_id"]: operation._doc["$inc"].get("count") for operation in operations}
+        assert increments == {"students": -1, "class:10A": -1, "gender:female": -1, "age:15": -1}
+    
+    @patch('server.db')
+    def test_get_stats(self, mock_db):
+        """Test stats are assembled from the summary documents"""
+        mock_db.student_summary.find.return_value.to_list = AsyncMock(return_value=[
+            {"_id": "students", "count": 3},
+            {"_id": "class:10A", "count": 2},
+            {"_id": "class:10B", "count": 1},
+            {"_id": "gender:male", "count": 2},
+            {"_id": "gender:female", "count": 1},
+            {"_id": "age:15", "count": 1},
+            {"_id": "age:16", "count": 2},
+        ])
+        
+        response = client.get("/api/stats")
+        assert response.status_code == 200
+        assert response.json() == {
+            "total": 3,
+            "by_class": {"10A": 2, "10B": 1},
+            "by_gender": {"male": 2, "female": 1},
+            "by_age": {"15": 1, "16": 2},
+        }
+    
+    @patch('server.db')
+    def test_rebuild_summary_counts(self, mock_db):
+        """Test the rebuild recomputes counts with one $group aggregation"""
+        mock_db.students.aggregate.return_value.to_list = AsyncMock(return_value=[{
+            "students": [{"count": 3}],
+            "class": [{"_id": "10A", "count": 3}],
+            "gender": [{"_id": "male", "count": 2}, {"_id": "female", "count": 1}],
+            "age": [{"_id": 16, "count": 3}],
+        }])
+        mock_db.student_summary.bulk_write = AsyncMock(return_value=None)
+        
+        counts = asyncio.run(server.rebuild_summary_counts())
+        assert counts == {"students": 3, "class:10A": 3, "gender:male": 2, "gender:female": 1, "age:16": 3}
+        operations = mock_db.student_summary.bulk_write.call_args.args[0]
+        # Scopes missing from the aggregation are zeroed
+        assert operations[-1]._filter == {"_id": {"$nin": list(counts)}}
+        assert "$facet" in mock_db.students.aggregate.call_args.args[0][0]
+        assert "rebuilt_at" in operations[0]._doc["$set"]
+    
+    @patch('server.db')
+    def test_backfill_search_fields_in_batches(self, mock_db):
+        """Test students without name_lower are backfilled in bulk batches"""
+        async def missing():
+            for i, name in enumerate(["John Doe", " Jane ROE", "Max Mustermann"]):
+                yield {"_id": i, "name": name}
+        
+        mock_db.students.find.return_value = missing()
+        mock_db.students.bulk_write = AsyncMock(return_value=None)
+        
+        assert asyncio.run(server.backfill_search_fields(batch_size=2)) == 3
+        assert mock_db.students.find.call_args.args[0] == {"name_lower": {"$exists": False}}
+        batches = [call.args[0] for call in mock_db.students.bulk_write.call_args_list]
+        assert [len(batch) for batch in batches] == [2, 1]
+        assert batches[0][1]._doc == {"$set": {"name_lower": "jane roe"}}
+    
+    @patch('server.db')
+    def test_seed_summary_counts_rebuilds_once(self, mock_db):
+        """Test startup rebuilds the counts only until a rebuild has marked them"""
+        mock_db.students.aggregate.return_value.to_list = AsyncMock(return_value=[{"students": [{"count": 5}]}])
+        mock_db.student_summary.bulk_write = AsyncMock(return_value=None)
+        
+        # Writes alone created the collection document, so it has no marker
+        mock_db.student_summary.find_one = AsyncMock(return_value=None)
+        assert asyncio.run(server.seed_summary_counts()) is True
+        assert mock_db.student_summary.find_one.call_args.args[0] == {
+            "_id": "students", "rebuilt_at": {"$exists": True},
+        }
+        
+        mock_db.student_summary.find_one = AsyncMock(return_value={"_id": "students"})
+        mock_db.students.aggregate.reset_mock()
+        assert asyncio.run(server.seed_summary_counts()) is False
+        mock_db.students.aggregate.assert_not_called()
+
+    @patch('server.db')
+    def test_concurrent_class_reads_share_one_query(self, mock_db):
+        """Test identical roster requests arriving together issue one Mongo query"""
+        mock_side_collections(mock_db)
+        async def slow_roster(length):
+            await asyncio.sleep(0.02)
+            return [{
+                "id": "1", "name": "John Doe", "age": 16, "class_name": "10A", "gender": "male",
+                "contact_info": "john.doe@email.com",
+                "created_at": datetime(2024, 1, 1), "updated_at": datetime(2024, 1, 1),
+            }]
+        mock_db.students.find.return_value.to_list = AsyncMock(side_effect=slow_roster)
+        
+        async def scenario():
+            transport = httpx.ASGITransport(app=app)
+            async with AsyncClient(transport=transport, base_url="http://test") as async_client:
+                return await asyncio.gather(*(async_client.get("/api/students/class/10A") for _ in range(5)))
+        
+        coalesced = server.read_flights.coalesced
+        responses = asyncio.run(scenario())
+        assert [response.status_code for response in responses] == [200] * 5
+        assert all(response.json()[0]["id"] == "1" for response in responses)
+        assert mock_db.students.find.return_value.to_list.await_count == 1
+        assert server.read_flights.coalesced == coalesced + 4
+    
+    @patch('server.db')
+    def test_batch_get_students(self, mock_db):
+        """Test a batch lookup is one $in query answered in request order"""
+        mock_db.students.find.return_value.to_list = AsyncMock(return_value=[
+            {"id": "1", "name": "John Doe", "updated_at": datetime(2024, 1, 1), "created_at": datetime(2024, 1, 1)},
+            {"id": "2", "name": "Jane Doe", "updated_at": datetime(2024, 1, 1), "created_at": datetime(2024, 1, 1)},
+        ])
+        
+        response = client.post(
+            "/api/students/batch-get", params={"fields": "name"}, json={"ids": ["2", "9", "1", "2"]}
+        )
+        assert response.status_code == 200
+        assert response.json() == {
+            "students": [{"id": "2", "name": "Jane Doe"}, {"id": "1", "name": "John Doe"}],
+            "missing": ["9"],
+        }
+        assert mock_db.students.find.call_args.args[0] == {"id": {"$in": ["2", "9", "1"]}}
+    
+    def test_batch_requests_validate_ids(self):
+        """Test empty and oversized id lists are rejected"""
+        assert client.post("/api/students/batch-get", json={"ids": []}).status_code == 422
+        too_many = {"ids": [str(index) for index in range(server.MAX_BATCH_IDS + 1)]}
+        assert client.post("/api/students/batch-delete", json=too_many).status_code == 422
+    
+    @patch('server.db')
+    def test_batch_delete_students(self, mock_db):
+        """Test a batch delete is one delete_many that updates counts and tombstones"""
+        mock_side_collections(mock_db)
+        mock_db.students.find.return_value.to_list = AsyncMock(return_value=[
+            {"id": "1", "class_name": "10A", "gender": "male", "age": 16},
+            {"id": "2", "class_name": "10B", "gender": "female", "age": 15},
+        ])
+        mock_db.students.update_many = AsyncMock(return_value=Mock(modified_count=2))
+        mock_db.students.delete_many = AsyncMock(return_value=Mock(deleted_count=2))
+        
+        response = client.post("/api/students/batch-delete", json={"ids": ["2", "9", "1"]})
+        assert response.status_code == 200
+        assert response.json() == {"deleted": ["2", "1"], "missing": ["9"]}
+        token = mock_db.students.update_many.call_args.args[1]["$set"]["delete_claim"]
+        mock_db.students.delete_many.assert_awaited_once_with({"id": {"$in": ["1", "2"]}, "delete_claim": token})
+        tombstones = mock_db.student_tombstones.insert_many.call_args.args[0]
+        assert [tombstone["id"] for tombstone in tombstones] == ["1", "2"]
+        operations = {
+            operation._filter["_id"]: operation._doc["$inc"]
+            for operation in mock_db.student_summary.bulk_write.call_args.args[0]
+        }
+        assert operations["students"] == {"version": 1, "count": -2}
+        assert operations["class:10A"] == {"version": 1, "count": -1}
+    
+    @patch('server.db')
+    def test_batch_delete_counts_only_claimed_students(self, mock_db):
+        """Test students claimed by a racing delete are neither counted nor tombstoned here"""
+        mock_side_collections(mock_db)
+        mock_db.students.update_many = AsyncMock(return_value=Mock(modified_count=1))
+        # Student 2 was claimed by another request, so only 1 carries this request's token
+        mock_db.students.find.return_value.to_list = AsyncMock(return_value=[
+            {"id": "1", "class_name": "10A", "gender": "male", "age": 16},
+        ])
+        mock_db.students.delete_many = AsyncMock(return_value=Mock(deleted_count=1))
+        
+        response = client.post("/api/students/batch-delete", json={"ids": ["1", "2"]})
+        assert response.json() == {"deleted": ["1"], "missing": ["2"]}
+        claim_filter = mock_db.students.update_many.call_args.args[0]
+        assert claim_filter["id"] == {"$in": ["1", "2"]}
+        assert {"delete_claim": {"$exists": False}} in claim_filter["$or"]
+        token = mock_db.students.update_many.call_args.args[1]["$set"]["delete_claim"]
+        assert mock_db.students.find.call_args.args[0] == {"id": {"$in": ["1", "2"]}, "delete_claim": token}
+        assert [t["id"] for t in mock_db.student_tombstones.insert_many.call_args.args[0]] == ["1"]
+        operations = {
+            operation._filter["_id"]: operation._doc["$inc"]
+            for operation in mock_db.student_summary.bulk_write.call_args.args[0]
+        }
+        assert operations["students"] == {"version": 1, "count": -1}
+    
+    @patch('server.db')
+    def test_batch_delete_nothing_found(self, mock_db):
+        """Test unknown ids are reported without any write"""
+        mock_db.students.update_many = AsyncMock(return_value=Mock(modified_count=0))
+        mock_db.students.find.return_value.to_list = AsyncMock(return_value=[])
+        mock_db.students.delete_many = AsyncMock()
+        
+        response = client.post("/api/students/batch-delete", json={"ids": ["9"]})
+        assert response.json() == {"deleted": [], "missing": ["9"]}
+        mock_db.students.delete_many.assert_not_awaited()
+    
+    @patch('server.db')
+    def test_student_changes_initial_sync(self, mock_db):
+        """Test a sync without a token returns every student and a token to resume from"""
+        student = {
+            "id": "1", "name": "John Doe", "age": 16, "class_name": "10A", "gender": "male",
+            "contact_info": "john.doe@email.com",
+            "created_at": datetime(2024, 1, 1), "updated_at": datetime(2024, 1, 2),
+        }
+        mock_db.students.find.return_value.to_list = AsyncMock(return_value=[student])
+        mock_db.student_tombstones.find.return_value.to_list = AsyncMock(return_value=[])
+        
+        response = client.get("/api/students/changes")
+        assert response.status_code == 200
+        data = response.json()
+        assert [changed["id"] for changed in data["changed"]] == ["1"]
+        assert data["deleted"] == []
+        assert data["has_more"] is False
+        # Both streams resume where this sync stopped looking
+        changed, deleted = server.decode_sync_token(data["sync_token"])
+        assert changed == deleted
+        assert changed[1] == ""
+        query = mock_db.students.find.call_args.args[0]
+        assert query == {"updated_at": {"$lt": changed[0]}}
+        assert mock_db.students.find.call_args.kwargs["sort"] == server.CHANGES_SORT
+    
+    @patch('server.db')
+    def test_student_changes_since_token(self, mock_db):
+        """Test a token returns later changes and tombstones, paging when more are waiting"""
+        since = server.encode_sync_token((datetime(2024, 1, 1), "1"), (datetime(2024, 1, 1), ""))
+        changed = [
+            {"id": "2", "name": "Jane Doe", "updated_at": datetime(2024, 1, 3), "created_at": datetime(2024, 1, 1)},
+            {"id": "3", "name": "Jim Doe", "updated_at": datetime(2024, 1, 4), "created_at": datetime(2024, 1, 1)},
+        ]
+        mock_db.students.find.return_value.to_list = AsyncMock(return_value=changed)
+        mock_db.student_tombstones.find.return_value.to_list = AsyncMock(return_value=[
+            {"id": "9", "deleted_at": datetime(2024, 1, 5)},
+        ])
+        
+        with patch('server.STUDENT_TOMBSTONE_TTL_SECONDS', 10 ** 10):
+            response = client.get("/api/students/changes", params={"since": since, "limit": 1, "fields": "name"})
+        assert response.status_code == 200
+        data = response.json()
+        assert data["changed"] == [{"id": "2", "name": "Jane Doe"}]
+        assert data["deleted"] == ["9"]
+        assert data["has_more"] is True
+        changed_position, _ = server.decode_sync_token(data["sync_token"])
+        assert changed_position == (datetime(2024, 1, 3), "2")
+        after = mock_db.students.find.call_args.args[0]["$and"][1]
+        assert after == server.after_key("updated_at", datetime(2024, 1, 1), "1")
+    
+    def test_student_changes_expired_or_invalid_token(self):
+        """Test tokens older than the tombstone TTL force a full reload"""
+        expired = server.encode_sync_token((datetime(2000, 1, 1), ""), (datetime(2000, 1, 1), ""))
+        response = client.get("/api/students/changes", params={"since": expired})
+        assert response.status_code == 410
+        
+        response = client.get("/api/students/changes", params={"since": "not-a-token"})
+        assert response.status_code == 400
+        assert response.json()["detail"] == "Invalid sync token"
+
+    @patch('server.db')
+    def test_create_report_queues_job(self, mock_db):
+        """Test report requests are queued in MongoDB and wake the workers"""
+        mock_db.report_jobs.insert_one = AsyncMock(return_value=None)
+
+        with patch.object(server.report_workers, 'notify') as notify:
+            response = client.post("/api/reports", json={"format": "xlsx", "class_name": "10A"})
+        assert response.status_code == 202
+        data = response.json()
+        assert data["status"] == "queued"
+        assert data["download_url"] is None
+        job = mock_db.report_jobs.insert_one.call_args.args[0]
+        assert job["id"] == data["id"]
+        assert job["format"] == "xlsx" and job["class_name"] == "10A"
+        notify.assert_called_once()
+
+        response = client.post("/api/reports", json={"format": "pdf"})
+        assert response.status_code == 422
+
+    @patch('server.db')
+    def test_get_report_status(self, mock_db):
+        """Test job status is read from MongoDB, with a download link once completed"""
+        job = {
+            "id": "job-1", "status": "completed", "format": "csv", "class_name": None,
+            "created_at": datetime(2024, 1, 1), "attempts": 1, "rows": 2, "size": 40,
+        }
+        mock_db.report_jobs.find_one = AsyncMock(return_value=job)
+
+        response = client.get("/api/reports/job-1")
+        assert response.status_code == 200
+        assert response.json()["download_url"] == "/api/reports/job-1/download"
+
+        mock_db.report_jobs.find_one = AsyncMock(return_value=None)
+        assert client.get("/api/reports/missing").status_code == 404
+
+    @patch('server.db')
+    def test_download_report(self, mock_db):
+        """Test finished reports stream from their stored chunks"""
+        job = {
+            "id": "job-1", "status": "completed", "format": "csv", "class_name": "10 A",
+            "created_at": datetime(2024, 1, 1), "attempts": 2, "rows": 1, "size": 10,
+        }
+        mock_db.report_jobs.find_one = AsyncMock(return_value=job)
+        mock_db.report_chunks.find.return_value.sort.return_value.__aiter__.return_value = [
+            {"data": b"name\r\n"}, {"data": b"Ann\r\n"},
+        ]
+
+        response = client.get("/api/reports/job-1/download")
+        assert response.status_code == 200
+        assert response.content == b"name\r\nAnn\r\n"
+        assert response.headers["content-type"].startswith("text/csv")
+        assert 'filename="roster-10_A.csv"' in response.headers["content-disposition"]
+        # Only chunks of the attempt that completed the job
+        assert mock_db.report_chunks.find.call_args.args[0] == {"job_id": "job-1", "attempt": 2}
+
+        mock_db.report_jobs.find_one = AsyncMock(return_value={**job, "status": "running"})
+        response = client.get("/api/reports/job-1/download")
+        assert response.status_code == 409
+
+    @patch('server.db')
+    def test_run_report_job(self, mock_db):
+        """Test a report job streams students, stores the file and completes the job"""
+        mock_db.students.find.return_value.sort.return_value.__aiter__.return_value = [
+            {"id": "1", "name": "Ann", "age": 15, "class_name": "10A", "gender": "female", "contact_info": "a@x"},
+            {"id": "2", "name": "Bo", "age": 16, "class_name": "10B", "gender": "male", "contact_info": "b@x"},
+        ]
+        mock_db.report_chunks.insert_one = AsyncMock(return_value=None)
+        mock_db.report_jobs.update_one = AsyncMock(return_value=Mock(modified_count=1))
+        job = {"id": "job-1", "format": "csv", "class_name": None, "attempts": 1}
+
+        with patch('server.REPORT_PROCESSES', 0):
+            asyncio.run(server.run_report_job(job))
+
+        chunk = mock_db.report_chunks.insert_one.call_args.args[0]
+        rows = list(csv.reader(io.StringIO(chunk["data"].decode())))
+        assert rows[0] == server.REPORT_FIELDS
+        assert [row[1] for row in rows[1:]] == ["Ann", "Bo"]
+        assert (chunk["job_id"], chunk["attempt"], chunk["n"]) == ("job-1", 1, 0)
+        query, update = mock_db.report_jobs.update_one.call_args.args
+        assert query == {"id": "job-1", "attempts": 1}
+        assert update["$set"]["status"] == "completed"
+        assert update["$set"]["rows"] == 2
+        assert update["$set"]["size"] == len(chunk["data"])
+        assert update["$set"]["expires_at"] == chunk["expires_at"]
+
+    @patch('server.db')
+    def test_run_report_job_records_failure(self, mock_db):
+        """Test a job that raises is marked failed with the error"""
+        mock_db.students.find.side_effect = RuntimeError("cursor died")
+        mock_db.report_jobs.update_one = AsyncMock(return_value=Mock(modified_count=1))
+
+        with pytest.raises(RuntimeError):
+            asyncio.run(server.run_report_job({"id": "job-1", "format": "csv", "attempts": 1}))
+        update = mock_db.report_jobs.update_one.call_args.args[1]
+        assert update["$set"]["status"] == "failed"
+        assert update["$set"]["error"] == "cursor died"
+
+    @patch('server.db')
+    def test_claim_report_job_gives_up_after_max_attempts(self, mock_db):
+        """Test a job abandoned too often is failed and the next one is claimed"""
+        mock_db.report_jobs.find_one_and_update = AsyncMock(side_effect=[
+            {"id": "stuck", "attempts": server.REPORT_MAX_ATTEMPTS + 1},
+            {"id": "next", "attempts": 1},
+        ])
+        mock_db.report_jobs.update_one = AsyncMock(return_value=Mock(modified_count=1))
+
+        assert asyncio.run(server.claim_report_job())["id"] == "next"
+        query, update = mock_db.report_jobs.update_one.call_args.args
+        assert query["id"] == "stuck"
+        assert update["$set"]["status"] == "failed"
+
+    @patch('server.db')
+    def test_query_students_from_mongo(self, mock_db):
+        """Test roster filters become one Mongo query while the index is off"""
+        mock_db.students.count_documents = AsyncMock(return_value=1)
+        mock_db.students.find.return_value.to_list = AsyncMock(return_value=[
+            {"id": "1", "name": "Ann", "age": 15, "gender": "female", "class_name": "10A"},
+        ])
+
+        response = client.get(
+            "/api/students/query",
+            params={"age_min": 14, "age_max": 16, "gender": "female", "class_name": ["10A", "10B"], "offset": 5},
+        )
+        assert response.status_code == 200
+        assert response.json() == {
+            "total": 1,
+            "students": [{"id": "1", "name": "Ann", "age": 15, "gender": "female", "class_name": "10A"}],
+        }
+        query = {"age": {"$gte": 14, "$lte": 16}, "gender": {"$in": ["female"]}, "class_name": {"$in": ["10A", "10B"]}}
+        mock_db.students.count_documents.assert_called_once_with(query)
+        assert mock_db.students.find.call_args.args[0] == query
+        assert mock_db.students.find.call_args.kwargs["skip"] == 5
+
+    @patch('server.db')
+    def test_query_students_from_roster_index(self, mock_db):
+        """Test a current roster index answers without touching Mongo"""
+        from roster import RosterIndex
+        index = RosterIndex()
+        index.upsert({
+            "id": "1", "name": "Ann", "age": 15, "gender": "female", "class_name": "10A",
+            "created_at": datetime(2024, 1, 1), "updated_at": datetime(2024, 1, 1),
+        })
+        index.synced_at = time.monotonic()
+
+        with patch('server.roster_index', index):
+            response = client.get("/api/students/query", params={"age_min": 15, "class_name": "10A"})
+            assert response.status_code == 200
+            assert response.json()["total"] == 1
+            assert mock_db.mock_calls == []
+
+            # A stale index is bypassed
+            index.synced_at = time.monotonic() - server.ROSTER_MAX_STALENESS_SECONDS - 1
+            mock_db.students.count_documents = AsyncMock(return_value=0)
+            mock_db.students.find.return_value.to_list = AsyncMock(return_value=[])
+            client.get("/api/students/query")
+            mock_db.students.count_documents.assert_called_once()
+
+    @patch('server.db')
+    def test_sync_roster_index_applies_changes_and_deletions(self, mock_db):
+        """Test the roster index follows the delta sync streams"""
+        from roster import RosterIndex
+        index = RosterIndex()
+        index.upsert({
+            "id": "gone", "name": "Gone", "age": 15, "gender": "male", "class_name": "10A",
+            "created_at": datetime(2024, 1, 1), "updated_at": datetime(2024, 1, 1),
+        })
+        changed = {
+            "id": "new", "name": "New", "age": 12, "gender": "female", "class_name": "7B",
+            "created_at": datetime(2024, 1, 2), "updated_at": datetime(2024, 1, 2),
+        }
+        mock_db.students.find.return_value.to_list = AsyncMock(return_value=[changed])
+        mock_db.student_tombstones.find.return_value.to_list = AsyncMock(return_value=[
+            {"id": "gone", "deleted_at": datetime(2024, 1, 3)},
+        ])
+        since = (datetime(2024, 1, 1), "")
+
+        changed_position, deleted_position = asyncio.run(server.sync_roster_index(index, (since, since)))
+        assert [s["id"] for s in index.query()[1]] == ["new"]
+        assert changed_position == deleted_position
+        assert changed_position[1] == ""
+
+    @patch('server.db')
+    def test_writes_update_roster_index(self, mock_db):
+        """Test this process's writes reach the roster index before the next sync"""
+        from roster import RosterIndex
+        mock_side_collections(mock_db)
+        mock_db.students.insert_one = AsyncMock(return_value=None)
+        mock_db.students.find_one_and_delete = AsyncMock(return_value={"class_name": "10A"})
+        index = RosterIndex()
+
+        with patch('server.roster_index', index):
+            response = client.post("/api/students", json={
+                "name": "Jane Doe", "age": 15, "class_name": "10A",
+                "gender": "female", "contact_info": "jane@email.com"
+            })
+            student_id = response.json()["id"]
+            assert index.query(class_names=["10A"])[1][0]["id"] == student_id
+
+            client.delete(f"/api/students/{student_id}")
+            assert index.query()[0] == 0
+
     def test_cors_headers(self):
         """Test CORS headers are present"""
         response = client.get("/api/")
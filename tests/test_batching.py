@@ -0,0 +1,92 @@
+import asyncio
+import sys
+import os
+
+# Add the backend directory to Python path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'backend'))
+
+from batching import GroupCommit
+
+
+class TestGroupCommit:
+    """Test cases for batching concurrent writes"""
+
+    def test_concurrent_submits_share_one_flush(self):
+        """Test items submitted within the window are flushed together"""
+        async def scenario():
+            flushed = []
+
+            async def flush(items):
+                flushed.append(list(items))
+                return [item * 10 for item in items]
+
+            batcher = GroupCommit(flush, max_batch=10, max_delay=0.01)
+            results = await asyncio.gather(*(batcher.submit(item) for item in range(3)))
+            assert results == [0, 10, 20]
+            assert flushed == [[0, 1, 2]]
+            assert batcher.stats()["batches"] == 1
+            assert batcher.stats()["average_batch_size"] == 3
+
+        asyncio.run(scenario())
+
+    def test_full_batch_flushes_without_waiting(self):
+        """Test reaching max_batch flushes right away and starts a new batch"""
+        async def scenario():
+            flushed = []
+
+            async def flush(items):
+                flushed.append(list(items))
+                return [None] * len(items)
+
+            batcher = GroupCommit(flush, max_batch=2, max_delay=60)
+            await asyncio.wait_for(asyncio.gather(*(batcher.submit(item) for item in range(4))), timeout=1)
+            assert flushed == [[0, 1], [2, 3]]
+            assert batcher.full_batches == 2
+
+        asyncio.run(scenario())
+
+    def test_per_item_errors_reach_their_submitter(self):
+        """Test one item's failure does not fail the rest of its batch"""
+        async def scenario():
+            async def flush(items):
+                return [ValueError(item) if item == "bad" else None for item in items]
+
+            batcher = GroupCommit(flush, max_delay=0.001)
+            results = await asyncio.gather(
+                batcher.submit("good"), batcher.submit("bad"), return_exceptions=True
+            )
+            assert results[0] is None
+            assert isinstance(results[1], ValueError)
+
+        asyncio.run(scenario())
+
+    def test_flush_error_fails_the_whole_batch(self):
+        async def scenario():
+            async def flush(items):
+                raise RuntimeError("mongo down")
+
+            batcher = GroupCommit(flush, max_delay=0.001)
+            results = await asyncio.gather(batcher.submit(1), batcher.submit(2), return_exceptions=True)
+            assert [type(result) for result in results] == [RuntimeError, RuntimeError]
+            assert batcher.errors == 1
+
+        asyncio.run(scenario())
+
+    def test_cancelled_submitter_is_left_out(self):
+        """Test a request cancelled during the window is never written"""
+        async def scenario():
+            flushed = []
+
+            async def flush(items):
+                flushed.append(list(items))
+                return [None] * len(items)
+
+            batcher = GroupCommit(flush, max_delay=0.01)
+            cancelled = asyncio.ensure_future(batcher.submit("gone"))
+            kept = asyncio.ensure_future(batcher.submit("kept"))
+            await asyncio.sleep(0)
+            cancelled.cancel()
+            await kept
+            assert flushed == [["kept"]]
+
+        asyncio.run(scenario())
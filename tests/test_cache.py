@@ -0,0 +1,196 @@
+import pytest
+import asyncio
+from unittest.mock import patch
+import sys
+import os
+
+# Add the backend directory to Python path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'backend'))
+
+from cache import InMemoryCache, NullCache, ReadThroughCache, SingleFlight, create_cache_backend
+
+class TestStudentCache:
+    """Test cases for the read-through cache"""
+    
+    def test_lru_eviction(self):
+        """Test the least recently used entry is evicted first"""
+        async def scenario():
+            cache = InMemoryCache(max_entries=2)
+            await cache.set("a", 1, ttl=60)
+            await cache.set("b", 2, ttl=60)
+            assert await cache.get("a") == 1
+            await cache.set("c", 3, ttl=60)
+            assert await cache.get("b") is None
+            assert await cache.get("a") == 1
+            assert cache.evictions == 1
+        asyncio.run(scenario())
+    
+    def test_ttl_expiry(self):
+        """Test entries are dropped once their TTL passes"""
+        async def scenario():
+            cache = InMemoryCache()
+            with patch('cache.time.monotonic', return_value=100.0):
+                await cache.set("a", 1, ttl=5)
+            with patch('cache.time.monotonic', return_value=104.0):
+                assert await cache.get("a") == 1
+            with patch('cache.time.monotonic', return_value=105.0):
+                assert await cache.get("a") is None
+            assert cache.expirations == 1
+        asyncio.run(scenario())
+    
+    def test_read_through_counts_hits_and_misses(self):
+        """Test loader runs only on a miss and None is never cached"""
+        async def scenario():
+            cache = ReadThroughCache(InMemoryCache(), ttl=60)
+            calls = []
+            
+            async def load():
+                calls.append(1)
+                return "value"
+            
+            async def load_missing():
+                return None
+            
+            assert await cache.get_or_load("k", load) == "value"
+            assert await cache.get_or_load("k", load) == "value"
+            assert await cache.get_or_load("missing", load_missing) is None
+            assert await cache.get_or_load("missing", load_missing) is None
+            assert len(calls) == 1
+            stats = cache.stats()
+            assert stats["hits"] == 1
+            assert stats["misses"] == 3
+        asyncio.run(scenario())
+    
+    def test_tag_invalidation(self):
+        """Test invalidating a tag drops only the entries stored under it"""
+        async def scenario():
+            cache = ReadThroughCache(InMemoryCache(), ttl=60)
+            values = iter(["old-a", "new-a"])
+            
+            async def load_a():
+                return next(values)
+            
+            async def load_b():
+                return "b"
+            
+            assert await cache.get_or_load("page-a", load_a, tags=["class:A"]) == "old-a"
+            await cache.get_or_load("page-b", load_b, tags=["class:B"])
+            await cache.invalidate("class:A")
+            assert await cache.get_or_load("page-a", load_a, tags=["class:A"]) == "new-a"
+            assert await cache.get_or_load("page-b", load_b, tags=["class:B"]) == "b"
+            assert cache.stats()["hits"] == 1
+        asyncio.run(scenario())
+    
+    def test_invalidation_during_load_is_not_lost(self):
+        """Test a write racing with a slow read cannot leave a stale entry"""
+        async def scenario():
+            cache = ReadThroughCache(InMemoryCache(), ttl=60)
+            
+            async def slow_stale_load():
+                await cache.invalidate("student:1")
+                return "stale"
+            
+            async def fresh_load():
+                return "fresh"
+            
+            await cache.get_or_load("student:1", slow_stale_load, tags=["student:1"])
+            assert await cache.get_or_load("student:1", fresh_load, tags=["student:1"]) == "fresh"
+        asyncio.run(scenario())
+    
+    def test_backend_selection(self):
+        """Test backends are chosen by name"""
+        assert isinstance(create_cache_backend("memory", 10), InMemoryCache)
+        assert isinstance(create_cache_backend("none", 10), NullCache)
+        with pytest.raises(ValueError):
+            create_cache_backend("redis", 10)
+
+class TestSingleFlight:
+    """Test cases for coalescing concurrent identical loads"""
+    
+    def test_concurrent_calls_share_one_load(self):
+        """Test callers asking for the same key while a load runs get its result"""
+        async def scenario():
+            flights = SingleFlight()
+            calls = []
+            async def load():
+                calls.append(1)
+                await asyncio.sleep(0.01)
+                return [1, 2]
+            results = await asyncio.gather(*(flights.do("class:10A", load) for _ in range(5)))
+            assert results == [[1, 2]] * 5
+            assert len(calls) == 1
+            assert flights.stats() == {"loads": 1, "coalesced": 4, "errors": 0, "in_flight": 0}
+            # Finished loads are not reused
+            await flights.do("class:10A", load)
+            assert len(calls) == 2
+        asyncio.run(scenario())
+    
+    def test_errors_reach_every_waiter_and_are_not_kept(self):
+        """Test a failed load fails all its waiters and the next call retries"""
+        async def scenario():
+            flights = SingleFlight()
+            async def fail():
+                await asyncio.sleep(0.01)
+                raise RuntimeError("mongo down")
+            results = await asyncio.gather(
+                flights.do("k", fail), flights.do("k", fail), return_exceptions=True
+            )
+            assert [type(result) for result in results] == [RuntimeError, RuntimeError]
+            assert flights.errors == 1
+            async def load():
+                return "ok"
+            assert await flights.do("k", load) == "ok"
+        asyncio.run(scenario())
+    
+    def test_cancelled_caller_does_not_cancel_others(self):
+        """Test the first caller going away leaves the shared load running"""
+        async def scenario():
+            flights = SingleFlight()
+            async def load():
+                await asyncio.sleep(0.02)
+                return "roster"
+            first = asyncio.ensure_future(flights.do("k", load))
+            second = asyncio.ensure_future(flights.do("k", load))
+            await asyncio.sleep(0)
+            first.cancel()
+            assert await second == "roster"
+            assert first.cancelled()
+        asyncio.run(scenario())
+    
+    def test_load_cancelled_when_every_caller_leaves(self):
+        """Test an abandoned load is stopped and not joined by later callers"""
+        async def scenario():
+            flights = SingleFlight()
+            cancelled = []
+            async def slow():
+                try:
+                    await asyncio.sleep(10)
+                except asyncio.CancelledError:
+                    cancelled.append(True)
+                    raise
+            caller = asyncio.ensure_future(flights.do("k", slow))
+            await asyncio.sleep(0)
+            caller.cancel()
+            await asyncio.sleep(0.01)
+            assert cancelled == [True]
+            assert flights.stats()["in_flight"] == 0
+            async def load():
+                return "fresh"
+            assert await flights.do("k", load) == "fresh"
+        asyncio.run(scenario())
+    
+    def test_read_through_cache_coalesces_misses(self):
+        """Test concurrent cache misses on one key issue a single load"""
+        async def scenario():
+            cache = ReadThroughCache(InMemoryCache(), ttl=60, single_flight=SingleFlight())
+            calls = []
+            async def load():
+                calls.append(1)
+                await asyncio.sleep(0.01)
+                return {"id": "1"}
+            results = await asyncio.gather(*(cache.get_or_load("student:1", load, tags=["student:1"]) for _ in range(3)))
+            assert results == [{"id": "1"}] * 3
+            assert len(calls) == 1
+            assert await cache.get_or_load("student:1", load, tags=["student:1"]) == {"id": "1"}
+            assert len(calls) == 1
+        asyncio.run(scenario())
@@ -0,0 +1,97 @@
+import asyncio
+import os
+import sys
+from types import SimpleNamespace
+from unittest.mock import AsyncMock
+
+import pytest
+
+# Add the backend directory to Python path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'backend'))
+
+from health import ConnectionPoolTracker, HealthMonitor
+
+
+class TestHealthMonitor:
+    """Test cases for the background database health monitor"""
+
+    def test_healthy_after_successful_ping(self):
+        monitor = HealthMonitor(AsyncMock(return_value={"ok": 1}))
+        assert monitor.healthy is False
+        assert asyncio.run(monitor.check()) is True
+        assert monitor.healthy is True
+        assert monitor.snapshot()["latency_ms"] is not None
+
+    def test_unhealthy_after_failure_threshold(self):
+        ping = AsyncMock(return_value={"ok": 1})
+        monitor = HealthMonitor(ping, failure_threshold=2)
+        asyncio.run(monitor.check())
+
+        ping.side_effect = Exception("down")
+        asyncio.run(monitor.check())
+        assert monitor.healthy is True
+        asyncio.run(monitor.check())
+        assert monitor.healthy is False
+        assert monitor.consecutive_failures == 2
+        assert monitor.last_error == "down"
+
+        ping.side_effect = None
+        asyncio.run(monitor.check())
+        assert monitor.healthy is True
+        assert monitor.stats()["failures"] == 2
+
+    def test_slow_ping_times_out(self):
+        async def slow_ping():
+            await asyncio.sleep(1)
+
+        monitor = HealthMonitor(slow_ping, timeout=0.01, failure_threshold=1)
+        assert asyncio.run(monitor.check()) is False
+        assert monitor.healthy is False
+
+    def test_stale_result_is_unhealthy(self):
+        monitor = HealthMonitor(AsyncMock(return_value={"ok": 1}), interval=0.01)
+        asyncio.run(monitor.check())
+        monitor._last_checked_monotonic -= 1
+        assert monitor.healthy is False
+
+    def test_background_task_checks_on_interval(self):
+        ping = AsyncMock(return_value={"ok": 1})
+        monitor = HealthMonitor(ping, interval=0.01)
+
+        async def run():
+            monitor.start()
+            await asyncio.sleep(0.05)
+            await monitor.stop()
+
+        asyncio.run(run())
+        assert ping.await_count >= 2
+        assert monitor.healthy is True
+
+
+class TestConnectionPoolTracker:
+    """Test cases for connection pool saturation tracking"""
+
+    def test_saturation_follows_checkouts(self):
+        tracker = ConnectionPoolTracker()
+        address = ("localhost", 27017)
+        tracker.pool_created(SimpleNamespace(address=address, options={"maxPoolSize": 4}))
+        event = SimpleNamespace(address=address)
+
+        for _ in range(3):
+            tracker.connection_checked_out(event)
+        assert tracker.saturation() == pytest.approx(0.75)
+
+        tracker.connection_checked_in(event)
+        assert tracker.stats()["checked_out"] == 2
+        assert tracker.saturation() == pytest.approx(0.5)
+
+    def test_defaults_and_closed_pools(self):
+        tracker = ConnectionPoolTracker()
+        assert tracker.saturation() == 0.0
+        address = ("localhost", 27017)
+        tracker.pool_created(SimpleNamespace(address=address, options={}))
+        tracker.connection_checked_out(SimpleNamespace(address=address))
+        assert tracker.saturation() == pytest.approx(0.01)
+
+        tracker.pool_closed(SimpleNamespace(address=address))
+        assert tracker.saturation() == 0.0
@@ -0,0 +1,167 @@
+import asyncio
+import os
+import sys
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from fastapi.testclient import TestClient
+
+# Add the backend directory to Python path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'backend'))
+
+import launch
+import server
+from lifecycle import InFlightMiddleware, InFlightRequests
+
+
+class TestDrain:
+    """Test cases for in-flight request draining"""
+
+    def test_drain_waits_for_requests(self):
+        requests = InFlightRequests()
+        requests.count = 1
+
+        async def run():
+            async def finish():
+                await asyncio.sleep(0.1)
+                requests.count -= 1
+
+            task = asyncio.create_task(finish())
+            remaining = await requests.drain(timeout=5)
+            await task
+            return remaining
+
+        assert asyncio.run(run()) == 0
+        assert requests.draining is True
+
+    def test_drain_gives_up_after_timeout(self):
+        requests = InFlightRequests()
+        requests.count = 2
+        assert asyncio.run(requests.drain(timeout=0.1)) == 2
+
+    def test_middleware_counts_requests(self):
+        requests = InFlightRequests()
+        seen = []
+
+        async def app(scope, receive, send):
+            seen.append(requests.count)
+            await send({"type": "http.response.start", "status": 200, "headers": []})
+            await send({"type": "http.response.body", "body": b""})
+
+        client = TestClient(InFlightMiddleware(app, requests=requests))
+        assert client.get("/").status_code == 200
+        assert seen == [1]
+        assert requests.count == 0
+
+
+class TestLifespan:
+    """Test cases for the per-process database client lifecycle"""
+
+    def test_lifespan_opens_and_closes_client(self):
+        mock_client = MagicMock()
+        mock_client.__getitem__.return_value.admin.command = AsyncMock(return_value={"ok": 1})
+        mock_client.__getitem__.return_value.students.index_information = AsyncMock(return_value={"name_unique": {}})
+        with patch.object(server, 'client', None), patch.object(server, 'db', None), \
+                patch('server.AsyncIOMotorClient', return_value=mock_client) as client_class, \
+                patch('server.ENSURE_INDEXES_ON_STARTUP', False), \
+                patch('server.MIGRATE_DATA_ON_STARTUP', False), \
+                patch('server.in_flight', InFlightRequests()) as in_flight:
+            with TestClient(server.app) as client:
+                assert client_class.call_count == 1
+                assert server.db is mock_client.__getitem__.return_value
+                assert client.get("/api/health/live").status_code == 200
+            mock_client.close.assert_called_once()
+            assert in_flight.draining is True
+
+    def test_index_build_does_not_block_startup(self):
+        """Test the app serves while even the required indexes are still building"""
+        mock_client = MagicMock()
+        mock_client.__getitem__.return_value.admin.command = AsyncMock(return_value={"ok": 1})
+        mock_client.__getitem__.return_value.students.index_information = AsyncMock(return_value={})
+        started = []
+
+        async def slow_ensure_indexes(required):
+            started.append(required)
+            await asyncio.sleep(60)
+
+        with patch.object(server, 'client', None), patch.object(server, 'db', None), \
+                patch.object(server, 'name_index_confirmed', False), \
+                patch('server.AsyncIOMotorClient', return_value=mock_client), \
+                patch('server.ENSURE_INDEXES_ON_STARTUP', True), \
+                patch('server.ensure_indexes', side_effect=slow_ensure_indexes), \
+                patch('server.MIGRATE_DATA_ON_STARTUP', False), \
+                patch('server.in_flight', InFlightRequests()):
+            with TestClient(server.app) as client:
+                assert client.get("/api/health/live").status_code == 200
+                assert started == [True]
+                assert server.name_index_confirmed is False
+            # Shutdown cancels the unfinished build instead of waiting for it
+            mock_client.close.assert_called_once()
+
+    def test_build_confirms_required_indexes_once_built(self):
+        """Test required indexes are built first and confirmed before the rest"""
+        calls = []
+        built = {}
+
+        async def ensure_indexes(required):
+            calls.append(("build", required))
+            if required:
+                built.update({"name_unique": {}, "student_text": {}})
+
+        async def index_information():
+            calls.append(("confirm", dict(built)))
+            return dict(built)
+
+        mock_db = MagicMock()
+        mock_db.students.index_information = index_information
+        with patch.object(server, 'db', mock_db), \
+                patch.object(server, 'name_index_confirmed', False), \
+                patch.object(server, 'text_index_confirmed', False), \
+                patch('server.ENSURE_INDEXES_ON_STARTUP', True), \
+                patch('server.ensure_indexes', side_effect=ensure_indexes):
+            asyncio.run(server.build_indexes())
+            assert server.name_index_confirmed is True
+            assert server.text_index_confirmed is True
+        assert [call[0] for call in calls] == ["confirm", "build", "confirm", "build"]
+        assert calls[3] == ("build", False)
+
+
+class TestLauncher:
+    """Test cases for the production launcher"""
+
+    def test_worker_count_from_env(self):
+        with patch.dict(os.environ, {"WEB_CONCURRENCY": "3"}):
+            assert launch.worker_count() == 3
+
+    def test_worker_count_defaults_to_available_cpus(self):
+        with patch.dict(os.environ, {"WEB_CONCURRENCY": ""}), \
+                patch('launch.cgroup_cpu_limit', return_value=None), \
+                patch('os.sched_getaffinity', return_value=set(range(4))):
+            assert launch.worker_count() == 4
+
+    def test_metrics_dir_created_for_several_workers(self):
+        with patch.dict(os.environ, {}, clear=False):
+            os.environ.pop("PROMETHEUS_MULTIPROC_DIR", None)
+            launch.prepare_metrics_dir(1)
+            assert "PROMETHEUS_MULTIPROC_DIR" not in os.environ
+            launch.prepare_metrics_dir(2)
+            assert os.path.isdir(os.environ["PROMETHEUS_MULTIPROC_DIR"])
+            os.rmdir(os.environ["PROMETHEUS_MULTIPROC_DIR"])
+
+    def test_metrics_dir_emptied_at_launch(self, tmp_path):
+        """Test files of an earlier run are not reported as live workers"""
+        (tmp_path / "counter_123.db").write_bytes(b"old")
+        (tmp_path / "keep.txt").write_text("not a metrics file")
+        with patch.dict(os.environ, {"PROMETHEUS_MULTIPROC_DIR": str(tmp_path)}):
+            launch.prepare_metrics_dir(2)
+        assert sorted(path.name for path in tmp_path.iterdir()) == ["keep.txt"]
+
+    def test_empty_metrics_dir_variable_is_dropped(self):
+        with patch.dict(os.environ, {"PROMETHEUS_MULTIPROC_DIR": ""}):
+            launch.prepare_metrics_dir(1)
+            assert "PROMETHEUS_MULTIPROC_DIR" not in os.environ
+
+    def test_worker_count_capped_by_cgroup_quota(self):
+        with patch.dict(os.environ, {"WEB_CONCURRENCY": ""}), \
+                patch('launch.cgroup_cpu_limit', return_value=1.5), \
+                patch('os.sched_getaffinity', return_value=set(range(8))):
+            assert launch.worker_count() == 2
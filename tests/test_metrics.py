@@ -0,0 +1,108 @@
+from fastapi.testclient import TestClient
+from unittest.mock import AsyncMock, Mock, patch
+import sys
+import os
+import subprocess
+import textwrap
+
+# Add the backend directory to Python path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'backend'))
+
+from prometheus_client import REGISTRY
+
+from metrics import MongoCommandMetrics, MongoPoolMetrics
+from server import app
+
+# Test client
+client = TestClient(app)
+
+def sample(name, **labels):
+    return REGISTRY.get_sample_value(name, labels) or 0
+
+class TestMetrics:
+    """Test cases for the Prometheus metrics endpoint"""
+    
+    @patch('server.db')
+    def test_request_latency_by_route_template(self, mock_db):
+        """Test requests are recorded under their route template and status"""
+        mock_db.students.find_one = AsyncMock(return_value=None)
+        mock_db.student_summary.find_one = AsyncMock(return_value=None)
+        labels = {"method": "GET", "route": "/api/students/{student_id}", "status": "404"}
+        before = sample("http_request_duration_seconds_count", **labels)
+        
+        client.get("/api/students/unknown-1")
+        client.get("/api/students/unknown-2")
+        assert sample("http_request_duration_seconds_count", **labels) == before + 2
+        assert sample("http_requests_in_progress", method="GET") == 0
+    
+    def test_unmatched_routes_share_a_label(self):
+        """Test unknown paths do not create one series per path"""
+        before = sample("http_request_duration_seconds_count", method="GET", route="unmatched", status="404")
+        client.get("/no/such/path")
+        assert sample("http_request_duration_seconds_count", method="GET", route="unmatched", status="404") == before + 1
+    
+    def test_mongo_command_listener(self):
+        """Test driver events feed the MongoDB latency histogram and error counter"""
+        listener = MongoCommandMetrics()
+        before_count = sample("mongodb_command_duration_seconds_count", command="find")
+        before_errors = sample("mongodb_command_errors_total", command="find")
+        
+        listener.succeeded(Mock(command_name="find", duration_micros=1500))
+        listener.failed(Mock(command_name="find", duration_micros=2500))
+        assert sample("mongodb_command_duration_seconds_count", command="find") == before_count + 2
+        assert sample("mongodb_command_errors_total", command="find") == before_errors + 1
+    
+    def test_mongo_pool_listener(self):
+        """Test check-out events feed the pool wait histogram and queue gauge"""
+        listener = MongoPoolMetrics()
+        before_count = sample("mongodb_pool_checkout_wait_seconds_count")
+        before_failures = sample("mongodb_pool_checkout_failures_total", reason="timeout")
+        queue = sample("mongodb_pool_wait_queue_size")
+        
+        listener.connection_check_out_started(Mock())
+        assert sample("mongodb_pool_wait_queue_size") == queue + 1
+        listener.connection_checked_out(Mock())
+        listener.connection_check_out_started(Mock())
+        listener.connection_check_out_failed(Mock(reason="timeout"))
+        assert sample("mongodb_pool_checkout_wait_seconds_count") == before_count + 2
+        assert sample("mongodb_pool_checkout_failures_total", reason="timeout") == before_failures + 1
+        assert sample("mongodb_pool_wait_queue_size") == queue
+    
+    def test_metrics_endpoint(self):
+        """Test the exposition includes request, Mongo and cache metrics"""
+        client.get("/api/")
+        response = client.get("/api/metrics")
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/plain")
+        assert 'http_request_duration_seconds_bucket{le="0.005",method="GET",route="/api/",status="200"}' in response.text
+        assert "mongodb_command_duration_seconds" in response.text
+        assert "student_cache_hits_total" in response.text
+
+# Run in fresh interpreters: prometheus_client picks multiprocess mode at import
+WORKER_SCRIPT = textwrap.dedent("""
+    import sys
+    sys.path.insert(0, sys.argv[1])
+    from metrics import HTTP_REQUEST_DURATION, publish_stats, register_stats, render_latest
+    hits = int(sys.argv[2])
+    register_stats("demo_cache", "Demo cache", lambda: {"hits": hits, "entries": hits * 10}, counters=("hits",))
+    HTTP_REQUEST_DURATION.labels("GET", "/api/demo", "200").observe(0.1)
+    publish_stats()
+    if len(sys.argv) > 3:
+        sys.stdout.write(render_latest().decode())
+""")
+
+class TestMultiprocessMetrics:
+    """Test cases for metrics shared between uvicorn workers"""
+
+    def test_scrape_reports_every_worker(self, tmp_path):
+        """Test one worker's scrape sums counters and labels gauges by worker"""
+        backend = os.path.join(os.path.dirname(__file__), '..', 'backend')
+        env = {**os.environ, "PROMETHEUS_MULTIPROC_DIR": str(tmp_path)}
+        subprocess.run([sys.executable, "-c", WORKER_SCRIPT, backend, "3"], env=env, check=True)
+        output = subprocess.run(
+            [sys.executable, "-c", WORKER_SCRIPT, backend, "4", "render"],
+            env=env, check=True, capture_output=True, text=True,
+        ).stdout
+        assert "demo_cache_hits_total 7.0" in output
+        assert output.count("demo_cache_entries{pid=") == 2
+        assert 'http_request_duration_seconds_count{method="GET",route="/api/demo",status="200"} 2.0' in output
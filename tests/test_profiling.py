@@ -0,0 +1,99 @@
+import asyncio
+import pstats
+import sys
+import os
+from types import SimpleNamespace
+
+from fastapi import APIRouter, FastAPI
+from fastapi.testclient import TestClient
+from prometheus_client import REGISTRY
+
+# Add the backend directory to Python path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'backend'))
+
+from profiling import MongoCommandProfiler, ProfiledRoute, ProfilingMiddleware, current_profile
+
+listener = MongoCommandProfiler()
+
+
+def create_app(**options):
+    router = APIRouter(prefix="/api", route_class=ProfiledRoute)
+
+    @router.get("/items/{item_id}")
+    async def get_item(item_id: int):
+        # Driver events arrive on another thread, as they do under Motor
+        for _ in range(2):
+            await asyncio.to_thread(listener.succeeded, SimpleNamespace(duration_micros=1500))
+        return {"id": item_id, "profiled": current_profile.get() is not None}
+
+    app = FastAPI()
+    app.include_router(router)
+    app.add_middleware(ProfilingMiddleware, **options)
+    return app
+
+
+def timings(response):
+    return {
+        entry.split(";")[0]: entry
+        for entry in response.headers["Server-Timing"].split(", ")
+    }
+
+
+class TestProfiling:
+    """Test cases for per-request profiling"""
+
+    def test_token_request_gets_server_timing(self):
+        """Test a request with the token gets its phases and Mongo command count"""
+        client = TestClient(create_app(token="secret"))
+        response = client.get("/api/items/1", headers={"X-Profile": "secret"})
+        assert response.status_code == 200
+        assert response.json() == {"id": 1, "profiled": True}
+        entries = timings(response)
+        assert list(entries) == ["validate", "handler", "serialize", "mongo", "total"]
+        assert entries["mongo"] == 'mongo;dur=3.000;desc="2 commands"'
+        assert response.headers["Timing-Allow-Origin"] == "*"
+
+    def test_requests_without_token_are_not_profiled(self):
+        client = TestClient(create_app(token="secret"))
+        for headers in ({}, {"X-Profile": "wrong"}):
+            response = client.get("/api/items/1", headers=headers)
+            assert response.json()["profiled"] is False
+            assert "Server-Timing" not in response.headers
+
+    def test_header_ignored_without_configured_token(self):
+        client = TestClient(create_app(token=""))
+        response = client.get("/api/items/1", headers={"X-Profile": ""})
+        assert response.json()["profiled"] is False
+
+    def test_sampled_requests_only_feed_histograms(self):
+        """Test sampled requests are profiled without exposing timings to the client"""
+        def commands_observed():
+            return REGISTRY.get_sample_value(
+                "http_request_mongo_commands_count", {"route": "/api/items/{item_id}"}
+            ) or 0
+
+        before = commands_observed()
+        client = TestClient(create_app(sample_rate=1.0))
+        response = client.get("/api/items/1")
+        assert response.json()["profiled"] is True
+        assert "Server-Timing" not in response.headers
+        assert commands_observed() == before + 1
+
+    def test_stack_profile_is_written(self, tmp_path):
+        """Test X-Profile-Stack writes a cProfile dump named in Server-Timing"""
+        client = TestClient(create_app(token="secret", profile_dir=str(tmp_path)))
+        response = client.get("/api/items/1", headers={"X-Profile": "secret", "X-Profile-Stack": "1"})
+        name = timings(response)["stack"].split('"')[1]
+        assert name.endswith(".prof") and "-get-api_items_1-" in name
+        assert pstats.Stats(str(tmp_path / name)).total_calls > 0
+
+    def test_stack_profile_needs_profile_dir(self):
+        client = TestClient(create_app(token="secret"))
+        response = client.get("/api/items/1", headers={"X-Profile": "secret", "X-Profile-Stack": "1"})
+        assert "stack" not in timings(response)
+
+    def test_invalid_request_reports_validation_time(self):
+        client = TestClient(create_app(token="secret"))
+        response = client.get("/api/items/abc", headers={"X-Profile": "secret"})
+        assert response.status_code == 422
+        assert list(timings(response)) == ["validate", "mongo", "total"]
@@ -0,0 +1,137 @@
+import asyncio
+import csv
+import io
+import zipfile
+import sys
+import os
+from datetime import datetime
+
+# Add the backend directory to Python path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'backend'))
+
+from reports import JobWorkers, ReportFile, format_xlsx_rows, group_rows, sheet_name
+
+
+class AsyncCursor:
+    def __init__(self, documents):
+        self.documents = documents
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        for document in self.documents:
+            yield document
+
+
+class TestJobWorkers:
+    """Test cases for the background job worker pool"""
+
+    def test_notify_wakes_idle_workers(self):
+        """Test a queued job is picked up without waiting for the poll interval"""
+        async def scenario():
+            queue = []
+            done = asyncio.Event()
+
+            async def claim():
+                return queue.pop(0) if queue else None
+
+            async def run(job):
+                done.set()
+
+            workers = JobWorkers(claim, run, concurrency=1, poll_interval=60)
+            workers.start()
+            await asyncio.sleep(0)
+            queue.append({"id": "job"})
+            workers.notify()
+            await asyncio.wait_for(done.wait(), timeout=1)
+            await workers.stop()
+            return workers.stats()
+
+        stats = asyncio.run(scenario())
+        assert stats["workers"] == 0
+        assert stats["completed"] == 1
+
+    def test_failures_are_counted_and_workers_keep_going(self):
+        """Test a failing job does not stop its worker"""
+        async def scenario():
+            queue = [{"id": "bad"}, {"id": "good"}]
+            finished = []
+
+            async def claim():
+                return queue.pop(0) if queue else None
+
+            async def run(job):
+                if job["id"] == "bad":
+                    raise RuntimeError("boom")
+                finished.append(job["id"])
+
+            workers = JobWorkers(claim, run, concurrency=1, poll_interval=0.01)
+            workers.start()
+            while not finished:
+                await asyncio.sleep(0.01)
+            await workers.stop()
+            return workers.stats()
+
+        stats = asyncio.run(scenario())
+        assert stats["completed"] == 1
+        assert stats["failed"] == 1
+
+
+class TestReportFormatting:
+    """Test cases for roster report assembly"""
+
+    def test_group_rows_never_mixes_groups(self):
+        """Test batches break on group changes and on batch size"""
+        documents = [{"class_name": name, "id": str(i)} for i, name in enumerate(["9A", "9A", "9A", "9B"])]
+
+        async def collect():
+            return [batch async for batch in group_rows(AsyncCursor(documents), ["id"], "class_name", 2)]
+
+        assert asyncio.run(collect()) == [
+            ("9A", [["0"], ["1"]]),
+            ("9A", [["2"]]),
+            ("9B", [["3"]]),
+        ]
+
+    def test_csv_report(self):
+        """Test CSV reports have a header row and ISO timestamps"""
+        report = ReportFile("csv", ["name", "created_at"])
+        report.write("9A", b"Ann,2024-01-01T00:00:00\r\n", 1)
+        rows = list(csv.reader(io.StringIO(report.finish().read().decode())))
+        assert rows == [["name", "created_at"], ["Ann", "2024-01-01T00:00:00"]]
+        assert report.rows == 1
+
+    def test_xlsx_report_has_a_sheet_per_group(self):
+        """Test XLSX reports are valid packages with one sheet per class"""
+        report = ReportFile("xlsx", ["name", "age"])
+        report.write("9A", format_xlsx_rows([["Ann & Bo", 14]]), 1)
+        report.write("9A", format_xlsx_rows([["Cy", 15]]), 1)
+        report.write("9B/2", format_xlsx_rows([["Di", None]]), 1)
+        package = zipfile.ZipFile(report.finish())
+
+        assert "[Content_Types].xml" in package.namelist()
+        workbook = package.read("xl/workbook.xml").decode()
+        assert 'name="9A"' in workbook and 'name="9B_2"' in workbook
+        sheet = package.read("xl/worksheets/sheet1.xml").decode()
+        assert sheet.count("<row>") == 3
+        assert "Ann &amp; Bo" in sheet and "<v>14</v>" in sheet
+        assert report.rows == 3
+
+    def test_empty_xlsx_report_still_has_a_sheet(self):
+        package = zipfile.ZipFile(ReportFile("xlsx", ["name"]).finish())
+        assert "xl/worksheets/sheet1.xml" in package.namelist()
+
+    def test_xlsx_cells_drop_illegal_characters(self):
+        row = format_xlsx_rows([["a\x01b", datetime(2024, 1, 1), True]]).decode()
+        assert "a\x01b" not in row and ">ab<" in row
+        assert "2024-01-01T00:00:00" in row
+        assert ">True<" in row
+
+    def test_sheet_names_are_unique_and_short(self):
+        taken = set()
+        first = sheet_name("x" * 40, taken)
+        second = sheet_name("X" * 40, taken)
+        assert len(first) == 31 and len(second) == 31
+        assert first.lower() != second.lower()
+        assert sheet_name(None, taken) == "Unassigned"
@@ -0,0 +1,104 @@
+import sys
+import os
+from datetime import datetime, timedelta
+
+# Add the backend directory to Python path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'backend'))
+
+from roster import MIN_CAPACITY, RosterIndex
+
+START = datetime(2024, 1, 1)
+
+
+def student(i, **changes):
+    return {
+        "id": f"s{i}",
+        "name": f"Student {i}",
+        "age": 10 + i % 5,
+        "gender": "female" if i % 2 else "male",
+        "class_name": f"{9 + i % 3}A",
+        "created_at": START + timedelta(seconds=i),
+        "updated_at": START,
+        **changes,
+    }
+
+
+class TestRosterIndex:
+    """Test cases for the columnar roster index"""
+
+    def test_filters_combine(self):
+        """Test age range, gender and class filters are AND-ed, values within one are OR-ed"""
+        index = RosterIndex()
+        for i in range(30):
+            index.upsert(student(i))
+
+        total, students = index.query(age_min=11, age_max=12, genders=["female"], class_names=["9A", "10A"])
+        expected = [
+            f"s{i}" for i in range(30)
+            if 11 <= 10 + i % 5 <= 12 and i % 2 and 9 + i % 3 in (9, 10)
+        ]
+        assert total == len(expected)
+        assert [s["id"] for s in students] == expected
+        assert students[0] == {
+            "id": expected[0], "name": f"Student {expected[0][1:]}", "age": 11,
+            "gender": "female", "class_name": "10A",
+        }
+
+    def test_unknown_category_matches_nothing(self):
+        index = RosterIndex()
+        index.upsert(student(1))
+        assert index.query(class_names=["12Z"]) == (0, [])
+
+    def test_offset_and_limit(self):
+        index = RosterIndex()
+        for i in range(10):
+            index.upsert(student(i))
+        total, students = index.query(offset=3, limit=2)
+        assert total == 10
+        assert [s["id"] for s in students] == ["s3", "s4"]
+
+    def test_update_moves_student_between_filters(self):
+        index = RosterIndex()
+        index.upsert(student(1))
+        assert index.upsert(student(1, class_name="12B", updated_at=START + timedelta(minutes=1)))
+        assert index.query(class_names=["10A"])[0] == 0
+        assert index.query(class_names=["12B"])[0] == 1
+
+    def test_older_version_is_ignored(self):
+        """Test a stale sync page cannot undo a newer local write"""
+        index = RosterIndex()
+        index.upsert(student(1, age=15, updated_at=START + timedelta(minutes=1)))
+        assert not index.upsert(student(1, age=11))
+        assert index.query()[1][0]["age"] == 15
+
+    def test_remove_and_compact(self):
+        """Test deleted rows stop matching and are dropped once they dominate"""
+        index = RosterIndex()
+        count = 2 * MIN_CAPACITY + 10
+        for i in range(count):
+            index.upsert(student(i))
+        index.remove(["s0", "missing"])
+        assert index.query()[0] == count - 1
+        assert index.compactions == 0
+
+        index.remove(f"s{i}" for i in range(1, count - 5))
+        assert index.compactions == 1
+        assert index.size == index.live == 5
+        total, students = index.query()
+        assert total == 5
+        assert [s["id"] for s in students] == [f"s{i}" for i in range(count - 5, count)]
+
+    def test_out_of_order_inserts_are_sorted_before_querying(self):
+        """Test results stay in created_at order when students arrive out of order"""
+        index = RosterIndex()
+        for i in (3, 1, 2):
+            index.upsert(student(i))
+        assert [s["id"] for s in index.query()[1]] == ["s1", "s2", "s3"]
+        assert index.ordered
+
+    def test_grows_past_initial_capacity(self):
+        index = RosterIndex()
+        for i in range(MIN_CAPACITY * 3):
+            index.upsert(student(i))
+        assert index.query()[0] == MIN_CAPACITY * 3
+        assert len(index.alive) >= MIN_CAPACITY * 3
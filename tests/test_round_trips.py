@@ -0,0 +1,157 @@
+import pytest
+import asyncio
+import httpx
+from fastapi.testclient import TestClient
+from unittest.mock import AsyncMock, Mock, patch
+from pymongo.errors import BulkWriteError
+import sys
+import os
+
+# Add the backend directory to Python path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'backend'))
+
+import server
+from batching import GroupCommit
+from server import app
+
+# Test client
+client = TestClient(app)
+
+# Motor methods that send a command to MongoDB; find() only builds a cursor
+# and is counted when the cursor is drained with to_list()
+ROUND_TRIP_METHODS = {
+    "aggregate", "bulk_write", "command", "count_documents", "create_indexes",
+    "delete_many", "delete_one", "find_one", "find_one_and_delete",
+    "find_one_and_update", "insert_many", "insert_one", "to_list",
+    "update_many", "update_one",
+}
+
+MOCK_STUDENT = {
+    "id": "1",
+    "name": "John Doe",
+    "age": 16,
+    "class_name": "10A",
+    "gender": "male",
+    "contact_info": "john.doe@email.com",
+    "created_at": "2024-01-01T00:00:00",
+    "updated_at": "2024-01-01T00:00:00"
+}
+
+MOCK_REPORT_JOB = {
+    "id": "job-1",
+    "status": "queued",
+    "format": "csv",
+    "created_at": "2024-01-01T00:00:00",
+    "attempts": 0
+}
+
+def mongo_round_trips(mock_db):
+    """Return the Mongo commands issued through a mocked server.db, in order"""
+    commands = []
+    for mock_call in mock_db.mock_calls:
+        path = mock_call[0].replace("()", "").split(".")
+        if path[-1] in ROUND_TRIP_METHODS:
+            commands.append(f"{path[0]}.{path[-1]}")
+    return commands
+
+def mock_database(mock_db):
+    mock_db.students.find_one = AsyncMock(return_value=MOCK_STUDENT)
+    mock_db.students.insert_one = AsyncMock(return_value=None)
+    mock_db.students.find_one_and_update = AsyncMock(return_value=MOCK_STUDENT)
+    mock_db.students.find_one_and_delete = AsyncMock(return_value={"class_name": "10A"})
+    mock_db.students.update_many = AsyncMock(return_value=Mock(modified_count=1))
+    mock_db.students.delete_many = AsyncMock(return_value=Mock(deleted_count=1))
+    mock_db.students.count_documents = AsyncMock(return_value=1)
+    mock_db.students.find.return_value.to_list = AsyncMock(return_value=[MOCK_STUDENT])
+    mock_db.student_summary.find_one = AsyncMock(return_value={"_id": "students", "version": 1})
+    mock_db.student_summary.bulk_write = AsyncMock(return_value=None)
+    mock_db.student_tombstones.insert_many = AsyncMock(return_value=None)
+    mock_db.report_jobs.insert_one = AsyncMock(return_value=None)
+    mock_db.report_jobs.find_one = AsyncMock(return_value=MOCK_REPORT_JOB)
+
+@pytest.fixture(autouse=True)
+def clear_student_cache():
+    asyncio.run(server.student_cache.clear())
+
+@pytest.fixture(autouse=True)
+def required_indexes_confirmed(monkeypatch):
+    # Budgets assume the required indexes exist; without them writes add a name check
+    monkeypatch.setattr(server, "name_index_confirmed", True)
+    monkeypatch.setattr(server, "text_index_confirmed", True)
+
+class TestMongoRoundTrips:
+    """Round-trip budgets per request; a failure here means a handler got chattier"""
+    
+    @pytest.mark.parametrize("method, path, body, expected", [
+        ("post", "/api/students", {
+            "name": "Jane Doe", "age": 15, "class_name": "10A",
+            "gender": "female", "contact_info": "jane@email.com"
+        }, ["students.insert_one", "student_summary.bulk_write"]),
+        ("put", "/api/students/1", {"age": 17}, ["students.find_one_and_update", "student_summary.bulk_write"]),
+        ("delete", "/api/students/1", None, [
+            "students.find_one_and_delete", "student_tombstones.insert_many", "student_summary.bulk_write"
+        ]),
+        ("get", "/api/students/1", None, ["student_summary.find_one", "students.find_one"]),
+        ("post", "/api/students/batch-get", {"ids": ["1", "2"]}, ["students.to_list"]),
+        ("post", "/api/students/batch-delete", {"ids": ["1", "2"]}, [
+            "students.update_many", "students.to_list", "students.delete_many",
+            "student_tombstones.insert_many", "student_summary.bulk_write",
+        ]),
+        ("get", "/api/students", None, ["student_summary.find_one", "students.to_list"]),
+        ("get", "/api/students/class/10A", None, ["student_summary.find_one", "students.to_list"]),
+        ("get", "/api/students/query?class_name=10A", None, ["students.count_documents", "students.to_list"]),
+        ("post", "/api/reports", {"format": "csv"}, ["report_jobs.insert_one"]),
+        ("get", "/api/reports/job-1", None, ["report_jobs.find_one"]),
+    ])
+    def test_round_trip_budget(self, method, path, body, expected):
+        """Test each route issues exactly the expected Mongo commands"""
+        with patch('server.db') as mock_db:
+            mock_database(mock_db)
+            kwargs = {"json": body} if body is not None else {}
+            response = getattr(client, method)(path, **kwargs)
+            assert response.status_code in (200, 202)
+            assert mongo_round_trips(mock_db) == expected
+    
+    def test_cached_lookup_skips_mongo(self):
+        """Test a repeated lookup only reads the collection watermark"""
+        with patch('server.db') as mock_db:
+            mock_database(mock_db)
+            client.get("/api/students/1")
+            mock_db.reset_mock()
+            client.get("/api/students/1")
+            assert mongo_round_trips(mock_db) == ["student_summary.find_one"]
+    
+    def test_concurrent_creates_share_round_trips(self):
+        """Test group commit turns a burst of creates into one insert and one summary update"""
+        def write_error(index):
+            return {"index": index, "code": 11000, "errmsg": "E11000 duplicate key error", "keyValue": {"name": "Dup"}}
+
+        async def scenario():
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://test") as async_client:
+                return await asyncio.gather(*(
+                    async_client.post("/api/students", json={
+                        "name": name, "age": 15, "class_name": "10A",
+                        "gender": "female", "contact_info": "x@email.com",
+                    })
+                    for name in ("A", "B", "Dup", "C")
+                ))
+
+        with patch('server.db') as mock_db:
+            mock_database(mock_db)
+
+            async def insert_many(documents, ordered):
+                failed = [index for index, document in enumerate(documents) if document["name"] == "Dup"]
+                if failed:
+                    raise BulkWriteError({"writeErrors": [write_error(index) for index in failed]})
+            mock_db.students.insert_many = AsyncMock(side_effect=insert_many)
+
+            batcher = GroupCommit(server.create_students_batch, max_batch=100, max_delay=0.05)
+            with patch('server.student_creates', batcher):
+                responses = asyncio.run(scenario())
+            assert [response.status_code for response in responses] == [200, 200, 400, 200]
+            assert responses[2].json()["detail"] == "Student with this name already exists"
+            assert mongo_round_trips(mock_db) == ["students.insert_many", "student_summary.bulk_write"]
+            # Only the stored students are counted
+            operations = mock_db.student_summary.bulk_write.call_args.args[0]
+            assert operations[0]._doc["$inc"]["count"] == 3